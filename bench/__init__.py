@@ -0,0 +1,4 @@
+"""
+Benchmarks
+离线基准测试：本地 OpenAI 兼容桩服务 + 假 GUI 后端，不需要显示器和网络
+"""
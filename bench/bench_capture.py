@@ -0,0 +1,104 @@
+"""
+Capture Microbenchmark
+比较各截图后端的 截图 / 缩放 / 编码 耗时，以及编码缓存和后台环形缓冲区带来的收益
+
+用法:
+    python -m bench.bench_capture --backends pyautogui,mss,fake -n 20
+
+没有显示器或没装对应库的后端会被跳过
+"""
+
+import sys
+import time
+import random
+import argparse
+from io import BytesIO
+from PIL import Image, ImageDraw
+
+from bench.bench_loop import percentile
+
+
+def synthetic_screen(size=(1920, 1080), seed=0):
+    """像真实桌面一样有大量文字和色块的合成画面（纯色图编码太快，不具代表性）"""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + rng.randrange(50, 500), y + rng.randrange(20, 300)), fill=color)
+    for y in range(0, size[1], 18):
+        draw.text((8, y), " ".join(f"{rng.random():.6f}" for _ in range(24)), fill=(20, 20, 20))
+    return img
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def bench_backend(name, n):
+    from core.capture import CaptureService, FakeBackend, BACKENDS
+
+    backend = FakeBackend(synthetic_screen()) if name == "fake" else BACKENDS[name]()
+    service = CaptureService(backend)
+
+    frame = service.grab()
+    image = frame.image
+    results = {"size": f"{image.size[0]}x{image.size[1]}"}
+
+    results["grab"] = timed(backend.grab, n)
+
+    def resize():
+        copy = image.convert("RGB")
+        copy.thumbnail((768, 768))
+
+    results["resize768"] = timed(resize, n)
+
+    def encode(max_size, quality, resample=Image.Resampling.BICUBIC):
+        copy = image.convert("RGB")
+        copy.thumbnail(max_size, resample)
+        copy.save(BytesIO(), format="JPEG", quality=quality)
+
+    results["jpeg768q50"] = timed(lambda: encode((768, 768), 50), n)
+    results["jpeg1280q85"] = timed(lambda: encode((1280, 720), 85, Image.Resampling.LANCZOS), n)
+
+    # 同一帧第二次编码直接命中缓存
+    frame.encode(768, quality=50)
+    results["cached"] = timed(lambda: frame.encode(768, quality=50), n)
+
+    # 后台线程开着时拿最新帧
+    service.interval = 0.05
+    service.start()
+    time.sleep(0.2)
+    results["latest"] = timed(lambda: service.latest(max_age=1.0), n)
+    service.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图后端微基准")
+    parser.add_argument("--backends", default="pyautogui,mss,fake")
+    parser.add_argument("-n", type=int, default=20, help="每项重复次数")
+    args = parser.parse_args()
+
+    columns = ("grab", "resize768", "jpeg768q50", "jpeg1280q85", "cached", "latest")
+    header = f"{'backend':<10} {'frame':>10} " + " ".join(f"{c + ' p50':>16}" for c in columns)
+    print(header)
+    print("-" * len(header))
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            r = bench_backend(name, args.n)
+        except Exception as e:
+            print(f"{name:<10} 跳过: {type(e).__name__}: {e}")
+            continue
+        cells = " ".join(f"{percentile(r[c], 50):>13.2f} ms" for c in columns)
+        print(f"{name:<10} {r['size']:>10} {cells}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
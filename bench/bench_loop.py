@@ -0,0 +1,222 @@
+"""
+End-to-End Loop Benchmark
+驱动 agent 的真实 规划 -> 执行 -> 技能 -> 视觉 循环（AgentEngine + SkillManager + VisionEngine），
+模型换成本地桩服务，GUI 换成假后端。无显示器、无外网也能跑。
+
+用法:
+    python -m bench.bench_loop --steps 4,12,24 --latency 0.05 --tail 400
+
+输出每个场景的:
+    - 各阶段耗时 (plan / think / tool / settle / vision)
+    - 单步延迟 p50 / p95
+    - 每步发送字节数
+    - 内存峰值
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from collections import defaultdict
+
+from bench import fakes
+
+PHASES = ("plan", "think", "tool", "settle", "vision")
+
+
+def percentile(values, p):
+    if not values: return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class PhaseTimer:
+    """给对象方法套上计时器（只改实例属性，不动类）"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.step_starts = []
+        self._patched = []
+
+    def _patch(self, obj, name, wrapper):
+        self._patched.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def wrap_async(self, obj, name, phase, mark_step=False):
+        fn = getattr(obj, name)
+
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            if mark_step: self.step_starts.append(start)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.samples[phase].append(time.perf_counter() - start)
+
+        self._patch(obj, name, wrapper)
+
+    def wrap_sync(self, obj, name, phase):
+        fn = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[phase].append(time.perf_counter() - start)
+
+        self._patch(obj, name, wrapper)
+
+    def restore(self):
+        for obj, name, original in reversed(self._patched):
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self._patched = []
+
+
+def build_script(n_steps, payload_file):
+    """
+    场景脚本：GUI 动作和运行脚本交替，脚本输出逐步把历史撑长
+    """
+    actions = []
+    for i in range(n_steps):
+        if i % 2 == 0:
+            actions.append({"thought": f"第 {i+1} 步: 按快捷键", "action": "computer_control",
+                            "args": {"action": "hotkey", "target": "ctrl,l"}})
+        else:
+            # 动作本身很短，输出很长（模拟日志/编译输出撑大历史）
+            actions.append({"thought": f"第 {i+1} 步: 查看输出", "action": "run_python", "args": {"filename": payload_file}})
+    return actions
+
+
+def write_payload_script(payload_chars):
+    fd, path = tempfile.mkstemp(prefix="tinbot_bench_", suffix=".py")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(f"print('x' * {payload_chars})\n")
+    return path
+
+
+async def run_scenario(n_steps, args, runtime):
+    from openai import AsyncOpenAI, OpenAI
+    from bench.stub_server import StubServer, ScriptedResponder
+    from core.engine import AgentEngine
+    from core.vision import VisionEngine
+    from core.vision_scheduler import VisionScheduler
+
+    tail = " 以上就是我的思考。" * (args.tail // 10) if args.tail else ""
+    payload_file = write_payload_script(args.payload)
+    responder = ScriptedResponder(build_script(n_steps, payload_file), tail=tail)
+    server = StubServer(responder, first_token_latency=args.latency, chunk_latency=args.chunk_latency).start()
+
+    try:
+        client = AsyncOpenAI(api_key="bench", base_url=server.base_url, max_retries=0)
+        vision = VisionEngine(VisionScheduler.from_settings(OpenAI(api_key="bench", base_url=server.base_url, max_retries=0)), "stub-vl")
+        brain = runtime["brain"]
+        brain.context["vision"] = vision
+
+        engine = AgentEngine(client, brain, vision, model_name="stub", max_steps=n_steps + 1, interactive=False)
+        engine.settle_delay = args.settle
+        fakes.DESKTOP.animation = args.animation
+
+        timer = PhaseTimer()
+        timer.wrap_async(engine, "make_plan", "plan")
+        timer.wrap_async(engine, "think", "think", mark_step=True)
+        timer.wrap_async(brain, "aexecute", "tool")
+        timer.wrap_async(engine, "settle", "settle")
+        timer.wrap_sync(vision, "capture_observation", "vision")
+        timer.wrap_async(vision, "averify_action", "vision")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        summary = await engine.run_task(f"基准测试 {n_steps} 步")
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timer.restore()
+
+        bounds = timer.step_starts + [start + total]
+        step_latencies = [b - a for a, b in zip(bounds, bounds[1:])]
+        traffic = server.bytes_by_kind()
+        think_traffic = traffic.get("think", {"requests": 0, "bytes": 0})
+
+        return {
+            "steps": n_steps,
+            "finished": summary is not None,
+            "wall_s": round(total, 4),
+            "phases_s": {p: round(sum(timer.samples[p]), 4) for p in PHASES},
+            "step_p50_ms": round(percentile(step_latencies, 50) * 1000, 2),
+            "step_p95_ms": round(percentile(step_latencies, 95) * 1000, 2),
+            "think_bytes_per_step": think_traffic["bytes"] // max(1, think_traffic["requests"]),
+            "bytes_per_step": sum(t["bytes"] for t in traffic.values()) // max(1, n_steps),
+            "traffic": traffic,
+            "peak_mem_mb": round(peak / 1024 / 1024, 2),
+        }
+    finally:
+        server.stop()
+        os.remove(payload_file)
+
+
+def print_report(results):
+    header = f"{'steps':>5} {'wall':>8} " + " ".join(f"{p:>8}" for p in PHASES) + \
+             f" {'p50ms':>8} {'p95ms':>8} {'B/step':>9} {'think B':>9} {'peakMB':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        phases = " ".join(f"{r['phases_s'][p]:>8.3f}" for p in PHASES)
+        print(f"{r['steps']:>5} {r['wall_s']:>8.3f} {phases} {r['step_p50_ms']:>8.1f} {r['step_p95_ms']:>8.1f} "
+              f"{r['bytes_per_step']:>9} {r['think_bytes_per_step']:>9} {r['peak_mem_mb']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tinbot 主循环基准测试")
+    parser.add_argument("--steps", default="4,12,24", help="各场景的步数（逗号分隔，对应不同历史长度）")
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务首字延迟 (秒)")
+    parser.add_argument("--chunk-latency", type=float, default=0.002, help="流式每块延迟 (秒)")
+    parser.add_argument("--tail", type=int, default=400, help="动作 JSON 后附带的废话字符数")
+    parser.add_argument("--payload", type=int, default=2000, help="运行脚本动作输出的字符数")
+    parser.add_argument("--settle-mode", choices=("detect", "fixed"), default="detect", help="GUI 动作后的等待方式")
+    parser.add_argument("--settle", type=float, default=2.0, help="fixed 模式下的等待时间 (秒)")
+    parser.add_argument("--animation", type=float, default=0.2, help="假桌面在每次输入后的动画时长 (秒)")
+    parser.add_argument("--no-stream", action="store_true", help="关闭流式执行器")
+    parser.add_argument("--crop", action="store_true", help="视觉验证只发送变化区域 (VISION_DIFF_CROP)")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    # 必须在导入项目模块之前：假 GUI 后端 + 桩服务配置
+    fakes.install()
+    os.environ.setdefault("API_URL", "http://127.0.0.1:9/v1")
+    os.environ.setdefault("API_KEY", "bench")
+    os.environ.setdefault("MODEL_NAME", "stub")
+    os.environ["LLM_REPLAY_MODE"] = "off"
+    os.environ["STREAM_EXECUTOR"] = "0" if args.no_stream else "1"
+    os.environ["SETTLE_MODE"] = args.settle_mode
+    os.environ["VISION_DIFF_CROP"] = "1" if args.crop else "0"
+
+    from core.logger import console
+    from core.skill_manager import SkillManager
+    console.quiet = True
+
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        runtime = {"brain": SkillManager(context={"vision": None})}
+        for n in [int(x) for x in args.steps.split(",") if x.strip()]:
+            results.append(asyncio.run(run_scenario(n, args, runtime)))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
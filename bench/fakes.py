@@ -0,0 +1,77 @@
+"""
+Fake GUI Backends
+用内存实现替换 pyautogui / pyperclip，让真实的技能代码在无显示器环境下运行
+必须在导入 core.vision / skills 之前调用 install()
+"""
+
+import sys
+import time
+import types
+from PIL import Image, ImageDraw
+
+SCREEN_SIZE = (1920, 1080)
+
+
+class FakeDesktop:
+    """
+    记录所有输入事件；每次输入都会让屏幕内容发生一点变化，
+    并在之后 animation 秒内持续播放一段动画（模拟窗口弹出/页面加载）
+    """
+
+    def __init__(self, size=SCREEN_SIZE, animation=0.0):
+        self.size = size
+        self.animation = animation
+        self.events = []
+        self.clipboard = ""
+        self.last_event_at = 0.0
+
+    def record(self, *event):
+        self.events.append(event)
+        self.last_event_at = time.perf_counter()
+
+    def screenshot(self, region=None):
+        img = Image.new("RGB", self.size, (32, 32, 40))
+        draw = ImageDraw.Draw(img)
+        # 画一个跟事件数相关的窗口，保证不同步骤的截图不一样
+        n = len(self.events)
+        draw.rectangle((100 + n * 7 % 400, 100, 900, 700), fill=(220, 220, 220))
+        draw.text((120, 120), f"events={n} last={self.events[-1] if self.events else None}", fill=(0, 0, 0))
+        since = time.perf_counter() - self.last_event_at
+        if since < self.animation:
+            # 动画：一个从左往右滑的大色块
+            x = int(1000 * since / self.animation)
+            draw.rectangle((x, 750, x + 400, 1000), fill=(60, 140, 220))
+        if region:
+            left, top, width, height = region
+            img = img.crop((left, top, left + width, top + height))
+        return img
+
+
+DESKTOP = FakeDesktop()
+
+
+def _make_pyautogui(desktop):
+    mod = types.ModuleType("pyautogui")
+    mod.size = lambda: desktop.size
+    mod.screenshot = lambda region=None, **kw: desktop.screenshot(region)
+    for name in ("hotkey", "press", "click", "doubleClick", "moveTo", "scroll", "typewrite", "write"):
+        setattr(mod, name, (lambda n: lambda *a, **kw: desktop.record(n, a))(name))
+    return mod
+
+
+def _make_pyperclip(desktop):
+    mod = types.ModuleType("pyperclip")
+
+    def copy(text):
+        desktop.clipboard = text
+
+    mod.copy = copy
+    mod.paste = lambda: desktop.clipboard
+    return mod
+
+
+def install(desktop=DESKTOP):
+    """把假模块注入 sys.modules"""
+    sys.modules["pyautogui"] = _make_pyautogui(desktop)
+    sys.modules["pyperclip"] = _make_pyperclip(desktop)
+    return desktop
@@ -0,0 +1,169 @@
+"""
+OpenAI-Compatible Stub Server
+说 /chat/completions 协议的本地桩服务：按脚本回复，可配置首字延迟、逐块延迟、流式输出
+同时统计每个请求的字节数，供基准测试使用
+"""
+
+import json
+import math
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def classify_request(body):
+    """根据消息内容判断请求类型: plan / vision / think"""
+    messages = body.get("messages", [])
+    for msg in messages:
+        content = msg.get("content")
+        if isinstance(content, list) and any(item.get("type") == "image_url" for item in content):
+            return "vision"
+    if messages and messages[0].get("role") == "system" and "任务架构师" in (messages[0].get("content") or ""):
+        return "plan"
+    return "think"
+
+
+class ScriptedResponder:
+    """
+    按请求类型给出脚本化的回复
+    actions: 执行器依次返回的动作 JSON 列表，用完后返回 finish
+    tail: 动作 JSON 后面附带的“废话”，用来体现流式提前截断的收益
+    """
+
+    def __init__(self, actions, plan="Step 1: 按顺序执行。", observation="当前是测试窗口，操作成功。", tail=""):
+        self.actions = list(actions)
+        self.plan = plan
+        self.observation = observation
+        self.tail = tail
+        self._think_calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, kind, body):
+        if kind == "plan":
+            return self.plan
+        if kind == "vision":
+            return self.observation
+        with self._lock:
+            i = self._think_calls
+            self._think_calls += 1
+        if i < len(self.actions):
+            return json.dumps(self.actions[i], ensure_ascii=False) + self.tail
+        return json.dumps({"thought": "完成", "action": "finish", "args": {"summary": "done"}}, ensure_ascii=False)
+
+
+class StubServer:
+    """
+    本地桩服务
+
+    Args:
+        responder: callable(kind, body) -> 回复文本
+        first_token_latency: 首字延迟 (秒)
+        chunk_latency: 流式输出每块之间的延迟 (秒)
+        chunk_chars: 流式输出每块字符数
+    """
+
+    def __init__(self, responder, first_token_latency=0.0, chunk_latency=0.0, chunk_chars=8):
+        self.responder = responder
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.chunk_chars = chunk_chars
+        self.requests = []   # (kind, 请求字节数)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_port}/v1"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                body = json.loads(raw)
+                kind = classify_request(body)
+                with server._lock:
+                    server.requests.append((kind, len(raw)))
+                text = server.responder(kind, body)
+                time.sleep(server.first_token_latency)
+                if body.get("stream"):
+                    self._stream(text, body)
+                else:
+                    self._complete(text, body, len(raw))
+
+            def _usage(self, prompt_bytes, text):
+                return {"prompt_tokens": prompt_bytes // 4, "completion_tokens": len(text) // 4,
+                        "total_tokens": prompt_bytes // 4 + len(text) // 4}
+
+            def _complete(self, text, body, prompt_bytes):
+                # 非流式也要等完整个生成过程，否则和流式对比不公平
+                time.sleep(server.chunk_latency * math.ceil(len(text) / server.chunk_chars))
+                payload = json.dumps({
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": self._usage(prompt_bytes, text)
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, text, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for i in range(0, len(text), server.chunk_chars):
+                        chunk = {
+                            "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                            "model": body.get("model"),
+                            "choices": [{"index": 0, "delta": {"content": text[i:i + server.chunk_chars]}, "finish_reason": None}]
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(server.chunk_latency)
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        # OpenAI 的格式：最后单独一块，choices 为空，带整次请求的 usage
+                        chunk = {
+                            "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                            "model": body.get("model"), "choices": [],
+                            "usage": self._usage(len(json.dumps(body)), text)
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前断开（流式执行器拿到 JSON 就走了）
+                    pass
+                self.close_connection = True
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = []
+
+    def bytes_by_kind(self):
+        stats = {}
+        with self._lock:
+            for kind, size in self.requests:
+                entry = stats.setdefault(kind, {"requests": 0, "bytes": 0})
+                entry["requests"] += 1
+                entry["bytes"] += size
+        return stats
@@ -0,0 +1,96 @@
+"""
+Batch Runner
+无人值守批量模式：从 JSONL 读任务，每个任务是一个独立会话
+- 只用非 GUI 技能的会话在 worker 池里并发执行
+- 动到桌面的动作由一把全局桌面锁串行化
+- 每个任务的结果、步数、耗时、Token 用量写入输出 JSONL
+"""
+
+import json
+import time
+import asyncio
+from core.logger import log
+
+
+def load_tasks(path):
+    """
+    读取任务文件，每行一个 JSON: {"id": "...", "task": "..."}
+    也接受纯字符串行（id 自动编号）
+    """
+    tasks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if isinstance(item, str):
+                item = {"task": item}
+            if not item.get("task"):
+                log.error(f"任务文件第 {n} 行缺少 task 字段，已跳过")
+                continue
+            item.setdefault("id", f"task-{n}")
+            tasks.append(item)
+    return tasks
+
+
+class BatchRunner:
+    """
+    并发批量执行器
+    """
+
+    def __init__(self, make_engine, workers=4):
+        """
+        Args:
+            make_engine: 工厂函数 make_engine(desktop_lock) -> AgentEngine，每个任务一个新会话
+            workers: 最大并发会话数
+        """
+        self.make_engine = make_engine
+        self.workers = max(1, workers)
+        self.desktop_lock = asyncio.Lock()
+
+    async def run_one(self, item):
+        """跑一个任务，返回结果记录（异常也记录下来，不影响其他任务）"""
+        engine = self.make_engine(self.desktop_lock)
+        start = time.perf_counter()
+        record = {"id": item["id"], "task": item["task"]}
+        try:
+            summary = await engine.run_task(item["task"])
+            record["status"] = "finished" if summary is not None else "incomplete"
+            record["summary"] = summary
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+
+        record["steps"] = engine.steps_taken
+        record["latency_s"] = round(time.perf_counter() - start, 3)
+        record["usage"] = engine.usage.snapshot()
+        return record
+
+    async def run(self, tasks, out_path):
+        """
+        执行全部任务，完成一个写一行（按完成顺序）
+
+        Returns:
+            list: 全部结果记录
+        """
+        semaphore = asyncio.Semaphore(self.workers)
+        results = []
+
+        with open(out_path, "w", encoding="utf-8") as out:
+            async def worker(item):
+                async with semaphore:
+                    log.system(f"[Batch] 开始 {item['id']}: {item['task'][:40]}")
+                    record = await self.run_one(item)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                results.append(record)
+                log.system(f"[Batch] 完成 {record['id']}: {record['status']} ({record['steps']} 步, {record['latency_s']}s)")
+
+            await asyncio.gather(*(worker(item) for item in tasks))
+
+        finished = sum(1 for r in results if r["status"] == "finished")
+        log.system(f"[Batch] 全部完成: {finished}/{len(results)} 成功，结果已写入 {out_path}")
+        return results
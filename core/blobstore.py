@@ -0,0 +1,138 @@
+"""
+Blob Store
+内容寻址的截图仓库：hash -> bytes
+对话历史里只存引用 {"type": "image_ref", "ref": ...}，
+真正发请求时才把最新的一张还原成 data URL。
+"""
+
+import os
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+IMAGE_PLACEHOLDER = "[历史截图已移除以节省Token]"
+
+
+class BlobStore:
+    """
+    带内存上限的 LRU 仓库，可选溢出到磁盘
+    """
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, spill_dir=None):
+        """
+        Args:
+            max_memory_bytes: 内存中最多保留的字节数
+            spill_dir: 溢出目录（为空则被挤出内存的 blob 直接丢弃）
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self._blobs = OrderedDict()
+        self._mimes = {}
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @property
+    def memory_bytes(self):
+        return self._memory_bytes
+
+    def _spill_path(self, ref):
+        return os.path.join(self.spill_dir, f"{ref}.bin")
+
+    def put(self, data: bytes, mime="image/jpeg") -> str:
+        """存入一段数据，返回它的引用 (sha256)"""
+        ref = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._mimes[ref] = mime
+            if ref in self._blobs:
+                self._blobs.move_to_end(ref)
+                return ref
+            self._blobs[ref] = data
+            self._memory_bytes += len(data)
+            self._evict()
+        return ref
+
+    def _evict(self):
+        # 最新放入的那一个永远留在内存里
+        while self._memory_bytes > self.max_memory_bytes and len(self._blobs) > 1:
+            ref, data = self._blobs.popitem(last=False)
+            self._memory_bytes -= len(data)
+            if self.spill_dir:
+                path = self._spill_path(ref)
+                if not os.path.exists(path):
+                    with open(path, "wb") as f:
+                        f.write(data)
+            else:
+                self._mimes.pop(ref, None)
+
+    def get(self, ref):
+        """按引用取数据（内存 -> 磁盘），找不到返回 None"""
+        with self._lock:
+            data = self._blobs.get(ref)
+            if data is not None:
+                self._blobs.move_to_end(ref)
+                return data
+
+            if not self.spill_dir: return None
+            path = self._spill_path(ref)
+            if not os.path.exists(path): return None
+            with open(path, "rb") as f:
+                data = f.read()
+            self._blobs[ref] = data
+            self._memory_bytes += len(data)
+            self._evict()
+            return data
+
+    def __contains__(self, ref):
+        with self._lock:
+            if ref in self._blobs: return True
+        return bool(self.spill_dir) and os.path.exists(self._spill_path(ref))
+
+    def data_url(self, ref):
+        data = self.get(ref)
+        if data is None: return None
+        mime = self._mimes.get(ref, "image/jpeg")
+        return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def image_ref(ref):
+    """构造消息里的图片引用条目"""
+    return {"type": "image_ref", "ref": ref}
+
+
+def materialize_messages(messages, store, latest_ref=None):
+    """
+    发请求前把引用还原成模型能看懂的格式
+    只有 latest_ref 那一张会变成 data URL，其他旧图一律替换为占位文字。
+    原始历史不会被修改。
+
+    Args:
+        messages: 对话历史
+        store: BlobStore
+        latest_ref: 最新截图的引用
+
+    Returns:
+        list: 可以直接发给模型的 messages
+    """
+    out = []
+    for msg in messages:
+        content = msg.get("content")
+        if not isinstance(content, list):
+            out.append(msg)
+            continue
+
+        new_content = []
+        for item in content:
+            if item.get("type") != "image_ref":
+                new_content.append(item)
+                continue
+            url = store.data_url(item["ref"]) if item["ref"] == latest_ref else None
+            if url:
+                new_content.append({"type": "image_url", "image_url": {"url": url}})
+            else:
+                new_content.append({"type": "text", "text": IMAGE_PLACEHOLDER})
+        out.append({**msg, "content": new_content})
+    return out
@@ -0,0 +1,311 @@
+"""
+Screen Capture
+统一的截图子系统：
+- 可插拔后端: pyautogui / mss / fake（测试和基准用）
+- 可选后台线程，持续把最近几帧放进环形缓冲区，调用方拿最新帧几乎零延迟
+- 每一帧的 缩放+编码 结果按 (尺寸, 质量, 格式, 裁剪框) 缓存，同一帧多处使用只编码一次
+- 有键鼠输入时 invalidate()，之前的帧不再作为"最新画面"返回
+"""
+
+import time
+import threading
+from io import BytesIO
+from collections import deque
+from PIL import Image
+from core.tracing import tracer
+
+
+# ---------- 后端 ----------
+
+class CaptureBackend:
+    """截图后端基类：grab() 返回整屏 RGB 的 PIL.Image"""
+    name = "base"
+
+    def grab(self):
+        raise NotImplementedError
+
+    def screen_size(self):
+        """鼠标/键盘使用的屏幕坐标尺寸（HiDPI 下可能小于截图像素尺寸）"""
+        try:
+            import pyautogui
+            return tuple(pyautogui.size())
+        except Exception:
+            return self.grab().size
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def grab(self):
+        return self._pyautogui.screenshot()
+
+    def screen_size(self):
+        return tuple(self._pyautogui.size())
+
+
+class MssBackend(CaptureBackend):
+    """mss 直接读显存，通常比 pyautogui 快几倍（需要 pip install mss）"""
+    name = "mss"
+
+    def __init__(self, monitor=1):
+        import mss
+        self._mss = mss
+        self.monitor = monitor
+        # mss 实例不能跨线程共享，每个线程一个
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        return sct
+
+    def grab(self):
+        sct = self._sct()
+        shot = sct.grab(sct.monitors[self.monitor])
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+
+class FakeBackend(CaptureBackend):
+    """
+    测试用后端
+
+    Args:
+        source: PIL.Image，或者每次调用返回 PIL.Image 的函数
+        screen_size: 屏幕坐标尺寸（默认与图片一致）
+    """
+    name = "fake"
+
+    def __init__(self, source=None, screen_size=None):
+        self.source = source if source is not None else Image.new("RGB", (1920, 1080), (32, 32, 40))
+        self._screen_size = screen_size
+
+    def grab(self):
+        image = self.source() if callable(self.source) else self.source
+        return image.copy()
+
+    def screen_size(self):
+        return self._screen_size or self.grab().size
+
+
+BACKENDS = {"pyautogui": PyAutoGuiBackend, "mss": MssBackend, "fake": FakeBackend}
+
+
+def make_backend(name):
+    """按名字创建后端；mss 不可用时退回 pyautogui"""
+    cls = BACKENDS.get(name)
+    if cls is None:
+        raise ValueError(f"未知的截图后端: {name}")
+    try:
+        return cls()
+    except ImportError as e:
+        if name == "pyautogui": raise
+        print(f"❌ 截图后端 {name} 不可用 ({e})，改用 pyautogui")
+        return PyAutoGuiBackend()
+
+
+# ---------- 帧 ----------
+
+class Frame:
+    """一帧截图 + 它的编码结果缓存"""
+
+    __slots__ = ("seq", "image", "timestamp", "_encoded", "_lock")
+
+    def __init__(self, seq, image, timestamp=None):
+        self.seq = seq
+        self.image = image
+        self.timestamp = timestamp or time.monotonic()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def encode(self, max_size, quality=50, fmt="JPEG", box=None, resample=Image.Resampling.BICUBIC):
+        """
+        裁剪(可选) -> 等比缩放到 max_size 以内 -> 编码，结果按参数缓存
+
+        Args:
+            max_size: 最大边长 (int) 或 边界框 (w, h)
+            box: 截图像素裁剪框 (left, top, right, bottom)
+
+        Returns:
+            tuple: (字节, 编码后的图片尺寸)
+        """
+        bounds = (max_size, max_size) if isinstance(max_size, int) else tuple(max_size)
+        key = (bounds, quality, fmt, box, resample)
+        with self._lock:
+            cached = self._encoded.get(key)
+        if cached is not None:
+            return cached
+
+        with tracer.span("capture.encode", format=fmt, quality=quality) as sp:
+            image = self.image.crop(box) if box else self.image
+            # convert 总是返回新图，后面原地缩放不会影响缓存的原始帧
+            image = image.convert("RGB")
+            if image.size[0] > bounds[0] or image.size[1] > bounds[1]:
+                image.thumbnail(bounds, resample)
+            buffered = BytesIO()
+            image.save(buffered, format=fmt, quality=quality)
+            result = (buffered.getvalue(), image.size)
+            sp.set(bytes=len(result[0]), width=image.size[0], height=image.size[1])
+
+        with self._lock:
+            self._encoded[key] = result
+        return result
+
+    def encode_profile(self, profile, formats=("jpeg",), box=None):
+        """
+        按编码档位 (core.encoding.EncodingProfile) 编码，结果按 (档位, 可用格式, 裁剪框) 缓存
+
+        Returns:
+            dict: EncodingProfile.render 的结果
+        """
+        key = ("profile", profile.name, tuple(formats), box)
+        with self._lock:
+            cached = self._encoded.get(key)
+        if cached is not None:
+            return cached
+
+        with tracer.span("capture.encode", profile=profile.name) as sp:
+            image = self.image.crop(box) if box else self.image
+            result = profile.render(image, formats)
+            sp.set(format=result["format"], bytes=len(result["data"]), width=result["size"][0], height=result["size"][1])
+
+        with self._lock:
+            self._encoded[key] = result
+        return result
+
+
+# ---------- 服务 ----------
+
+class CaptureService:
+    """
+    截图服务
+
+    Args:
+        backend: CaptureBackend 实例
+        ring_size: 环形缓冲区保留的帧数
+        interval: 后台截图间隔 (秒)，调用 start() 后生效
+    """
+
+    def __init__(self, backend, ring_size=4, interval=0.2):
+        self.backend = backend
+        self.interval = interval
+        self._ring = deque(maxlen=max(1, ring_size))
+        self._lock = threading.Lock()
+        self._seq = 0
+        # 早于该时间的帧视为过期（有键鼠输入）
+        self._not_before = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._screen_size = None
+
+    def screen_size(self):
+        if self._screen_size is None:
+            self._screen_size = tuple(self.backend.screen_size())
+        return self._screen_size
+
+    def grab(self):
+        """立即截一帧（同时放进环形缓冲区）"""
+        # 帧时间取开始截图的时刻：截图途中发生的输入会让这一帧过期
+        started = time.monotonic()
+        with tracer.span("capture.grab", backend=self.backend.name) as sp:
+            image = self.backend.grab()
+            sp.set(width=image.size[0], height=image.size[1])
+        with self._lock:
+            self._seq += 1
+            frame = Frame(self._seq, image, started)
+            self._ring.append(frame)
+        return frame
+
+    def latest(self, max_age=None):
+        """
+        最新的一帧：缓冲区里有足够新、且在最近一次输入之后截的帧就直接用，否则现场截
+
+        Args:
+            max_age: 可接受的最大帧龄 (秒)，None 表示只要没过期就行
+        """
+        with self._lock:
+            frame = self._ring[-1] if self._ring else None
+        if frame is not None and frame.timestamp >= self._not_before:
+            if max_age is None or frame.age <= max_age:
+                return frame
+        return self.grab()
+
+    def frames(self):
+        """缓冲区里的全部帧（旧 -> 新）"""
+        with self._lock:
+            return list(self._ring)
+
+    def invalidate(self):
+        """有键鼠输入：此前的帧都不再是"当前画面" """
+        self._not_before = time.monotonic()
+
+    # ---------- 后台线程 ----------
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running: return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.grab()
+            except Exception as e:
+                print(f"❌ 后台截图失败: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_capture():
+    """进程内共享的截图服务（按配置创建，配置了后台间隔则自动启动后台线程）"""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            from core.config import settings
+            _SERVICE = CaptureService(
+                make_backend(settings.CAPTURE_BACKEND),
+                ring_size=settings.CAPTURE_RING_SIZE,
+                interval=settings.CAPTURE_INTERVAL or 0.2
+            )
+            if settings.CAPTURE_INTERVAL > 0:
+                _SERVICE.start()
+        return _SERVICE
+
+
+def set_capture(service):
+    """替换共享截图服务（测试/基准用），返回旧的"""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        old, _SERVICE = _SERVICE, service
+    return old
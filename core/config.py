@@ -13,6 +13,118 @@ class Settings(BaseSettings):
     VISION_MODEL_URL: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
     VISION_MODEL_API_KEY: str = "" # 必填，如果 .env 里没有就会报错
 
+    # 执行器流式输出：检测到动作 JSON 闭合即执行
+    STREAM_EXECUTOR: bool = True
+    # 剩余输出的处理方式：False=直接断开, True=后台读完
+    STREAM_DRAIN_TAIL: bool = False
+    # 流式请求附带 usage (usage 在流的最后一块，开启后剩余输出总是在后台读完，任务结束前汇总)
+    # 服务端不支持 stream_options 时关掉；关掉后流式执行器的 Token 用量和缓存命中统计不到
+    STREAM_INCLUDE_USAGE: bool = True
+    # 单次回复最多允许的批量动作数
+    MAX_BATCH_ACTIONS: int = 8
+
+    # 上下文 Token 预算 (系统提示词 + 当前任务永远保留，其余超预算折叠成摘要)
+    CONTEXT_TOKEN_BUDGET: int = 24000
+    CONTEXT_SUMMARY_TOKENS: int = 800
+    CONTEXT_MAX_MESSAGE_TOKENS: int = 6000
+    # 计数方式: heuristic 或 tiktoken:<encoding>
+    CONTEXT_TOKENIZER: str = "heuristic"
+
+    # 观察截图是否附加进对话历史（只存引用，发请求时仅还原最新一张）
+    ATTACH_OBSERVATION_IMAGE: bool = False
+    # 截图仓库内存上限 (MB) 与溢出目录 (为空则不落盘)
+    BLOB_MEMORY_MB: int = 64
+    BLOB_SPILL_DIR: str = ""
+
+    # GUI 动作后的等待方式: detect=检测画面稳定, fixed=固定等待 SETTLE_FIXED_DELAY 秒
+    SETTLE_MODE: str = "detect"
+    SETTLE_FIXED_DELAY: float = 2.0
+    # 稳定检测: 截帧间隔 / 需连续稳定时长 / 最长等待 / 最短等待 (秒)，帧差阈值 (0~255)
+    SETTLE_INTERVAL: float = 0.05
+    SETTLE_STABLE_WINDOW: float = 0.3
+    SETTLE_TIMEOUT: float = 3.0
+    SETTLE_MIN_DELAY: float = 0.1
+    SETTLE_DIFF_THRESHOLD: float = 1.0
+
+    # 视觉观察缓存: 截图感知哈希 + 问题相同则复用回答 (容量 0 表示关闭)
+    VISION_CACHE_SIZE: int = 64
+    # 允许的最大汉明距离 / dHash 边长 (位数 = 边长^2)
+    VISION_CACHE_MAX_DISTANCE: int = 4
+    VISION_CACHE_HASH_SIZE: int = 16
+
+    # 差异裁剪: 验证操作时只发送变化区域原图 + 整屏小缩略图
+    VISION_DIFF_CROP: bool = False
+    # 变化区域超过整屏的该比例时退回整屏截图
+    VISION_CROP_MAX_AREA: float = 0.5
+
+    # 元素位置缓存: 同一窗口再找同一元素时先本地比对图块 (容量 0 表示关闭，需要 numpy)
+    ELEMENT_CACHE_SIZE: int = 128
+    # 图块边长 / 原位置四周的搜索范围 (截图像素) / NCC 匹配阈值
+    ELEMENT_CACHE_PATCH: int = 64
+    ELEMENT_CACHE_SEARCH: int = 48
+    ELEMENT_CACHE_THRESHOLD: float = 0.9
+
+    # 视觉请求调度: 并发数 / 最多排队数 / 限速 (每秒请求数, 0 表示不限) / 令牌桶容量
+    VISION_CONCURRENCY: int = 2
+    VISION_QUEUE_SIZE: int = 16
+    VISION_RATE_LIMIT: float = 0.0
+    VISION_RATE_BURST: int = 4
+    # 429/5xx 重试次数 / 退避基准与上限 (秒) / 单请求总截止时间 (秒，含排队和重试)
+    VISION_MAX_RETRIES: int = 3
+    VISION_RETRY_BASE: float = 0.5
+    VISION_RETRY_MAX: float = 8.0
+    VISION_DEADLINE: float = 60.0
+    # 截图缩放/编码线程数
+    VISION_ENCODE_WORKERS: int = 2
+
+    # 两级定位: 粗定位置信度低于该值、或缩略图缩小超过该倍数时，截局部原图再定位一次
+    LOCATE_REFINE_CONFIDENCE: float = 0.85
+    LOCATE_REFINE_SCALE: float = 2.0
+    # 局部原图的边长 (屏幕坐标)
+    LOCATE_REFINE_SIZE: int = 400
+
+    # 视觉服务端支持的图片格式 (逗号分隔: jpeg, webp, png)；编码档位按偏好选其中第一个可用的
+    VISION_IMAGE_FORMATS: str = "jpeg"
+    # 图片 Token 估算方式: qwen (28x28 像素/token) / openai (512 分块)
+    VISION_TOKEN_SCHEME: str = "qwen"
+
+    # 截图后端: pyautogui / mss / fake
+    CAPTURE_BACKEND: str = "pyautogui"
+    # 后台截图间隔 (秒，0 表示不开后台线程) / 环形缓冲帧数 / 复用缓冲帧的最大帧龄 (秒)
+    CAPTURE_INTERVAL: float = 0.0
+    CAPTURE_RING_SIZE: int = 4
+    CAPTURE_MAX_AGE: float = 0.25
+    # 发给视觉模型的截图范围: screen (整屏) / window (只截前台窗口)
+    CAPTURE_SCOPE: str = "screen"
+    # 前台窗口信息来源: auto / pygetwindow / xdotool / none
+    WINDOW_PROVIDER: str = "auto"
+
+    # 批量模式默认并发会话数
+    BATCH_WORKERS: int = 4
+
+    # 断点恢复: 当前画面与中断时的指纹汉明距离超过该值就提醒模型先确认界面
+    RESUME_SCREEN_TOLERANCE: int = 24
+
+    # 轨迹记忆: 规划前检索相似的成功任务作为示例 (条数 / 最低相似度 0~1)
+    TRAJECTORY_MEMORY: bool = True
+    TRAJECTORY_TOP_K: int = 3
+    TRAJECTORY_MIN_SCORE: float = 0.3
+    # 任务文本相似度达到该值、且数字/文件名/引号内容完全一致时直接复用当时的计划，跳过规划调用 (大于 1 表示从不跳过)
+    TRAJECTORY_REUSE_THRESHOLD: float = 0.95
+
+    # 宏回放: 检查点画面与录制时的指纹汉明距离超过该值就交还给模型
+    MACRO_SCREEN_TOLERANCE: int = 12
+
+    # LLM/视觉调用录制回放: off / record / replay / cache
+    LLM_REPLAY_MODE: str = "off"
+    LLM_REPLAY_PATH: str = "./memory/replay.db"
+    # 请求 key 是否区分图片内容 (真实桌面回放时关掉)
+    LLM_REPLAY_MATCH_IMAGES: bool = True
+
+    # 耗时追踪: 任务采样率 (0=关闭, 1=全部) 与导出目录 (JSONL + Chrome trace)
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_DIR: str = "./memory/traces"
+
     DEBUG: bool = False
     
     model_config = SettingsConfigDict(
@@ -0,0 +1,220 @@
+"""
+Context Manager
+按 Token 预算管理对话历史：
+- 系统提示词 和 当前任务/计划 永远保留
+- 超出预算时从最老的轮次开始整轮淘汰（assistant + 它的工具反馈一起走，不会拆散）
+- 被淘汰的轮次压缩成一段滚动摘要
+"""
+
+import re
+from core.logger import log
+from core.streaming import extract_json
+from core.blobstore import IMAGE_PLACEHOLDER
+
+SUMMARY_HEADER = "[早期对话摘要]"
+
+# 多模态消息里一张图的估算成本（按常见 VL 模型的 768px 图粗估）
+IMAGE_TOKEN_COST = 800
+# 每条消息的格式开销 (role、分隔符等)
+MESSAGE_OVERHEAD = 4
+
+_CJK_RE = re.compile(r'[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def heuristic_tokens(text):
+    """
+    本地估算 Token 数（不依赖任何分词器）
+    中日韩字符约 1 字 1 token，其余约 4 字符 1 token
+    """
+    if not text: return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def load_tokenizer(spec="heuristic"):
+    """
+    根据配置加载计数函数
+
+    Args:
+        spec: "heuristic" 或 "tiktoken:<encoding>" (例如 tiktoken:cl100k_base)
+
+    Returns:
+        callable: text -> token 数
+    """
+    if spec and spec.startswith("tiktoken"):
+        try:
+            import tiktoken
+            encoding_name = spec.split(":", 1)[1] if ":" in spec else "cl100k_base"
+            encoding = tiktoken.get_encoding(encoding_name)
+            return lambda text: len(encoding.encode(text, disallowed_special=())) if text else 0
+        except Exception as e:
+            log.error(f"分词器 {spec} 加载失败，改用估算: {e}")
+    return heuristic_tokens
+
+
+def summarize_turn(turn):
+    """
+    默认摘要器：把一轮对话压成一行（纯本地，不调用模型）
+    """
+    parts = []
+    for msg in turn:
+        content = msg.get("content")
+        if isinstance(content, list):
+            content = " ".join(item.get("text", "") for item in content if item.get("type") == "text")
+        content = (content or "").strip()
+
+        if msg.get("role") == "assistant":
+            data = extract_json(content)
+            if isinstance(data, dict):
+                items = data.get("actions") if isinstance(data.get("actions"), list) else [data]
+                names = [str(item.get("action")) for item in items if isinstance(item, dict) and item.get("action")]
+                if names:
+                    parts.append("动作: " + " -> ".join(names))
+                    continue
+            parts.append("回复: " + content[:60].replace("\n", " "))
+        else:
+            first_line = content.replace("工具输出:", "").strip().split("\n")[0]
+            parts.append("结果: " + first_line[:80])
+    return "; ".join(parts)
+
+
+class ContextManager:
+    """
+    Token 预算下的对话历史管理器
+    """
+
+    def __init__(self, budget=24000, tokenizer=None, summarizer=None, summary_tokens=800, max_message_tokens=6000):
+        """
+        Args:
+            budget: 发给模型的整个 messages 的 Token 上限
+            tokenizer: 计数函数 text -> int（默认本地估算）
+            summarizer: 轮次摘要函数 list[message] -> str
+            summary_tokens: 滚动摘要的 Token 上限
+            max_message_tokens: 单条消息的 Token 上限，超长的终端输出会掐头去尾
+        """
+        self.budget = budget
+        self.tokenizer = tokenizer or heuristic_tokens
+        self.summarizer = summarizer or summarize_turn
+        self.summary_tokens = summary_tokens
+        self.max_message_tokens = max_message_tokens
+
+        self.summary_lines = []
+        self._summary_msg = None
+        # 计数缓存: id(msg) -> (content 对象, token 数)
+        self._count_cache = {}
+
+    def reset(self):
+        self.summary_lines = []
+        self._summary_msg = None
+        self._count_cache = {}
+
+    # ---------- 计数 ----------
+
+    def count_message(self, msg):
+        content = msg.get("content")
+        cached = self._count_cache.get(id(msg))
+        if cached and cached[0] is content:
+            return cached[1]
+
+        if isinstance(content, list):
+            n = 0
+            for item in content:
+                if item.get("type") == "text":
+                    n += self.tokenizer(item.get("text", ""))
+                elif item.get("type") == "image_ref":
+                    # 引用只有最新一张会被还原成图片，其余都是占位文字
+                    n += self.tokenizer(IMAGE_PLACEHOLDER)
+                else:
+                    n += IMAGE_TOKEN_COST
+        else:
+            n = self.tokenizer(content or "")
+        n += MESSAGE_OVERHEAD
+
+        self._count_cache[id(msg)] = (content, n)
+        return n
+
+    def count(self, messages):
+        return sum(self.count_message(m) for m in messages)
+
+    # ---------- 裁剪 ----------
+
+    def _clip_message(self, msg):
+        """单条超长文本消息：保留头尾，中间省略"""
+        content = msg.get("content")
+        if not isinstance(content, str): return
+        if self.count_message(msg) <= self.max_message_tokens: return
+
+        # 按比例估算保留的字符数
+        keep_chars = int(len(content) * self.max_message_tokens / self.count_message(msg)) // 2
+        omitted = len(content) - keep_chars * 2
+        msg["content"] = f"{content[:keep_chars]}\n...[已省略 {omitted} 字符]...\n{content[-keep_chars:]}"
+
+    def _group_turns(self, messages, pinned_ids):
+        """
+        把可淘汰的消息按轮次分组：一条 assistant 加上它后面的所有 user 反馈
+        返回 [[下标...], ...]，固定消息不参与分组
+        """
+        turns = []
+        current = None
+        for i, msg in enumerate(messages):
+            if id(msg) in pinned_ids:
+                current = None
+                continue
+            if msg.get("role") == "assistant" or current is None:
+                current = []
+                turns.append(current)
+            current.append(i)
+        return turns
+
+    def _render_summary(self):
+        # 摘要本身也有预算，超了就丢最老的行
+        while self.summary_lines and self.tokenizer("\n".join(self.summary_lines)) > self.summary_tokens:
+            self.summary_lines.pop(0)
+        if not self.summary_lines: return None
+        return {"role": "user", "content": SUMMARY_HEADER + "\n" + "\n".join(f"- {line}" for line in self.summary_lines)}
+
+    def fit(self, history, pinned=()):
+        """
+        把历史压到预算以内
+
+        Args:
+            history: 完整消息列表，history[0] 为系统提示词
+            pinned: 额外需要固定保留的消息（例如当前任务/计划那条）
+
+        Returns:
+            list: 新的消息列表 [系统提示词, 摘要?, ...保留的消息]
+        """
+        messages = [m for m in history if m is not self._summary_msg]
+        if not messages: return messages
+
+        pinned_ids = {id(messages[0])} | {id(m) for m in pinned}
+        for msg in messages:
+            if id(msg) not in pinned_ids:
+                self._clip_message(msg)
+
+        turns = self._group_turns(messages, pinned_ids)
+        messages_cost = self.count(messages)
+        total = messages_cost + (self.count_message(self._summary_msg) if self._summary_msg else 0)
+
+        # 最后一轮永远保留（模型需要看到刚才的结果）
+        evicted = set()
+        while total > self.budget and len(turns) > 1:
+            turn = turns.pop(0)
+            turn_msgs = [messages[i] for i in turn]
+            messages_cost -= self.count(turn_msgs)
+            evicted.update(turn)
+            line = self.summarizer(turn_msgs)
+            if line: self.summary_lines.append(line)
+            # 摘要变长了也要算进预算
+            self._summary_msg = self._render_summary()
+            total = messages_cost + (self.count_message(self._summary_msg) if self._summary_msg else 0)
+
+        if evicted:
+            log.loading(f"上下文超出预算，已将 {len(evicted)} 条旧消息折叠进摘要")
+
+        kept = [m for i, m in enumerate(messages) if i not in evicted]
+        live_ids = {id(m) for m in kept}
+        self._count_cache = {k: v for k, v in self._count_cache.items() if k in live_ids}
+        if self._summary_msg:
+            return [kept[0], self._summary_msg] + kept[1:]
+        return kept
@@ -0,0 +1,162 @@
+"""
+Element Location Cache
+click_element 的本地快速路径：同一窗口里找同一个元素，不必每次都问视觉模型
+- key = 窗口特征 + 规整后的元素描述 + 查找区域
+- 命中时保存坐标和坐标周围的一小块灰度图块
+- 再次查找时在原位置附近做归一化互相关 (NCC)，图块还在就直接返回坐标（允许小幅平移）
+- 图块对不上 / 没有纹理的元素不缓存，交给视觉模型
+"""
+
+import threading
+from collections import OrderedDict
+from core.observation_cache import normalize_prompt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _window_sum(a, h, w):
+    """积分图求所有 h x w 窗口的和，结果形状 (H-h+1, W-w+1)"""
+    c = np.pad(a.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return c[h:, w:] - c[:-h, w:] - c[h:, :-w] + c[:-h, :-w]
+
+
+def ncc_map(search, patch):
+    """
+    图块在搜索区域每个位置上的归一化互相关 (-1 ~ 1)
+
+    Args:
+        search: 搜索区域灰度数组 (H, W)
+        patch: 图块灰度数组 (h, w)，h <= H, w <= W
+
+    Returns:
+        ndarray (H-h+1, W-w+1)，图块没有纹理时返回 None
+    """
+    h, w = patch.shape
+    H, W = search.shape
+    if H < h or W < w: return None
+    search = search.astype(np.float64)
+    p = patch.astype(np.float64)
+    p -= p.mean()
+    p_norm = np.sqrt((p * p).sum())
+    if p_norm < 1e-6: return None
+
+    # 分子: 图块去均值后与搜索区域的互相关 (FFT 卷积翻转的图块)
+    shape = (H + h - 1, W + w - 1)
+    spectrum = np.fft.rfft2(search, shape) * np.fft.rfft2(p[::-1, ::-1], shape)
+    num = np.fft.irfft2(spectrum, shape)[h - 1:H, w - 1:W]
+
+    # 分母: 每个窗口的标准差 (积分图)
+    s1 = _window_sum(search, h, w)
+    s2 = _window_sum(search * search, h, w)
+    var = np.maximum(s2 - s1 * s1 / (h * w), 0)
+    denom = np.sqrt(var) * p_norm
+    return np.where(denom > 1e-6, num / np.maximum(denom, 1e-6), 0.0)
+
+
+class ElementCache:
+    """
+    元素位置缓存（坐标均为截图像素）
+
+    Args:
+        capacity: 最多保存的元素数（0 表示关闭）
+        patch_size: 坐标周围保存的图块边长
+        threshold: NCC 超过该值才算图块还在
+        search_margin: 在原位置四周多大范围内找图块（容忍窗口小幅移动）
+        min_contrast: 图块灰度标准差低于该值（纯色块）不缓存
+    """
+
+    def __init__(self, capacity=128, patch_size=64, threshold=0.9, search_margin=48, min_contrast=4.0):
+        self.capacity = capacity if np is not None else 0
+        self.patch_size = patch_size
+        self.threshold = threshold
+        self.search_margin = search_margin
+        self.min_contrast = min_contrast
+        self._entries = OrderedDict()   # key -> (patch, (patch_left, patch_top), (dx, dy))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    @staticmethod
+    def make_key(window, description, region=None):
+        """window: 窗口特征 (标题等)；region: 查找区域 (core.geometry.Region)"""
+        area = tuple(region.to_dict().values()) if region is not None else None
+        return (window or "", normalize_prompt(description), area)
+
+    def _patch_box(self, image_size, x, y):
+        half = self.patch_size // 2
+        left = max(0, min(x - half, image_size[0] - self.patch_size))
+        top = max(0, min(y - half, image_size[1] - self.patch_size))
+        return (left, top, min(image_size[0], left + self.patch_size), min(image_size[1], top + self.patch_size))
+
+    def store(self, key, image, x, y):
+        """
+        记下元素位置和周围图块
+
+        Args:
+            image: 找到元素时的整屏截图 (PIL.Image)
+            x, y: 元素在截图上的像素坐标
+
+        Returns:
+            bool: 是否缓存（图块没有纹理时不缓存）
+        """
+        if not self.enabled: return False
+        box = self._patch_box(image.size, int(x), int(y))
+        patch = np.asarray(image.crop(box).convert("L"), dtype=np.float32)
+        if patch.size == 0 or patch.std() < self.min_contrast:
+            return False
+        entry = (patch, box[:2], (int(x) - box[0], int(y) - box[1]))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return True
+
+    def lookup(self, key, image):
+        """
+        图块还在原位置附近就返回元素的截图像素坐标 (x, y, 得分)，否则返回 None（并删掉这条缓存）
+        """
+        if not self.enabled: return None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        patch, (left, top), (dx, dy) = entry
+        h, w = patch.shape
+        m = self.search_margin
+        box = (max(0, left - m), max(0, top - m), min(image.size[0], left + w + m), min(image.size[1], top + h + m))
+        search = np.asarray(image.crop(box).convert("L"), dtype=np.float32)
+        scores = ncc_map(search, patch)
+        if scores is not None:
+            iy, ix = np.unravel_index(int(np.argmax(scores)), scores.shape)
+            score = float(scores[iy, ix])
+            if score >= self.threshold:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                self.hits += 1
+                return box[0] + int(ix) + dx, box[1] + int(iy) + dy, score
+
+        self.forget(key)
+        self.misses += 1
+        return None
+
+    def forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
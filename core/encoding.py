@@ -0,0 +1,143 @@
+"""
+Image Encoding Profiles
+按用途选择截图的分辨率 / 格式 / 画质，图片 Token 是每步最大的开销：
+- verify:    验证操作是否生效，只需要看清窗口布局 -> 小图、低画质
+- read_text: 读屏幕文字 -> 高分辨率、灰度、锐化
+- locate:    定位元素坐标 -> 中等分辨率，叠加归一化坐标网格帮助模型报坐标
+- refine:    两级定位的第二级，粗定位点周围的局部原图
+- context / detail: 差异裁剪时的整屏小缩略图 / 变化区域原图
+格式按偏好顺序选服务端支持的第一个 (VISION_IMAGE_FORMATS)
+"""
+
+import math
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFilter
+
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+class EncodingProfile:
+    """
+    Args:
+        name: 档位名
+        max_size: 最大边长 (int) 或 边界框 (w, h)
+        quality: JPEG / WebP 画质
+        formats: 格式偏好顺序 (jpeg / webp / png)
+        grayscale: 转灰度
+        sharpen: 缩放后锐化（文字边缘更清楚）
+        grid: 坐标网格的分段数 (0 表示不画)
+        palette: png 时的调色板颜色数
+        resample: 缩放算法
+    """
+
+    def __init__(self, name, max_size, quality, formats=("jpeg",), grayscale=False, sharpen=False,
+                 grid=0, palette=64, resample=Image.Resampling.BICUBIC):
+        self.name = name
+        self.max_size = (max_size, max_size) if isinstance(max_size, int) else tuple(max_size)
+        self.quality = quality
+        self.formats = tuple(formats)
+        self.grayscale = grayscale
+        self.sharpen = sharpen
+        self.grid = grid
+        self.palette = palette
+        self.resample = resample
+
+    def pick_format(self, supported):
+        for fmt in self.formats:
+            if fmt in supported:
+                return fmt
+        return "jpeg"
+
+    def render(self, image, supported=("jpeg",)):
+        """
+        按档位处理并编码
+
+        Returns:
+            dict: {"data": 字节, "mime": MIME 类型, "size": (w, h), "format": 格式, "profile": 档位名}
+        """
+        fmt = self.pick_format(supported)
+        image = image.convert("L" if self.grayscale else "RGB")
+        if image.size[0] > self.max_size[0] or image.size[1] > self.max_size[1]:
+            image.thumbnail(self.max_size, self.resample)
+        if self.sharpen:
+            image = image.filter(ImageFilter.SHARPEN)
+        if self.grid:
+            image = draw_grid(image, self.grid)
+
+        buffered = BytesIO()
+        if fmt == "png":
+            # 调色板 PNG：界面颜色少，文字边缘无损
+            image.convert("P", palette=Image.Palette.ADAPTIVE, colors=self.palette).save(buffered, format="PNG", optimize=True)
+        elif fmt == "webp":
+            image.save(buffered, format="WEBP", quality=self.quality, method=4)
+        else:
+            image.save(buffered, format="JPEG", quality=self.quality)
+        return {"data": buffered.getvalue(), "mime": MIME_TYPES[fmt], "size": image.size, "format": fmt, "profile": self.name}
+
+
+def draw_grid(image, divisions):
+    """叠加归一化坐标网格 (0.1, 0.2, ...)，模型报坐标时可以对照"""
+    image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    w, h = image.size
+    color = (255, 0, 255)
+    for i in range(1, divisions):
+        x, y = w * i // divisions, h * i // divisions
+        label = f"{i / divisions:.1f}"
+        draw.line((x, 0, x, h), fill=color, width=1)
+        draw.line((0, y, w, y), fill=color, width=1)
+        draw.text((x + 2, 2), label, fill=color)
+        draw.text((2, y + 2), label, fill=color)
+    return image
+
+
+PROFILES = {
+    "verify": EncodingProfile("verify", 768, 50, formats=("webp", "jpeg")),
+    "read_text": EncodingProfile("read_text", 1600, 80, formats=("png", "webp", "jpeg"), grayscale=True, sharpen=True),
+    "locate": EncodingProfile("locate", (1280, 720), 70, formats=("webp", "jpeg"), grid=10, resample=Image.Resampling.LANCZOS),
+    "refine": EncodingProfile("refine", 1024, 75, formats=("webp", "jpeg"), grid=10),
+    "context": EncodingProfile("context", 256, 40, formats=("webp", "jpeg")),
+    "detail": EncodingProfile("detail", 1280, 70, formats=("webp", "jpeg")),
+}
+
+
+def get_profile(name):
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"未知的编码档位: {name}")
+    return profile
+
+
+def supported_formats():
+    """服务端支持的图片格式 (VISION_IMAGE_FORMATS, 逗号分隔)"""
+    from core.config import settings
+    return tuple(f.strip().lower() for f in settings.VISION_IMAGE_FORMATS.split(",") if f.strip())
+
+
+def estimate_image_tokens(size, scheme=None):
+    """
+    估算一张图的输入 Token 数
+
+    Args:
+        size: 发送的图片尺寸 (w, h)
+        scheme: qwen (每 28x28 像素一个 token) / openai (512 分块, 85 + 170 * 块数)
+    """
+    if scheme is None:
+        from core.config import settings
+        scheme = settings.VISION_TOKEN_SCHEME
+    w, h = size
+    if scheme == "openai":
+        # 先缩到 2048 以内，再把短边缩到 768
+        scale = min(1.0, 2048 / max(w, h))
+        w, h = w * scale, h * scale
+        scale = min(1.0, 768 / min(w, h))
+        w, h = w * scale, h * scale
+        return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+    return math.ceil(w / 28) * math.ceil(h / 28) + 2
+
+
+def describe(encoded):
+    """一行日志：档位 格式 尺寸 字节数 Token 估算"""
+    w, h = encoded["size"]
+    return (f"[Vision] {encoded['profile']} {encoded['format']} {w}x{h} "
+            f"{len(encoded['data']) / 1024:.1f}KB ≈{estimate_image_tokens(encoded['size'])} tokens")
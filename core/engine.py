@@ -0,0 +1,668 @@
+"""
+Agent Engine (asyncio)
+规划 -> 执行 -> 观察 循环的异步引擎
+阻塞的工作（技能、截图编码、视觉请求）放在线程里执行，不阻塞事件循环（批量模式下多个会话并发）
+"""
+
+import time
+import uuid
+import asyncio
+import platform
+import contextlib
+from core.config import settings
+from core.logger import log, console
+from core.streaming import extract_json, astream_action
+from core.context import ContextManager, load_tokenizer
+from core.blobstore import BlobStore, image_ref, materialize_messages
+from core.prompts import executor_system_prompt, planner_messages, task_message
+from core.usage import UsageTracker
+from core.tracing import tracer, asleep
+from core.settle import SettleDetector
+from core.trajectory import TrajectoryMemory, same_literals
+from skills.base import bind_skill_session
+
+# 只有执行了 GUI 相关的工具，才需要看屏幕
+# 如果只是 ls, cd, get_time，没必要浪费钱和时间去截图
+GUI_TOOLS = ["computer_control", "vscode_write", "email_visual", "browser_use"]
+
+# 会动到屏幕/键鼠的技能：批量并发运行时必须串行地持有桌面锁
+DESKTOP_SKILLS = GUI_TOOLS + ["browser", "look"]
+
+# 任务结束汇总用量时，最多等后台读尾巴的流多少秒
+USAGE_DRAIN_TIMEOUT = 5.0
+
+
+def _message_chars(messages):
+    """请求消息的字符数（图片按 data URL 长度算，只在追踪采样时统计）"""
+    total = 0
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, list):
+            for part in content:
+                total += len(part.get("text") or part.get("image_url", {}).get("url", ""))
+        else:
+            total += len(content or "")
+    return total
+
+
+class AgentEngine:
+    """
+    异步 Agent 引擎
+    持有对话历史、计划和当前步数，一次 run_task 跑完一个任务
+    """
+
+    def __init__(self, client, brain, vision=None, model_name=None, max_steps=15, desktop_lock=None, interactive=True,
+                 state=None, memory=None, macros=None):
+        """
+        Args:
+            client: AsyncOpenAI 客户端
+            brain: SkillManager 实例
+            vision: core.vision.VisionEngine 实例（可选）
+            model_name: 主模型名称
+            max_steps: 单个任务最多执行的步数
+            desktop_lock: 多个会话共享的 asyncio.Lock，GUI 动作在锁内执行（批量模式用）
+            interactive: 是否显示终端转圈动画（并发会话时必须关掉）
+            state: core.state.StateManager 实例（可选），每执行完一个动作自动存一次断点
+            memory: core.trajectory.TrajectoryMemory 实例（可选），规划前检索相似的成功任务
+            macros: core.macro.MacroStore 实例（可选），保存/回放宏
+        """
+        self.client = client
+        self.brain = brain
+        self.vision = vision
+        self.model_name = model_name or settings.MODEL_NAME
+        self.max_steps = max_steps
+        self.desktop_lock = desktop_lock
+        self.interactive = interactive
+        self.state = state
+        self.memory = memory
+        self.macros = macros
+        self.session_id = None
+        # 本次任务成功执行过的动作 (含画面指纹)，以及最近一次成功任务的 (任务, 计划, 动作)，存宏用
+        self.executed = []
+        self.last_run = None
+        # 本引擎自己的技能状态（终端当前目录等），批量模式下多个引擎共用一个 SkillManager，状态不能放在技能实例上
+        self.skill_state = {}
+        # GUI 动作后等待 UI 渲染：检测画面稳定，或固定等待 settle_delay 秒
+        self.settle_delay = settings.SETTLE_FIXED_DELAY
+        self.settle_detector = None
+        if vision and settings.SETTLE_MODE == "detect":
+            self.settle_detector = SettleDetector.from_settings(vision.grab_frame, settings)
+        self.current_os = platform.system()
+
+        self.context = ContextManager(
+            budget=settings.CONTEXT_TOKEN_BUDGET,
+            tokenizer=load_tokenizer(settings.CONTEXT_TOKENIZER),
+            summary_tokens=settings.CONTEXT_SUMMARY_TOKENS,
+            max_message_tokens=settings.CONTEXT_MAX_MESSAGE_TOKENS
+        )
+
+        # 截图只以引用形式进入历史，字节放在内容寻址仓库里
+        self.blobs = BlobStore(
+            max_memory_bytes=settings.BLOB_MEMORY_MB * 1024 * 1024,
+            spill_dir=settings.BLOB_SPILL_DIR or None
+        )
+        self.latest_image_ref = None
+        # Token 用量按任务统计（每个任务开始时换一个新的）
+        self.usage = UsageTracker()
+        # 还在后台读尾巴（等 usage）的流式请求
+        self._drains = set()
+
+        self.task = None
+        self.plan = None
+        self.current_step = 0
+        self.steps_taken = 0
+        self.history = []
+        self._task_msg = None
+        self.reset()
+
+    # ---------- Prompt ----------
+
+    def _status(self, message, spinner):
+        if not self.interactive: return contextlib.nullcontext()
+        return console.status(message, spinner=spinner)
+
+    def build_system_prompt(self):
+        return executor_system_prompt(self.brain, self.current_os)
+
+    def reset(self):
+        """清空记忆，只保留系统提示词"""
+        self.history = [{"role": "system", "content": self.build_system_prompt()}]
+        self._task_msg = None
+        self.latest_image_ref = None
+        self.context.reset()
+
+    def reload_skills(self):
+        """重载插件并刷新系统提示词"""
+        self.brain.load_skills()
+        self.history[0]["content"] = self.build_system_prompt()
+
+    def _fit_context(self):
+        """按 Token 预算整理历史（系统提示词和当前任务/计划固定保留）"""
+        pinned = [self._task_msg] if self._task_msg else []
+        self.history = self.context.fit(self.history, pinned=pinned)
+
+    def request_messages(self):
+        """序列化请求：只把最新一张截图还原成 data URL"""
+        return materialize_messages(self.history, self.blobs, self.latest_image_ref)
+
+    # ---------- 各阶段 ----------
+
+    async def make_plan(self, task, examples=None):
+        """Planner: 生成任务计划（examples: 相似成功任务的参考示例）"""
+        messages = planner_messages(self.brain, self.current_os, task, examples=examples)
+        with tracer.span("llm.plan", model=self.model_name) as sp:
+            if sp: sp.set(prompt_chars=_message_chars(messages))
+            plan_resp = await self.client.chat.completions.create(model=self.model_name, messages=messages)
+            self._record_usage(plan_resp.usage, "plan", sp)
+            return plan_resp.choices[0].message.content
+
+    async def think(self):
+        """Executor: 让模型给出下一步动作"""
+        messages = self.request_messages()
+        with tracer.span("llm.think", model=self.model_name, stream=settings.STREAM_EXECUTOR, step=self.current_step + 1) as sp:
+            if sp: sp.set(prompt_chars=_message_chars(messages))
+            if settings.STREAM_EXECUTOR:
+                # 流式模式：JSON 一闭合就立即执行，不等模型写完后面的评论
+                # usage 在流的最后一块：要统计用量就得在后台把剩余输出读完
+                extra = {"stream_options": {"include_usage": True}} if settings.STREAM_INCLUDE_USAGE else {}
+                content, action_data = await astream_action(
+                    self.client, self.model_name, messages,
+                    drain=settings.STREAM_DRAIN_TAIL or settings.STREAM_INCLUDE_USAGE,
+                    on_usage=lambda usage: self._record_usage(usage, "think", sp),
+                    pending=self._drains,
+                    **extra
+                )
+            else:
+                resp = await self.client.chat.completions.create(model=self.model_name, messages=messages)
+                self._record_usage(resp.usage, "think", sp)
+                content = resp.choices[0].message.content
+                action_data = extract_json(content)
+            if sp: sp.set(completion_chars=len(content or ""))
+            return content, action_data
+
+    def _record_usage(self, usage, kind, span=None):
+        entry = self.usage.record(usage, kind)
+        if entry and span: span.set(**entry)
+        if entry and settings.DEBUG:
+            log.loading(f"[{kind}] prompt {entry['prompt_tokens']} (缓存 {entry['cached_tokens']}) / completion {entry['completion_tokens']}")
+
+    async def act(self, action, args):
+        """执行工具（同步技能在线程池里跑）"""
+        return await self.brain.aexecute(action, **args)
+
+    def needs_vision(self, action):
+        # 只认技能原名：hotkey / type_text 这类路由别名不做视觉检查，不多等一次画面稳定和一次视觉调用
+        return bool(self.vision) and action in GUI_TOOLS
+
+    def uses_desktop(self, action):
+        skill_name = self.brain.resolve_skill_name(action) or action
+        return action in DESKTOP_SKILLS or skill_name in DESKTOP_SKILLS
+
+    async def settle(self):
+        """
+        等 UI 渲染完 (比如窗口弹出动画)
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        if not self.settle_detector:
+            await asleep(self.settle_delay, reason="settle")
+            return self.settle_delay
+
+        with tracer.span("settle") as sp:
+            result = await asyncio.to_thread(self.settle_detector.wait)
+            sp.set(**result)
+        log.loading(f"画面{'已稳定' if result['settled'] else '等待超时'}: {result['elapsed']:.2f}s ({result['frames']} 帧)")
+        return result["elapsed"]
+
+    async def observe(self, action, args):
+        """
+        视觉闭环：等 UI 渲染后让视觉模型验证刚才的操作
+
+        Returns:
+            tuple: (视觉反馈, 截图引用或 None)
+        """
+        with tracer.span("observe", action=action):
+            await self.settle()
+            shot = await self.vision.acapture_observation()
+            # 有变化区域时历史里留的是更有信息量的裁剪图；不往历史里附图时不存，省得白占内存
+            stored = (shot["crop"] or shot["image"]) if settings.ATTACH_OBSERVATION_IMAGE else None
+            ref = self.blobs.put(stored["data"], stored["mime"]) if stored else None
+            observation = await self.vision.averify_action(
+                action, str(args), image=shot["image"], crop=shot["crop"], region=shot["region"], window=shot["window"]
+            )
+            return observation, ref
+
+    # ---------- 主循环 ----------
+
+    async def run_task(self, task):
+        """
+        跑完一个任务: 规划 -> (思考 -> 执行 -> 观察) * N
+
+        Returns:
+            str: 结束时的总结（没有则为 None）
+        """
+        bind_skill_session(self.skill_state)
+        with tracer.span("task", root=True, task=task[:200]) as root:
+            summary = await self._run_task(task)
+            root.set(steps=self.steps_taken, finished=summary is not None)
+
+        if root:
+            paths = tracer.export(root.trace_id, settings.TRACE_DIR)
+            if paths: log.system(f"耗时追踪已导出: {paths[1]}")
+        return summary
+
+    async def _run_task(self, task):
+        self.task = task
+        self.current_step = 0
+        self.steps_taken = 0
+        self.session_id = self._new_session_id()
+        self.executed = []
+        self.usage = UsageTracker()
+
+        # 轨迹记忆：几乎相同的任务直接复用计划，否则把相似任务作为示例交给规划器
+        # 文件名、数字、引号里的内容只要有一处不同就不能照搬（Dice 系数对这种差别不敏感），交给规划器参考
+        matches = self.recall(task)
+        if (matches and matches[0].score >= settings.TRAJECTORY_REUSE_THRESHOLD
+                and same_literals(task, matches[0].task)):
+            log.system(f"复用相似任务的计划 (相似度 {matches[0].score:.2f}): {matches[0].task[:60]}")
+            self.plan = matches[0].plan
+        else:
+            # Planner
+            examples = TrajectoryMemory.format_examples(matches) if matches else None
+            with self._status("[bold yellow]📋 正在规划...[/bold yellow]", spinner="star"):
+                try:
+                    self.plan = await self.make_plan(task, examples=examples)
+                except Exception as e:
+                    log.error(f"规划失败: {e}")
+                    return None
+        log.plan(self.plan)
+        self._task_msg = task_message(task, self.plan)
+        self.history.append(self._task_msg)
+        self.checkpoint()
+
+        return await self._finish(await self._execute_loop())
+
+    async def _collect_usage(self):
+        """等后台读尾巴的流结束，把它们的 usage 计进来（最多等 USAGE_DRAIN_TIMEOUT 秒）"""
+        if not self._drains: return
+        await asyncio.wait(set(self._drains), timeout=USAGE_DRAIN_TIMEOUT)
+
+    async def _finish(self, summary):
+        # 正常结束 / 放弃的会话都不再出现在可恢复列表里；被中断 (崩溃、Ctrl-C) 的保持 running
+        self.checkpoint(status="done" if summary is not None else "failed")
+        # 等最终状态落盘，但不堵事件循环（批量模式下其它会话照常跑）
+        if self.state: await asyncio.to_thread(self.state.flush)
+        if summary is not None:
+            self.remember(summary)
+            self.last_run = (self.task, self.plan, list(self.executed))
+        await self._collect_usage()
+        if self.usage.calls:
+            log.system(f"Token 用量: {self.usage.describe()}")
+        return summary
+
+    @staticmethod
+    def _new_session_id():
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    # ---------- 轨迹记忆 ----------
+
+    def recall(self, task):
+        """检索相似的成功任务（没有记忆或出错时返回空列表）"""
+        if not self.memory: return []
+        try:
+            with tracer.span("memory.recall") as sp:
+                matches = self.memory.search(task)
+                sp.set(matches=len(matches), best=round(matches[0].score, 3) if matches else 0)
+            return matches
+        except Exception as e:
+            log.error(f"轨迹检索失败: {e}")
+            return []
+
+    def remember(self, summary):
+        """把成功完成的任务记进轨迹记忆（只记确实执行成功的动作，失败、没轮到执行的都不算）"""
+        if not self.memory or not self.session_id: return
+        try:
+            actions = [{"action": step["action"], "args": step["args"]} for step in self.executed]
+            if actions:
+                self.memory.record(self.session_id, self.task, self.plan, actions, summary)
+        except Exception as e:
+            log.error(f"轨迹记录失败: {e}")
+
+    # ---------- 断点 ----------
+
+    def checkpoint(self, status="running", partial=None):
+        """
+        存一次断点：历史（只追加新消息）、计划、步数、技能状态（终端工作目录等）、最近的画面指纹，
+        以及本任务确实执行成功的动作（恢复后存宏、记轨迹都以它为准）
+
+        Args:
+            partial: 当前这一步里已经执行完的动作 [{"action", "args", "result"}, ...]，
+                     整步做完、反馈已写进历史时为 None
+        """
+        if not self.state or not self.session_id: return
+        try:
+            data = {
+                "skills": self.brain.export_state(),
+                "screen_hash": self.vision.screen_hash() if self.vision else None,
+                "partial": partial,
+                "executed": list(self.executed)
+            }
+            self.state.save_session(self.session_id, self.task, self, status=status, checkpoint=data)
+        except Exception as e:
+            log.error(f"断点保存失败: {e}")
+
+    async def resume(self, session_id):
+        """
+        从断点继续一个被中断的任务：不重新规划，从中断的那一步接着执行
+
+        Returns:
+            str: 结束时的总结（没有则为 None）
+        """
+        bind_skill_session(self.skill_state)
+        with tracer.span("task", root=True, resumed=session_id) as root:
+            summary = await self._resume(session_id)
+            root.set(steps=self.steps_taken, finished=summary is not None)
+
+        if root:
+            paths = tracer.export(root.trace_id, settings.TRACE_DIR)
+            if paths: log.system(f"耗时追踪已导出: {paths[1]}")
+        return summary
+
+    async def _resume(self, session_id):
+        data = self.state.load_session(session_id) if self.state else None
+        if not data or not data["history"]:
+            log.error(f"找不到会话: {session_id}")
+            return None
+
+        checkpoint = data["checkpoint"] or {}
+        self.session_id = session_id
+        self.task = data["task_content"]
+        self.plan = data["plan"]
+        self.history = data["history"]
+        self.history[0]["content"] = self.build_system_prompt()
+        self.latest_image_ref = None
+        self.context.reset()
+        # 固定保留的任务/计划消息：从后往前找（同一段对话里可能有更早的任务）
+        task_msg = task_message(self.task, self.plan)
+        self._task_msg = next((m for m in reversed(self.history) if m == task_msg), None)
+        self.brain.restore_state(checkpoint.get("skills"))
+        # 只认断点里记下的已执行动作；历史里模型给出但没来得及执行的动作不算
+        self.executed = list(checkpoint.get("executed") or [])
+        self.usage = UsageTracker()
+
+        start = data["current_step"] or 0
+        notes = []
+        if self.history[-1].get("role") == "assistant":
+            # 中断在某一步的执行过程中：把已经执行完的动作结果补进历史，从下一步开始
+            notes.append(self._interrupted_feedback(checkpoint.get("partial") or []))
+            start += 1
+        if self.vision and checkpoint.get("screen_hash"):
+            current = await asyncio.to_thread(self.vision.screen_hash, True)
+            distance = self.vision.screen_distance(checkpoint["screen_hash"], current)
+            if distance is not None and distance > settings.RESUME_SCREEN_TOLERANCE:
+                log.system(f"当前画面与中断时不同 (指纹距离 {distance})")
+                notes.append("注意: 当前屏幕与中断时不一致，继续前请先确认界面状态。")
+        if notes:
+            self.history.append({"role": "user", "content": "\n\n".join(["[任务从断点恢复]"] + notes)})
+
+        log.system(f"从断点恢复: {session_id} (Step {start + 1})")
+        log.plan(self.plan)
+        self.current_step = start
+        self.steps_taken = start
+        return await self._finish(await self._execute_loop(start))
+
+    @staticmethod
+    def _interrupted_feedback(partial):
+        if not partial:
+            return "上一步的动作在执行过程中被中断，执行结果未知。"
+        lines = ["工具输出:"]
+        for i, rec in enumerate(partial):
+            lines.append(f"[{i+1}] {rec['action']}: {rec['result']}")
+        lines.append(f"(任务在第 {len(partial)} 个动作之后中断，之后的动作未执行)")
+        return "\n".join(lines)
+
+    # ---------- 宏 ----------
+
+    def save_macro(self, name):
+        """
+        把最近一次成功完成的任务存成宏
+
+        Returns:
+            Macro: 没有可保存的任务时返回 None
+        """
+        if not self.macros or not self.last_run: return None
+        task, plan, steps = self.last_run
+        if not steps: return None
+        return self.macros.save(name, task, plan, steps)
+
+    async def replay(self, name):
+        """
+        回放宏：不调用模型，按录制的动作序列执行；某一步失败或画面对不上时，从那里交还给模型继续
+
+        Returns:
+            str: 结束时的总结（没有则为 None）
+        """
+        bind_skill_session(self.skill_state)
+        with tracer.span("task", root=True, macro=name) as root:
+            summary = await self._replay(name)
+            root.set(steps=self.steps_taken, finished=summary is not None)
+
+        if root:
+            paths = tracer.export(root.trace_id, settings.TRACE_DIR)
+            if paths: log.system(f"耗时追踪已导出: {paths[1]}")
+        return summary
+
+    async def _replay(self, name):
+        macro = self.macros.load(name) if self.macros else None
+        if not macro:
+            log.error(f"找不到宏: {name}")
+            return None
+
+        self.task = macro.task
+        self.plan = macro.plan
+        self.current_step = 0
+        self.steps_taken = 0
+        self.session_id = self._new_session_id()
+        self.executed = []
+        self.usage = UsageTracker()
+        log.system(f"回放宏: {name} ({len(macro.steps)} 步，{macro.checkpoints} 个画面检查点)")
+        log.plan(self.plan)
+        self._task_msg = task_message(self.task, self.plan)
+        self.history.append(self._task_msg)
+        # 回放这一轮在历史里记成一次 assistant 回复 + 一条工具反馈，中断后恢复时按断点补上已执行的动作
+        self.history.append({"role": "assistant", "content": f"[宏回放] {name}"})
+        self.checkpoint()
+
+        done = []
+        diverged = None
+        for i, step in enumerate(macro.steps):
+            action, args = step["action"], step.get("args") or {}
+            log.action(action, args)
+            with tracer.span("macro.step", step=i + 1, action=action) as sp:
+                lock = self.desktop_lock if self.desktop_lock and self.uses_desktop(action) else None
+                if lock: await lock.acquire()
+                fingerprint = None
+                try:
+                    result = await self.act(action, args)
+                    log.result(result)
+                    if self.brain.is_failure(result):
+                        diverged = f"第 {i+1} 步执行失败"
+                    elif step.get("fingerprint") and self.vision:
+                        await self.settle()
+                        current = await asyncio.to_thread(self.vision.screen_hash, True)
+                        distance = self.vision.screen_distance(step["fingerprint"], current)
+                        sp.set(distance=distance)
+                        if distance is None or distance > settings.MACRO_SCREEN_TOLERANCE:
+                            diverged = f"第 {i+1} 步之后画面与录制时不一致，指纹距离 {distance}"
+                        fingerprint = current
+                finally:
+                    if lock: lock.release()
+
+            self.steps_taken = i + 1
+            done.append({"action": action, "args": args, "result": str(result)})
+            # 画面对不上的步骤也确实执行过了（带着当前指纹记下），只有执行失败的不算
+            if not self.brain.is_failure(result):
+                self.executed.append({"action": action, "args": args, "fingerprint": fingerprint})
+            self.checkpoint(partial=list(done))
+            if diverged: break
+
+        lines = ["工具输出:"] + [f"[{i+1}] {rec['action']}: {rec['result']}" for i, rec in enumerate(done)]
+        if not diverged:
+            self.history.append({"role": "user", "content": "\n".join(lines)})
+            summary = f"宏 {name} 回放完成 ({len(macro.steps)} 步)"
+            log.agent_response(summary)
+            return await self._finish(summary)
+
+        # 从分歧的那一步之后交给模型：它能看到已经执行了哪些动作
+        log.system(f"宏回放中断: {diverged}，交给模型继续")
+        lines.append(f"({diverged}，后续 {len(macro.steps) - len(done)} 步未执行。请从当前状态继续完成任务。)")
+        self.history.append({"role": "user", "content": "\n".join(lines)})
+        self.current_step = 1
+        self.checkpoint()
+        return await self._finish(await self._execute_loop(1))
+
+    async def _execute_loop(self, start=0):
+        for i in range(start, self.max_steps):
+            self.current_step = i
+            self.steps_taken = i + 1
+            with tracer.span("step", step=i + 1):
+                self._fit_context()
+                with self._status(f"[bold green] 思考中 (Step {i+1})...[/bold green]", spinner="dots"):
+                    try:
+                        content, action_data = await self.think()
+                    except Exception as e:
+                        log.error(f"模型响应错误: {e}")
+                        return None
+
+                if not content: return None
+                self.history.append({"role": "assistant", "content": content})
+
+                if not action_data:
+                    if len(content.strip()) > 0: log.agent_response(content)
+                    return None
+
+                thought = action_data.get("thought", "")
+                if thought: log.think(thought)
+
+                actions = self.parse_actions(action_data)
+                if not actions: return None
+
+                # finish 之前的动作照常执行，finish 本身结束任务
+                finish_item = None
+                for idx, item in enumerate(actions):
+                    if item["action"] in ("finish", "任务完成"):
+                        finish_item = item
+                        actions = actions[:idx]
+                        break
+
+                all_ok = True
+                if actions:
+                    feedback, all_ok, refs = await self._run_actions(actions)
+                    self.history.append({"role": "user", "content": self._feedback_content(feedback, refs)})
+                    # 整步完成：断点指向下一步
+                    self.current_step = i + 1
+                    self.checkpoint()
+
+                # 前面的动作失败了就不结束，让模型看到失败再决定
+                if finish_item and all_ok:
+                    summary = finish_item["args"].get("summary", "任务完成")
+                    log.agent_response(summary)
+                    return summary
+        return None
+
+    def parse_actions(self, action_data):
+        """
+        把模型回复统一成动作列表
+        单动作格式保持旧行为：GUI 动作后自动做视觉检查；
+        批量格式只在标记了 verify_after 的检查点做视觉检查。
+        """
+        if isinstance(action_data.get("actions"), list):
+            actions = []
+            for item in action_data["actions"][:settings.MAX_BATCH_ACTIONS]:
+                if not isinstance(item, dict) or not item.get("action"): continue
+                action = item["action"]
+                actions.append({
+                    "action": action,
+                    "args": item.get("args") or {},
+                    "verify_after": bool(item.get("verify_after")) and self.needs_vision(action)
+                })
+            return actions
+
+        action = action_data.get("action")
+        if not action: return []
+        return [{"action": action, "args": action_data.get("args") or {}, "verify_after": self.needs_vision(action)}]
+
+    def _feedback_content(self, feedback, refs):
+        """工具反馈消息：配置了附图时带上截图引用"""
+        if not (settings.ATTACH_OBSERVATION_IMAGE and refs):
+            return feedback
+        self.latest_image_ref = refs[-1]
+        return [{"type": "text", "text": feedback}] + [image_ref(ref) for ref in refs]
+
+    async def _run_actions(self, actions):
+        """执行一批动作，返回 (写回对话历史的反馈文本, 是否全部成功, 截图引用列表)"""
+        observations = {}
+        refs = []
+        done = []
+
+        async def on_step(index, item, result):
+            ok = not self.brain.is_failure(result)
+            # 视觉闭环：等画面稳定、截图编码、视觉请求都在线程/网络上，先放到后台跑起来（让出一次事件循环，
+            # 让它走到第一个 await），日志和断点的序列化在等待期间做完
+            observe_task = None
+            if item["verify_after"] and ok:
+                observe_task = asyncio.ensure_future(self.observe(item["action"], item["args"]))
+                await asyncio.sleep(0)
+
+            log.result(result)
+            step = None
+            if ok:
+                step = {"action": item["action"], "args": item["args"], "fingerprint": None}
+                self.executed.append(step)
+            # 每执行完一个动作存一次断点，崩溃后不会重复执行已经做完的动作
+            done.append({"action": item["action"], "args": item["args"], "result": str(result)})
+            self.checkpoint(partial=list(done))
+
+            if observe_task:
+                with self._status("[bold purple] 正在观察屏幕...[/bold purple]", spinner="point"):
+                    observation, ref = await observe_task
+                observations[index] = observation
+                if ref: refs.append(ref)
+                console.print(f"[bold purple] 视觉反馈:[/bold purple] {observation}")
+                # 做过视觉检查的动作记下检查时的画面指纹（宏回放时用来判断画面是否和录制时一致），下一次存断点时带上
+                step["fingerprint"] = self.vision.screen_hash()
+
+        for item in actions:
+            log.action(item["action"], item["args"])
+
+        # 1. 执行工具（按顺序，失败即停）
+        # 批量并发时，动到桌面的动作连同视觉检查一起在桌面锁内完成
+        lock = None
+        if self.desktop_lock and any(self.uses_desktop(item["action"]) for item in actions):
+            lock = self.desktop_lock
+        if lock:
+            with tracer.span("desktop_lock.wait"):
+                await lock.acquire()
+        try:
+            # 差异裁剪：动作执行前先记下基准画面
+            if self.vision and any(item["verify_after"] for item in actions):
+                await self.vision.amark_baseline()
+            records = await self.brain.aexecute_batch(actions, on_step=on_step)
+        finally:
+            if lock: lock.release()
+
+        # 2. 将工具结果 + 视觉反馈 存入记忆
+        if len(actions) == 1:
+            vision_feedback = f"\n\n[ 视觉观察反馈]: {observations[0]}" if 0 in observations else ""
+            return f"工具输出: {records[0]['result']}{vision_feedback}", records[0]["ok"], refs
+
+        lines = ["工具输出:"]
+        for i, rec in enumerate(records):
+            lines.append(f"[{i+1}] {rec['action']}: {rec['result']}")
+            if i in observations:
+                lines.append(f"[ 视觉观察反馈 @{i+1}]: {observations[i]}")
+        all_ok = len(records) == len(actions) and records[-1]["ok"]
+        if not all_ok:
+            lines.append(f"(第 {len(records)} 个动作失败，后续 {len(actions) - len(records)} 个动作已跳过)")
+        return "\n".join(lines), all_ok, refs
@@ -0,0 +1,115 @@
+"""
+Geometry
+屏幕区域与坐标换算
+截图像素 (HiDPI 下可能是屏幕坐标的 2 倍)、发给模型的图片像素、模型返回的归一化坐标
+最终都要换回 pyautogui 使用的屏幕坐标
+"""
+
+
+class Region:
+    """
+    屏幕上的一个矩形区域（屏幕坐标），以及它被渲染成的图片尺寸
+
+    Args:
+        left, top, width, height: 屏幕坐标
+        image_size: 该区域发给模型时的图片尺寸 (w, h)，不传则与区域同大小
+    """
+
+    def __init__(self, left, top, width, height, image_size=None):
+        self.left = int(left)
+        self.top = int(top)
+        self.width = max(1, int(width))
+        self.height = max(1, int(height))
+        self.image_size = tuple(image_size) if image_size else (self.width, self.height)
+
+    @classmethod
+    def full(cls, screen_size, image_size=None):
+        """整屏区域"""
+        return cls(0, 0, screen_size[0], screen_size[1], image_size)
+
+    @classmethod
+    def from_pixels(cls, box, frame_size, screen_size, image_size=None):
+        """
+        截图像素框 (left, top, right, bottom) -> 屏幕坐标区域
+        frame_size 与 screen_size 不同时 (HiDPI) 按比例换算
+        """
+        sx = screen_size[0] / frame_size[0]
+        sy = screen_size[1] / frame_size[1]
+        left, top, right, bottom = box
+        return cls(left * sx, top * sy, (right - left) * sx, (bottom - top) * sy, image_size)
+
+    @classmethod
+    def around(cls, x, y, size, screen_size, within=None):
+        """
+        以屏幕坐标 (x, y) 为中心、边长 size 的区域（两级定位的局部放大区）
+        靠近边缘时整体平移而不是缩小，保证局部图大小一致；同时限制在 within（默认整屏）内
+        """
+        bounds = within or cls.full(screen_size)
+        width = min(int(size), bounds.width)
+        height = min(int(size), bounds.height)
+        left = max(bounds.left, min(int(x) - width // 2, bounds.right - width))
+        top = max(bounds.top, min(int(y) - height // 2, bounds.bottom - height))
+        return cls(left, top, width, height)
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+    @property
+    def area(self):
+        return self.width * self.height
+
+    def pixel_box(self, frame_size, screen_size):
+        """屏幕坐标区域 -> 截图像素框 (left, top, right, bottom)，用于 Image.crop"""
+        sx = frame_size[0] / screen_size[0]
+        sy = frame_size[1] / screen_size[1]
+        return (round(self.left * sx), round(self.top * sy), round(self.right * sx), round(self.bottom * sy))
+
+    def padded(self, margin, screen_size):
+        """四周各扩 margin 个像素，并裁到屏幕范围内"""
+        left = max(0, self.left - margin)
+        top = max(0, self.top - margin)
+        right = min(screen_size[0], self.right + margin)
+        bottom = min(screen_size[1], self.bottom + margin)
+        return Region(left, top, right - left, bottom - top)
+
+    def clipped(self, screen_size):
+        """裁到屏幕范围内；完全在屏幕外返回 None"""
+        left, top = max(0, self.left), max(0, self.top)
+        right, bottom = min(screen_size[0], self.right), min(screen_size[1], self.bottom)
+        if right <= left or bottom <= top: return None
+        return Region(left, top, right - left, bottom - top)
+
+    def with_image_size(self, image_size):
+        return Region(self.left, self.top, self.width, self.height, image_size)
+
+    def image_to_screen(self, x, y):
+        """区域图片上的像素坐标 -> 屏幕坐标"""
+        return self.normalized_to_screen(x / self.image_size[0], y / self.image_size[1])
+
+    def normalized_to_screen(self, nx, ny):
+        """区域内的归一化坐标 (0~1) -> 屏幕坐标（限制在区域内）"""
+        x = self.left + nx * self.width
+        y = self.top + ny * self.height
+        x = max(self.left, min(int(x), self.right - 1))
+        y = max(self.top, min(int(y), self.bottom - 1))
+        return x, y
+
+    def screen_to_normalized(self, x, y):
+        return (x - self.left) / self.width, (y - self.top) / self.height
+
+    def contains(self, x, y):
+        return self.left <= x < self.right and self.top <= y < self.bottom
+
+    def to_dict(self):
+        return {"left": self.left, "top": self.top, "width": self.width, "height": self.height}
+
+    def __repr__(self):
+        return f"Region(left={self.left}, top={self.top}, width={self.width}, height={self.height})"
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and self.to_dict() == other.to_dict() and self.image_size == other.image_size
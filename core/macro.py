@@ -0,0 +1,97 @@
+"""
+Macro Store
+把一次成功执行的动作序列存成有名字的宏，之后不调用模型直接回放：
+- 每步记下 (动作, 参数) 和执行后的画面指纹（只有做过视觉检查的 GUI 动作才有指纹）
+- 回放时按顺序交给 SkillManager 执行，有指纹的步骤等画面稳定后本地比对指纹
+- 某一步执行失败或画面对不上，就从这一步之后交还给模型继续
+与 StateManager 共用同一个数据库文件
+"""
+
+import json
+import sqlite3
+import threading
+from core.state import PRAGMAS
+
+
+class Macro:
+    def __init__(self, name, task, plan, steps):
+        self.name = name
+        self.task = task
+        self.plan = plan
+        # [{"action": ..., "args": {...}, "fingerprint": 画面指纹或 None}, ...]
+        self.steps = steps
+
+    @property
+    def checkpoints(self):
+        """需要比对画面的步数"""
+        return sum(1 for step in self.steps if step.get("fingerprint"))
+
+    def __repr__(self):
+        return f"Macro({self.name!r}, steps={len(self.steps)}, checkpoints={self.checkpoints})"
+
+
+class MacroStore:
+    """
+    宏的持久化
+
+    Args:
+        db_path: 数据库路径
+    """
+
+    def __init__(self, db_path=r"./memory/state.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS macros (
+                    name TEXT PRIMARY KEY,
+                    task TEXT,
+                    plan TEXT,                    -- 录制时的计划 JSON
+                    steps TEXT,                   -- 动作序列 + 画面指纹 JSON
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def save(self, name, task, plan, steps):
+        """保存（同名覆盖）"""
+        steps = [{"action": s["action"], "args": s.get("args") or {}, "fingerprint": s.get("fingerprint")} for s in steps]
+        with self._conn() as conn:
+            conn.execute('''
+                INSERT INTO macros (name, task, plan, steps, updated_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET
+                    task=excluded.task, plan=excluded.plan, steps=excluded.steps, updated_at=excluded.updated_at
+            ''', (name, task, json.dumps(plan, ensure_ascii=False), json.dumps(steps, ensure_ascii=False)))
+        return Macro(name, task, plan, steps)
+
+    def load(self, name):
+        row = self._conn().execute("SELECT task, plan, steps FROM macros WHERE name=?", (name,)).fetchone()
+        if not row: return None
+        return Macro(name, row[0], json.loads(row[1]), json.loads(row[2]))
+
+    def list(self):
+        """[(名称, 任务, 步数), ...]，最近保存的在前"""
+        rows = self._conn().execute("SELECT name, task, steps FROM macros ORDER BY updated_at DESC").fetchall()
+        return [(name, task, len(json.loads(steps))) for name, task, steps in rows]
+
+    def delete(self, name):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM macros WHERE name=?", (name,))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,104 @@
+"""
+Observation Cache
+屏幕没变、问题也一样时，直接复用上一次视觉模型的回答
+- key = 截图的感知哈希 (dHash) + 规整后的问题文本
+- 哈希允许少量比特不同（JPEG 噪点、光标闪烁），容差可配置
+- LRU 淘汰；任何键鼠输入都会显式清空（由 SkillManager 触发）
+"""
+
+import re
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from PIL import Image
+
+
+def dhash(image, hash_size=16):
+    """
+    差值哈希：缩成 (hash_size+1) x hash_size 的灰度图，逐行比较相邻像素亮度
+
+    Returns:
+        int: hash_size * hash_size 位的哈希
+    """
+    small = image.resize((hash_size + 1, hash_size), Image.BOX).convert("L")
+    px = small.tobytes()
+    width = hash_size + 1
+    bits = 0
+    for row in range(hash_size):
+        base = row * width
+        for col in range(hash_size):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return bits
+
+
+def dhash_jpeg(data, hash_size=16):
+    """JPEG 字节的 dHash（用 draft 模式按缩小比例解码，比完整解码快很多）"""
+    image = Image.open(BytesIO(data))
+    image.draft("L", (hash_size * 4, hash_size * 4))
+    return dhash(image, hash_size)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def normalize_prompt(prompt):
+    """去掉首尾空白、合并连续空白、统一小写"""
+    return re.sub(r"\s+", " ", prompt or "").strip().lower()
+
+
+class ObservationCache:
+    """
+    感知哈希 + 问题 -> 视觉回答 的 LRU 缓存
+
+    Args:
+        capacity: 最多保存的回答数（0 表示关闭）
+        max_distance: 允许的最大汉明距离
+        hash_size: dHash 边长（位数 = hash_size^2）
+    """
+
+    def __init__(self, capacity=64, max_distance=4, hash_size=16):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self._entries = OrderedDict()   # (phash, prompt) -> answer
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def hash_image(self, image_bytes):
+        return dhash_jpeg(image_bytes, self.hash_size)
+
+    def get(self, phash, prompt):
+        """找同一问题下哈希足够接近的回答，没有返回 None"""
+        prompt = normalize_prompt(prompt)
+        with self._lock:
+            for key in reversed(self._entries):
+                cached_hash, cached_prompt = key
+                if cached_prompt == prompt and hamming(cached_hash, phash) <= self.max_distance:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, phash, prompt, answer):
+        if not self.enabled: return
+        key = (phash, normalize_prompt(prompt))
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """屏幕可能变了（有键鼠输入），全部作废"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,81 @@
+"""
+Prompt Assembly
+面向前缀缓存的 Prompt 拼装层：
+- 系统提示词 / 工具列表 只依赖技能集合指纹和操作系统，跨步骤、跨会话字节级一致
+- 任务、计划等可变内容永远放在最后
+"""
+
+PLANNER_SYS_PROMPT_TEMPLATE = """
+你是一个自动化 Agent 的任务架构师。
+【环境】: {current_os}
+
+你拥有以下工具箱：
+{tools}
+
+【规划策略】:
+1. 浏览网页是动态的：先 visit 访问，然后根据视觉反馈决定是 scroll (滚动) 还是 click (点击)。
+2. 不要试图一次性把所有步骤写死。
+3. 示例计划：
+   - Step 1: 使用 browser visit 访问 github.com/xxx。
+   - Step 2: 观察屏幕，如果是 Bilibili，寻找视频列表。
+"""
+
+EXECUTOR_SYS_PROMPT_TEMPLATE = """
+你是一个全能 AI Agent。
+【运行环境】: {current_os}
+
+【能力】:
+1. 你可以执行终端命令 (terminal)。
+2. 你可以操作电脑 GUI (computer_control)。
+3. 【关键】：你拥有视觉能力。每当你执行 GUI 操作后，系统会自动截图并告诉你屏幕上发生了什么。请根据视觉反馈来判断下一步。
+
+【工具列表】:
+{tools}
+
+【回复格式】:
+必须输出标准 JSON: {{"thought": "...", "action": "工具名", "args": {{...}}}}
+
+【批量动作】:
+确定性的连续操作（例如 hotkey -> type_text -> hotkey）可以一次给出，按顺序执行，遇到失败立即停止:
+{{"thought": "...", "actions": [{{"action": "工具名", "args": {{...}}}}, {{"action": "工具名", "args": {{...}}, "verify_after": true}}]}}
+只有标记了 "verify_after": true 的动作执行后才会截图做视觉检查。
+
+【结束规则】:
+任务完成请调用: {{"action": "finish", "args": {{"summary": "..."}}}}
+"""
+
+# 渲染结果缓存: (模板名, 技能指纹, 操作系统) -> 文本
+_PROMPT_CACHE = {}
+
+
+def _render(kind, template, brain, current_os):
+    key = (kind, brain.skill_fingerprint(), current_os)
+    text = _PROMPT_CACHE.get(key)
+    if text is None:
+        text = template.format(tools=brain.get_skill_descriptions(), current_os=current_os)
+        _PROMPT_CACHE[key] = text
+    return text
+
+
+def executor_system_prompt(brain, current_os):
+    """执行器系统提示词（同一技能集合下字节级一致）"""
+    return _render("executor", EXECUTOR_SYS_PROMPT_TEMPLATE, brain, current_os)
+
+
+def planner_messages(brain, current_os, task, examples=None):
+    """
+    规划请求: 稳定的系统提示词(含工具箱) 在前，任务放在最后一条 user 消息
+
+    Args:
+        examples: 过去成功完成的相似任务（已压缩的文本），放在 user 消息里，不影响系统提示词的前缀缓存
+    """
+    reference = f"【参考: 过去成功完成的相似任务】\n{examples}\n\n" if examples else ""
+    return [
+        {"role": "system", "content": _render("planner", PLANNER_SYS_PROMPT_TEMPLATE, brain, current_os)},
+        {"role": "user", "content": f"{reference}【任务】: {task}\n\n请给出执行计划。"}
+    ]
+
+
+def task_message(task, plan):
+    """当前任务/计划消息"""
+    return {"role": "user", "content": f"任务: {task}\n\n计划:\n{plan}\n\n请执行。"}
@@ -0,0 +1,258 @@
+"""
+Record / Replay
+包装 OpenAI / AsyncOpenAI 客户端的 chat.completions.create：
+- record: 正常请求，同时把 (请求, 响应) 按稳定哈希写入本地库
+- replay: 只从本地库读，零网络延迟，找不到直接报错（保证离线回归可复现）
+- cache:  本地有就用，没有就请求并记录（开发时重复的规划请求直接命中）
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+import inspect
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+MODES = ("off", "record", "replay", "cache")
+
+
+class ReplayMissError(RuntimeError):
+    """replay 模式下找不到对应的录制"""
+    pass
+
+
+def _normalize_content(content, match_images=True):
+    # 图片 data URL 换成哈希：key 稳定且库文件不会被 base64 撑大
+    # match_images=False 时所有图片视为同一张（真实桌面上截图每次都不同）
+    if not isinstance(content, list): return content
+    out = []
+    for item in content:
+        if item.get("type") == "image_url":
+            url = item.get("image_url", {}).get("url", "")
+            digest = "sha256:" + hashlib.sha256(url.encode()).hexdigest() if match_images else "image"
+            item = {"type": "image_url", "image_url": {"url": digest}}
+        out.append(item)
+    return out
+
+
+def normalize_request(kwargs, match_images=True):
+    """把请求参数规整成与调用顺序、图片编码无关的结构"""
+    req = {k: v for k, v in kwargs.items() if k not in ("messages", "timeout", "extra_headers")}
+    req["messages"] = [
+        {"role": m.get("role"), "content": _normalize_content(m.get("content"), match_images)}
+        for m in kwargs.get("messages", [])
+    ]
+    return req
+
+
+def request_key(normalized):
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ReplayStore:
+    """
+    本地录制库 (SQLite，内容 zlib 压缩)
+    """
+
+    def __init__(self, db_path="./memory/replay.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                stream INTEGER,
+                request BLOB,
+                response BLOB,
+                created_at REAL
+            )
+        ''')
+        self._conn.commit()
+
+    @staticmethod
+    def _pack(obj):
+        return zlib.compress(json.dumps(obj, ensure_ascii=False).encode())
+
+    @staticmethod
+    def _unpack(blob):
+        return json.loads(zlib.decompress(blob).decode())
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM llm_calls WHERE key=?", (key,)).fetchone()
+        return self._unpack(row[0]) if row else None
+
+    def put(self, key, normalized, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_calls (key, model, stream, request, response, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalized.get("model"), int(bool(normalized.get("stream"))),
+                 self._pack(normalized), self._pack(response), time.time())
+            )
+            self._conn.commit()
+
+
+# ---------- 流式响应的录制 / 回放 ----------
+
+class _RecordingStream:
+    """边读边记；读完或被提前 close 时把已读到的 chunk 落库"""
+
+    def __init__(self, stream, on_done):
+        self._stream = stream
+        self._on_done = on_done
+        self._chunks = []
+        self._saved = False
+
+    def _save(self):
+        if not self._saved:
+            self._saved = True
+            self._on_done(self._chunks)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                self._chunks.append(chunk.model_dump(mode="json"))
+                yield chunk
+        finally:
+            self._save()
+
+    def close(self):
+        self._save()
+        self._stream.close()
+
+
+class _AsyncRecordingStream(_RecordingStream):
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                self._chunks.append(chunk.model_dump(mode="json"))
+                yield chunk
+        finally:
+            self._save()
+
+    async def close(self):
+        self._save()
+        await self._stream.close()
+
+
+class _ReplayStream:
+    def __init__(self, chunks):
+        self._chunks = [ChatCompletionChunk.model_validate(c) for c in chunks]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+class _AsyncReplayStream(_ReplayStream):
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+# ---------- 客户端包装 ----------
+
+class _Completions:
+    def __init__(self, inner, store, mode, match_images=True):
+        self._inner = inner
+        self._store = store
+        self._mode = mode
+        self._match_images = match_images
+
+    def _lookup(self, kwargs):
+        normalized = normalize_request(kwargs, self._match_images)
+        key = request_key(normalized)
+        cached = self._store.get(key) if self._mode in ("replay", "cache") else None
+        if cached is None and self._mode == "replay":
+            raise ReplayMissError(f"录制库中没有该请求: {key[:12]} (model={normalized.get('model')})")
+        return normalized, key, cached
+
+    def create(self, **kwargs):
+        normalized, key, cached = self._lookup(kwargs)
+        stream = kwargs.get("stream")
+
+        if cached is not None:
+            return _ReplayStream(cached) if stream else ChatCompletion.model_validate(cached)
+
+        resp = self._inner.create(**kwargs)
+        if stream:
+            return _RecordingStream(resp, lambda chunks: self._store.put(key, normalized, chunks))
+        self._store.put(key, normalized, resp.model_dump(mode="json"))
+        return resp
+
+
+class _AsyncCompletions(_Completions):
+
+    async def create(self, **kwargs):
+        normalized, key, cached = self._lookup(kwargs)
+        stream = kwargs.get("stream")
+
+        if cached is not None:
+            return _AsyncReplayStream(cached) if stream else ChatCompletion.model_validate(cached)
+
+        resp = await self._inner.create(**kwargs)
+        if stream:
+            return _AsyncRecordingStream(resp, lambda chunks: self._store.put(key, normalized, chunks))
+        self._store.put(key, normalized, resp.model_dump(mode="json"))
+        return resp
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class RecordReplayClient:
+    """
+    OpenAI 客户端的透明包装，只接管 chat.completions.create，其余属性原样转发
+    """
+
+    def __init__(self, client, store, mode="record", match_images=True):
+        if mode not in MODES:
+            raise ValueError(f"未知的录制模式: {mode}")
+        self._client = client
+        self.mode = mode
+        inner = client.chat.completions
+        is_async = isinstance(client, AsyncOpenAI) or inspect.iscoroutinefunction(inspect.unwrap(inner.create))
+        completions_cls = _AsyncCompletions if is_async else _Completions
+        self.chat = _Chat(completions_cls(inner, store, mode, match_images))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_STORES = {}
+
+
+def wrap_client(client, mode=None, db_path=None):
+    """
+    按配置包装客户端；mode 为 off 时原样返回
+
+    Args:
+        client: OpenAI 或 AsyncOpenAI 实例
+        mode: off / record / replay / cache（默认读 settings.LLM_REPLAY_MODE）
+        db_path: 录制库路径（默认读 settings.LLM_REPLAY_PATH）
+    """
+    from core.config import settings
+    mode = mode or settings.LLM_REPLAY_MODE
+    if mode == "off": return client
+
+    db_path = db_path or settings.LLM_REPLAY_PATH
+    # 同一个库文件共享一个连接（主模型和视觉模型的录制放在一起）
+    store = _STORES.get(db_path)
+    if store is None:
+        store = _STORES[db_path] = ReplayStore(db_path)
+    return RecordReplayClient(client, store, mode, settings.LLM_REPLAY_MATCH_IMAGES)
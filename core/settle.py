@@ -0,0 +1,94 @@
+"""
+Screen Settle Detector
+GUI 动作后不再固定等 2 秒：低分辨率连续截帧，画面连续稳定一段时间就返回，
+超过最长等待时间也返回（例如一直在播放动画的页面）
+"""
+
+import time
+from PIL import Image, ImageChops, ImageStat
+
+
+class SettleDetector:
+    """
+    画面稳定检测器
+
+    Args:
+        grab: 截图函数，返回 PIL.Image（整屏）
+        interval: 两次截帧的间隔 (秒)
+        stable_window: 画面需要连续保持不变的时长 (秒)
+        timeout: 最长等待时间 (秒)
+        threshold: 判定"有变化"的帧差阈值 (灰度缩略图平均绝对差, 0~255)
+        min_delay: 动作后至少等待的时间 (秒)，给应用一点开始响应的时间
+        thumb_size: 比较用缩略图尺寸
+    """
+
+    def __init__(self, grab, interval=0.05, stable_window=0.3, timeout=3.0, threshold=1.0,
+                 min_delay=0.1, thumb_size=(64, 36)):
+        self.grab = grab
+        self.interval = interval
+        self.stable_window = stable_window
+        self.timeout = timeout
+        self.threshold = threshold
+        self.min_delay = min_delay
+        self.thumb_size = thumb_size
+
+    @classmethod
+    def from_settings(cls, grab, settings):
+        return cls(
+            grab,
+            interval=settings.SETTLE_INTERVAL,
+            stable_window=settings.SETTLE_STABLE_WINDOW,
+            timeout=settings.SETTLE_TIMEOUT,
+            threshold=settings.SETTLE_DIFF_THRESHOLD,
+            min_delay=settings.SETTLE_MIN_DELAY
+        )
+
+    def frame(self):
+        """截一帧并缩成灰度缩略图（先缩再转灰度，像素少得多）"""
+        return self.grab().resize(self.thumb_size, Image.BOX).convert("L")
+
+    @staticmethod
+    def frame_diff(a, b):
+        """两帧的平均绝对差"""
+        return ImageStat.Stat(ImageChops.difference(a, b)).mean[0]
+
+    def wait(self):
+        """
+        阻塞直到画面稳定或超时
+
+        Returns:
+            dict: {"settled": 是否稳定, "elapsed": 实际等待秒数, "frames": 截帧数}
+        """
+        start = time.perf_counter()
+        time.sleep(self.min_delay)
+        try:
+            prev = self.frame()
+        except Exception as e:
+            # 截不了图就退回固定等待
+            print(f"❌ 稳定检测截图失败: {e}")
+            time.sleep(max(0.0, self.timeout - self.min_delay))
+            return {"settled": False, "elapsed": time.perf_counter() - start, "frames": 0}
+
+        frames = 1
+        failed = False
+        stable_since = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now - stable_since >= self.stable_window:
+                return {"settled": True, "elapsed": now - start, "frames": frames}
+            if now - start >= self.timeout:
+                return {"settled": False, "elapsed": now - start, "frames": frames}
+
+            time.sleep(self.interval)
+            try:
+                current = self.frame()
+            except Exception as e:
+                # 偶尔截图失败：这一帧当作"有变化"，继续等到稳定或超时，不让整个任务失败
+                if not failed: print(f"❌ 稳定检测截图失败: {e}")
+                failed = True
+                stable_since = time.perf_counter()
+                continue
+            frames += 1
+            if self.frame_diff(prev, current) > self.threshold:
+                stable_since = time.perf_counter()
+            prev = current
@@ -3,7 +3,10 @@ import inspect
 import importlib
 import sys
 import os
+import json
+import hashlib
 from core.logger import log
+from core.tracing import tracer
 from skills.base import Skill
 
 class SkillManager:
@@ -13,20 +16,45 @@ class SkillManager:
         
         # 【核心修复】把自己注入到 context 中，允许 Skill 调用其他 Skill
         self.context['skill_manager'] = self 
+
+        # 技能描述缓存: (技能集合指纹, 描述文本)
+        self._fingerprint = None
+        self._desc_cache = None
         
         self.load_skills()
 
+    def skill_fingerprint(self):
+        """已加载技能集合的指纹（名称+描述+参数），技能不变则指纹不变"""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            for name in sorted(self.skills):
+                skill = self.skills[name]
+                h.update(name.encode())
+                h.update(skill.description.strip().encode())
+                h.update(json.dumps(skill.parameters, sort_keys=True, ensure_ascii=False).encode())
+            self._fingerprint = h.hexdigest()[:16]
+        return self._fingerprint
+
     def get_skill_descriptions(self):
+        # 按名称排序保证字节级稳定，方便模型服务端做前缀缓存
+        fingerprint = self.skill_fingerprint()
+        if self._desc_cache and self._desc_cache[0] == fingerprint:
+            return self._desc_cache[1]
+
         descs = []
-        for name, skill in self.skills.items():
+        for name in sorted(self.skills):
+            skill = self.skills[name]
             params_desc = skill.parameters.get("properties", {})
             param_str = ", ".join([f"{k}: {v.get('description', '')}" for k, v in params_desc.items()])
             descs.append(f"- {name}: {skill.description.strip()} (参数: {param_str})")
-        return "\n".join(descs)
+        text = "\n".join(descs)
+        self._desc_cache = (fingerprint, text)
+        return text
 
     def load_skills(self):
         log.system("正在扫描插件...")
         self.skills = {}
+        self._fingerprint = None
         
         package_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'skills')
         if package_dir not in sys.path:
@@ -51,60 +79,165 @@ class SkillManager:
                 
         log.system(f"插件加载完毕，共 {len(self.skills)} 个技能。")
 
-    def execute(self, skill_name: str, **kwargs) -> str:
-        # === 智能路由表 ===
-        skill_router = {
-            'open_app': 'computer_control',
-            'browser_nav': 'computer_control',
-            'type_text': 'computer_control',
-            'press_key': 'computer_control',
-            'hotkey': 'computer_control',
-            'mouse_click': 'computer_control',
-            'scroll': 'computer_control',
-            'write_code': 'vscode_write',
-            'save_file': 'vscode_write',
-            'cmd': 'terminal',
-            'shell': 'terminal',
-            'run_cmd': 'terminal',
-            'visit': 'browser',
-            'search': 'browser',
-            'visit_dom': 'browser_dom',
-            'analyze_dom': 'browser_dom'
-        }
+    # === 智能路由表 ===
+    SKILL_ROUTER = {
+        'open_app': 'computer_control',
+        'browser_nav': 'computer_control',
+        'type_text': 'computer_control',
+        'press_key': 'computer_control',
+        'hotkey': 'computer_control',
+        'mouse_click': 'computer_control',
+        'scroll': 'computer_control',
+        'write_code': 'vscode_write',
+        'save_file': 'vscode_write',
+        'cmd': 'terminal',
+        'shell': 'terminal',
+        'run_cmd': 'terminal',
+        'visit': 'browser',
+        'search': 'browser',
+        'visit_dom': 'browser_dom',
+        'analyze_dom': 'browser_dom'
+    }
+
+    # 会产生键鼠输入的技能：执行前后都要让视觉观察缓存失效
+    INPUT_SKILLS = {'computer_control', 'vscode_write', 'email_visual', 'browser', 'browser_use'}
+
+    # 参数映射
+    KEY_MAPPING = {
+        'operation': 'action', 'cmd': 'action', 'command': 'action', 'function': 'action',
+        'text': 'target', 'msg': 'target', 'message': 'target', 'url': 'target',
+        'browser': 'target', 'app_name': 'target', 'app': 'target', 'Target': 'target',
+        'file': 'filename', 'path': 'filename', 'file_path': 'filename', 'file_name': 'filename',
+        'content': 'code'
+    }
+
+    def resolve_skill_name(self, skill_name: str):
+        """把模型给出的动作名解析为真正的技能名（找不到返回 None）"""
+        if skill_name in self.skills:
+            return skill_name
+        return self.SKILL_ROUTER.get(skill_name)
 
+    def _prepare(self, skill_name: str, kwargs):
+        """路由 + 参数映射，返回 (skill, clean_args, 错误信息)"""
         target_skill = skill_name
         inferred_action = None
         
         if skill_name not in self.skills:
-            if skill_name in skill_router:
-                target_skill = skill_router[skill_name]
+            if skill_name in self.SKILL_ROUTER:
+                target_skill = self.SKILL_ROUTER[skill_name]
                 inferred_action = skill_name
                 print(f"[Router] 自动修正: {skill_name} -> {target_skill}")
             else:
-                return f"❌ Skill不存在: {skill_name}"
+                return None, None, f"❌ Skill不存在: {skill_name}"
         
         skill = self.skills.get(target_skill)
+        if not skill:
+            return None, None, f"❌ Skill不存在: {target_skill}"
 
-        # 参数映射
         clean_args = {}
-        key_mapping = {
-            'operation': 'action', 'cmd': 'action', 'command': 'action', 'function': 'action',
-            'text': 'target', 'msg': 'target', 'message': 'target', 'url': 'target',
-            'browser': 'target', 'app_name': 'target', 'app': 'target', 'Target': 'target',
-            'file': 'filename', 'path': 'filename', 'file_path': 'filename', 'file_name': 'filename',
-            'content': 'code'
-        }
-
         for k, v in kwargs.items():
-            new_key = key_mapping.get(k, k)
+            new_key = self.KEY_MAPPING.get(k, k)
             clean_args[new_key] = v
 
         if inferred_action and 'action' not in clean_args:
             clean_args['action'] = inferred_action
 
-        try:
-            return skill.execute(**clean_args)
-        except TypeError as e:
-            return f"❌ 参数错误: {e}"
-        except Exception as e:
-            return f"❌ 运行时错误: {e}"
\ No newline at end of file
+        return skill, clean_args, None
+
+    def _invalidate_observations(self, skill):
+        if skill.name not in self.INPUT_SKILLS: return
+        vision = self.context.get('vision')
+        if vision and hasattr(vision, 'invalidate_cache'):
+            vision.invalidate_cache()
+
+    @staticmethod
+    def _trace_skill(span, skill, clean_args, result):
+        if not span: return
+        span.set(skill=skill.name,
+                 args_bytes=len(json.dumps(clean_args, ensure_ascii=False, default=str).encode()),
+                 result_chars=len(str(result)),
+                 ok=not SkillManager.is_failure(result))
+
+    def execute(self, skill_name: str, **kwargs) -> str:
+        skill, clean_args, error = self._prepare(skill_name, kwargs)
+        if error: return error
+
+        self._invalidate_observations(skill)
+        with tracer.span("skill", action=skill_name) as sp:
+            try:
+                result = skill.execute(**clean_args)
+            except TypeError as e:
+                result = f"❌ 参数错误: {e}"
+            except Exception as e:
+                result = f"❌ 运行时错误: {e}"
+            finally:
+                self._invalidate_observations(skill)
+            self._trace_skill(sp, skill, clean_args, result)
+            return result
+
+    async def aexecute(self, skill_name: str, **kwargs) -> str:
+        """异步执行：同步技能通过 Skill.aexecute 的线程池垫片运行"""
+        skill, clean_args, error = self._prepare(skill_name, kwargs)
+        if error: return error
+
+        self._invalidate_observations(skill)
+        with tracer.span("skill", action=skill_name) as sp:
+            try:
+                result = await skill.aexecute(**clean_args)
+            except TypeError as e:
+                result = f"❌ 参数错误: {e}"
+            except Exception as e:
+                result = f"❌ 运行时错误: {e}"
+            finally:
+                self._invalidate_observations(skill)
+            self._trace_skill(sp, skill, clean_args, result)
+            return result
+
+    def export_state(self):
+        """各技能需要断点保存的状态 {技能名: 状态}"""
+        states = {}
+        for name, skill in self.skills.items():
+            try:
+                state = skill.export_state()
+            except Exception as e:
+                log.error(f"技能 {name} 状态导出失败: {e}")
+                continue
+            if state is not None:
+                states[name] = state
+        return states
+
+    def restore_state(self, states):
+        """把 export_state 的结果还给对应技能（已不存在的技能忽略）"""
+        for name, state in (states or {}).items():
+            skill = self.skills.get(name)
+            if not skill: continue
+            try:
+                skill.restore_state(state)
+            except Exception as e:
+                log.error(f"技能 {name} 状态恢复失败: {e}")
+
+    @staticmethod
+    def is_failure(result) -> bool:
+        """技能约定失败结果以 ❌ 开头"""
+        return str(result).strip().startswith("❌")
+
+    async def aexecute_batch(self, actions, on_step=None):
+        """
+        按顺序执行一组动作，遇到第一个失败立即停止
+
+        Args:
+            actions: [{"action": ..., "args": {...}, "verify_after": bool}, ...]
+            on_step: 每步执行完后的 async 回调 on_step(index, item, result)（视觉检查点、断点在这里插入）
+
+        Returns:
+            list: 每个已执行动作的 {"action", "args", "result", "ok"}
+        """
+        records = []
+        for i, item in enumerate(actions):
+            action, args = item.get("action"), item.get("args") or {}
+            result = await self.aexecute(action, **args)
+            ok = not self.is_failure(result)
+            records.append({"action": action, "args": args, "result": result, "ok": ok})
+            if on_step: await on_step(i, item, result)
+            if not ok: break
+        return records
@@ -1,92 +1,330 @@
 import sqlite3
 import json
 import os
+import time
+import queue
+import atexit
+import threading
+from core.context import SUMMARY_HEADER
+
+# 每个连接都会设置的 PRAGMA：WAL 下读写互不阻塞，synchronous=NORMAL 只在检查点时 fsync
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+
+# 数据库结构版本 (PRAGMA user_version)
+# 0: sessions.history 整段 JSON
+# 1: 历史拆到 events 表，每条消息一行，只追加
+# 2: sessions 增加 checkpoint 列（技能状态、画面指纹、中断时执行了一半的动作）
+SCHEMA_VERSION = 2
+
+
+def _is_derived(msg):
+    """上下文压缩生成的摘要消息：每步都会重新生成，不落盘（恢复时由上下文管理器重新生成）"""
+    content = msg.get("content") if isinstance(msg, dict) else None
+    return isinstance(content, str) and content.startswith(SUMMARY_HEADER)
+
 
 class StateManager:
-    def __init__(self, db_path=r"./memory/state.db"):
+    """
+    会话状态持久化 (SQLite)
+    - 每个线程一个长连接，WAL 模式
+    - save_session 在调用方线程里把快照序列化成字符串放进队列就返回（引擎之后还会原地改历史里的消息，
+      写线程不碰活的对象）；后台写线程把短时间内的多次保存合并成一个事务（同一会话只写最新的一份）
+    - 历史按消息追加到 events 表 (session_id, seq)，每次保存只写新增的消息，
+      会话越长保存也不会越慢；被上下文压缩挤出内存的消息仍然留在日志里
+    - 读之前先 flush，保证读到自己刚写的内容
+    """
+
+    def __init__(self, db_path=r"./memory/state.db", coalesce_window=0.05):
+        """
+        Args:
+            db_path: 数据库路径
+            coalesce_window: 后台写线程收到第一个保存请求后再等这么久 (秒)，把期间的保存合并提交
+        """
         self.db_path = db_path
-        
+        self.coalesce_window = coalesce_window
+
         # 自动创建目录（防止因为目录不存在报错）
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+        # 后台写线程: session_id -> 最新快照
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._wakeup = queue.Queue()
+        self._idle = threading.Condition(self._pending_lock)
+        self._writing = False
+        self._closed = False
+
+        # 增量历史: session_id -> {id(消息): 消息}（已落盘且仍在内存历史里的消息，持有引用保证 id 不被复用）
+        # 会话结束 (status 不再是 running) 后清掉
+        self._seen = {}
+        self._next_seq = {}
+
         # 初始化数据库表
         self._init_db()
-        
+
+        self._writer = threading.Thread(target=self._writer_loop, name="state-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _conn(self):
+        """当前线程的长连接（第一次使用时创建并设置 PRAGMA）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
     def _init_db(self):
         """初始化数据库结构"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        conn = self._conn()
+
         # 创建表（包含 task_content）
-        cursor.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS sessions (
                 session_id TEXT PRIMARY KEY,
                 task_content TEXT,            -- 存任务目标
                 plan TEXT,                    -- 存 Plan JSON
-                history TEXT,                 -- 存 History JSON
+                history TEXT,                 -- 旧版整段 History JSON（已迁移到 events 表，保持为 NULL）
                 current_step INTEGER,
-                status TEXT,                  -- running 或 done
+                status TEXT,                  -- running (未完成/被中断) / done / failed / abandoned
+                checkpoint TEXT,              -- 断点附加信息 JSON
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions(status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,         -- 会话内的消息序号，从 0 开始
+                role TEXT,
+                payload TEXT,                 -- 单条消息 JSON
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID
+        ''')
         conn.commit()
-        conn.close()
+        self._migrate(conn)
+
+    def _migrate(self, conn):
+        """旧库迁移 (按 user_version 逐级升级)"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION: return
+        with conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            if "checkpoint" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN checkpoint TEXT")
+            rows = conn.execute("SELECT session_id, history FROM sessions WHERE history IS NOT NULL").fetchall()
+            for session_id, blob in rows:
+                try:
+                    history = json.loads(blob) or []
+                except (TypeError, ValueError):
+                    print(f"❌ 会话 {session_id} 的历史无法解析，跳过迁移")
+                    continue
+                conn.execute("DELETE FROM events WHERE session_id=?", (session_id,))
+                conn.executemany(
+                    "INSERT INTO events (session_id, seq, role, payload) VALUES (?, ?, ?, ?)",
+                    [(session_id, seq, msg.get("role") if isinstance(msg, dict) else None, json.dumps(msg, ensure_ascii=False))
+                     for seq, msg in enumerate(history)]
+                )
+                conn.execute("UPDATE sessions SET history=NULL WHERE session_id=?", (session_id,))
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if rows:
+            print(f"✅ 已把 {len(rows)} 个会话的历史迁移到 events 表")
 
     def list_running_sessions(self):
         """列出所有未完成的任务"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT session_id, task_content, current_step FROM sessions WHERE status='running'")
-        rows = cursor.fetchall()
-        conn.close()
-        return rows 
-
-    def save_session(self, session_id, task_content, brain, status="running"):
+        self.flush()
+        cursor = self._conn().execute(
+            "SELECT session_id, task_content, current_step FROM sessions WHERE status='running' ORDER BY updated_at DESC"
+        )
+        return cursor.fetchall()
+
+    def save_session(self, session_id, task_content, brain, status="running", wait=False, checkpoint=None):
         """
         [核心修复] 保存会话
-        增加了 task_content 参数，并适配了新的 SQL 结构
+        在调用方线程把快照序列化好（只序列化新增的消息）放进写队列，提交由后台写线程完成
+
+        Args:
+            status: running 以外的状态表示会话结束，之后不再跟踪它的内存历史
+            wait: 等到真正落盘再返回（任务结束时用）
+            checkpoint: 断点附加信息 (可 JSON 序列化的 dict)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # 序列化数据
-        plan_json = json.dumps(brain.plan, ensure_ascii=False)
-        history_json = json.dumps(brain.history, ensure_ascii=False)
-
-        cursor.execute('''
-            INSERT OR REPLACE INTO sessions 
-            (session_id, task_content, plan, history, current_step, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            session_id, 
-            task_content,     # 必填：任务内容
-            plan_json, 
-            history_json,
-            brain.current_step,
-            status
-        ))
-        conn.commit()
-        conn.close()
+        plan = json.dumps(brain.plan, ensure_ascii=False)
+        checkpoint = json.dumps(checkpoint, ensure_ascii=False) if checkpoint is not None else None
+        with self._pending_lock:
+            if self._closed:
+                raise RuntimeError("StateManager 已关闭")
+            events = [
+                (seq, msg.get("role") if isinstance(msg, dict) else None, json.dumps(msg, ensure_ascii=False))
+                for seq, msg in self._new_events(session_id, brain.history)
+            ]
+            if status != "running":
+                # 会话结束：放掉对历史消息的引用
+                self._seen.pop(session_id, None)
+                self._next_seq.pop(session_id, None)
+            previous = self._pending.get(session_id)
+            if previous:
+                # 上一次保存还没落盘：合并新增消息，会话字段取最新
+                events = previous[-1] + events
+            first = not self._pending
+            self._pending[session_id] = (task_content, plan, brain.current_step, status, checkpoint, events)
+        if first:
+            self._wakeup.put(True)
+        if wait:
+            self.flush()
         # print(f"💾 状态已保存 (Step {brain.current_step})")
 
+    def _new_events(self, session_id, history):
+        """
+        找出 history 里还没落盘的消息并分配序号（调用方持有 _pending_lock）
+        按对象身份判断：引擎只会追加新消息、从前面挤掉旧消息，不会换掉已有的消息对象
+
+        Returns:
+            list: [(seq, 消息), ...]
+        """
+        seen = self._seen.get(session_id)
+        if seen is None:
+            seen = self._seen[session_id] = {}
+            self._next_seq[session_id] = self._max_seq(session_id) + 1
+        live = {}
+        events = []
+        for msg in history:
+            key = id(msg)
+            if key in seen:
+                live[key] = msg
+            elif not _is_derived(msg):
+                live[key] = msg
+                events.append((self._next_seq[session_id], msg))
+                self._next_seq[session_id] += 1
+        # 只留仍在内存历史里的消息
+        self._seen[session_id] = live
+        return events
+
+    def _max_seq(self, session_id):
+        row = self._conn().execute("SELECT MAX(seq) FROM events WHERE session_id=?", (session_id,)).fetchone()
+        return row[0] if row and row[0] is not None else -1
+
+    def _write(self, batch):
+        """在一个事务里写入一批快照（已序列化）：会话行 upsert + 新增消息追加"""
+        conn = self._conn()
+        rows = [
+            (session_id, task_content, plan, current_step, status, checkpoint)
+            for session_id, (task_content, plan, current_step, status, checkpoint, _) in batch.items()
+        ]
+        events = [
+            (session_id, seq, role, payload)
+            for session_id, (*_, new_events) in batch.items()
+            for seq, role, payload in new_events
+        ]
+        with conn:
+            conn.executemany('''
+                INSERT INTO sessions (session_id, task_content, plan, current_step, status, checkpoint, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    task_content=excluded.task_content, plan=excluded.plan, current_step=excluded.current_step,
+                    status=excluded.status, checkpoint=excluded.checkpoint, updated_at=excluded.updated_at
+            ''', rows)
+            conn.executemany(
+                "INSERT OR REPLACE INTO events (session_id, seq, role, payload) VALUES (?, ?, ?, ?)", events
+            )
+
+    def _writer_loop(self):
+        while True:
+            if not self._wakeup.get(): break
+            # 等一小会儿，让紧接着的几次保存合并进同一个事务
+            if self.coalesce_window > 0:
+                time.sleep(self.coalesce_window)
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+                self._writing = bool(batch)
+            try:
+                if batch: self._write(batch)
+            except Exception as e:
+                print(f"❌ 状态保存失败: {e}")
+            finally:
+                with self._pending_lock:
+                    self._writing = False
+                    self._idle.notify_all()
+
+    def flush(self, timeout=5.0):
+        """等待所有排队的保存写完"""
+        with self._pending_lock:
+            if self._pending and self._wakeup.empty():
+                self._wakeup.put(True)
+            self._idle.wait_for(lambda: not self._pending and not self._writing, timeout=timeout)
+
+    def close(self):
+        """写完排队的保存，停止写线程并关闭所有连接"""
+        if self._closed: return
+        self.flush()
+        with self._pending_lock:
+            self._closed = True
+        self._wakeup.put(False)
+        self._writer.join(timeout=5)
+        with self._conns_lock:
+            for conn in self._conns:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._conns.clear()
+
     def load_session(self, session_id):
         """
         [核心修复] 读取会话
         现在返回的数据结构里包含了 status 和 task_content
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT plan, history, current_step, status, task_content FROM sessions WHERE session_id=?", (session_id,))
+        self.flush()
+        cursor = self._conn().execute(
+            "SELECT plan, current_step, status, task_content, checkpoint FROM sessions WHERE session_id=?", (session_id,)
+        )
         row = cursor.fetchone()
-        conn.close()
-        
+
         if row:
+            history = list(self.iter_history(session_id))
+            # 返回的消息对象就是已落盘的，之后接着保存只会追加新消息
+            with self._pending_lock:
+                self._seen[session_id] = {id(msg): msg for msg in history}
+                self._next_seq[session_id] = self._max_seq(session_id) + 1
             return {
                 "plan": json.loads(row[0]),
-                "history": json.loads(row[1]),
-                "current_step": row[2],
-                "status": row[3],
-                "task_content": row[4]
+                "history": history,
+                "current_step": row[1],
+                "status": row[2],
+                "task_content": row[3],
+                "checkpoint": json.loads(row[4]) if row[4] else {}
             }
-        return None
\ No newline at end of file
+        return None
+
+    def set_status(self, session_ids, status):
+        """批量修改会话状态（例如放弃不再恢复的中断会话）"""
+        self.flush()
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE sessions SET status=?, updated_at=CURRENT_TIMESTAMP WHERE session_id=?",
+                [(status, session_id) for session_id in session_ids]
+            )
+
+    def iter_history(self, session_id):
+        """按顺序逐条读出会话的完整历史（流式，不一次性载入整段 JSON）"""
+        self.flush()
+        cursor = self._conn().execute(
+            "SELECT payload FROM events WHERE session_id=? ORDER BY seq", (session_id,)
+        )
+        for (payload,) in cursor:
+            yield json.loads(payload)
@@ -0,0 +1,146 @@
+"""
+Streaming Executor
+流式读取模型输出，一旦 {"thought","action","args"} 对象闭合就立即返回，
+不再等待模型写完 JSON 后面的废话。
+"""
+
+import json
+import asyncio
+
+
+def extract_json(content):
+    """JSON 提取器"""
+    if not content: return None
+    decoder = json.JSONDecoder()
+    pos = 0
+    while pos < len(content):
+        brace_pos = content.find('{', pos)
+        if brace_pos == -1: break
+        try:
+            obj, end_pos = decoder.raw_decode(content, idx=brace_pos)
+            return obj
+        except json.JSONDecodeError:
+            pos = brace_pos + 1
+            continue
+    return None
+
+
+class JsonObjectScanner:
+    """
+    增量 JSON 扫描器
+    逐段喂入 token，跟踪花括号深度（忽略字符串内部的括号），
+    每当顶层对象闭合时尝试解析一次。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.result = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, delta):
+        """
+        喂入一段增量文本
+
+        Returns:
+            bool: 是否已经拿到完整的 JSON 对象
+        """
+        if self.result is not None: return True
+
+        for i, ch in enumerate(delta):
+            if self._depth > 0 and self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '{':
+                self._depth += 1
+            elif ch == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self.text + delta[:i + 1]
+                    obj = extract_json(candidate)
+                    if isinstance(obj, dict):
+                        # 只保留到 JSON 结束为止的内容，后面的评论全部丢弃
+                        self.text = candidate
+                        self.result = obj
+                        return True
+            elif ch == '"' and self._depth > 0:
+                self._in_string = True
+
+        self.text += delta
+        return False
+
+
+def _adiscard_stream(stream, drain=False, on_usage=None):
+    """丢弃剩余的流：断开连接，或者挂一个后台任务把剩余输出读完（保持连接可复用）"""
+    async def _drain():
+        try:
+            async for chunk in stream:
+                if on_usage and getattr(chunk, "usage", None):
+                    on_usage(chunk.usage)
+        except Exception:
+            pass
+
+    async def _close():
+        try:
+            await stream.close()
+        except Exception:
+            pass
+
+    return _drain() if drain else _close()
+
+
+# 后台读尾巴的任务（事件循环只持有弱引用，这里保留强引用直到读完）
+_BACKGROUND = set()
+
+
+async def astream_action(client, model, messages, drain=False, on_usage=None, pending=None, **kwargs):
+    """
+    流式调用模型 (AsyncOpenAI)，检测到动作 JSON 闭合后立即返回
+
+    Args:
+        client: AsyncOpenAI 客户端
+        model: 模型名称
+        messages: 消息列表
+        drain: True 时在后台读完剩余输出，否则直接断开连接
+        on_usage: 流里带了 usage（需要 stream_options.include_usage 且读到了结尾）时的回调
+        pending: 可选的 set，后台读尾巴的任务会放进去（读完自动移除），调用方可以在统计用量前等它们结束
+
+    Returns:
+        tuple: (截止到 JSON 结束的文本, 解析出的动作 dict 或 None)
+    """
+    stream = await client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    scanner = JsonObjectScanner()
+    finished = False
+    try:
+        async for chunk in stream:
+            if on_usage and getattr(chunk, "usage", None):
+                on_usage(chunk.usage)
+            if not chunk.choices: continue
+            delta = chunk.choices[0].delta.content
+            if delta and scanner.feed(delta):
+                break
+        else:
+            finished = True
+    finally:
+        if not finished:
+            if drain:
+                # 不阻塞当前步骤，后台读完即可
+                task = asyncio.ensure_future(_adiscard_stream(stream, drain=True, on_usage=on_usage))
+                for tasks in (_BACKGROUND, pending):
+                    if tasks is None: continue
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            else:
+                await _adiscard_stream(stream)
+
+    if scanner.result is None:
+        # 流读完了也没等到顶层对象闭合（比如正文里有落单的 "{"），退回整段文本提取
+        return scanner.text, extract_json(scanner.text)
+    return scanner.text, scanner.result
@@ -0,0 +1,232 @@
+"""
+Tracing
+按任务记录嵌套的耗时 Span（规划、每次模型调用、技能执行、sleep、截图/编码、视觉调用），
+用来回答"慢任务的时间到底花在哪"。
+- 父子关系通过 contextvars 传递，asyncio 任务和 to_thread 线程里都能接上
+- 每个任务(根 Span, root=True)按 TRACE_SAMPLE_RATE 决定是否采样，不采样时 span() 返回空对象，几乎零开销
+- 导出 JSONL（一行一个 Span）和 Chrome / Perfetto 的 trace 格式 (chrome://tracing, ui.perfetto.dev)
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import contextlib
+import contextvars
+
+# 当前所在的 Span；_UNSAMPLED 表示所在任务没被采样，子 Span 全部跳过
+_UNSAMPLED = object()
+_current = contextvars.ContextVar("tinbot_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "lane", "attrs")
+
+    def __init__(self, name, trace_id, span_id, parent_id, lane, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.lane = lane
+        self.attrs = attrs
+        self.start = time.time()
+        self.end = None
+
+    def set(self, **attrs):
+        """补充属性（Token 数、字节数、结果等）"""
+        self.attrs.update(attrs)
+        return self
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "lane": self.lane,
+            "attrs": self.attrs
+        }
+
+
+class _NullSpan:
+    """未采样时的占位对象：接口和 Span 一样，什么都不做，布尔值为 False"""
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attrs):
+        return self
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _lane():
+    """
+    Chrome trace 的 tid：同一线程里的不同 asyncio 任务会互相重叠，各自单独一条泳道
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return f"task:{task.get_name()}"
+    return f"thread:{threading.current_thread().name}"
+
+
+class Tracer:
+    """
+    Span 收集器，按 trace_id（一个任务一个）分组保存，导出后释放
+    """
+
+    def __init__(self, sample_rate=0.0):
+        self.sample_rate = sample_rate
+        self._traces = {}
+        self._lock = threading.Lock()
+        self._ids = 0
+
+    def _next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def current(self):
+        span = _current.get()
+        return span if isinstance(span, Span) else NULL_SPAN
+
+    @contextlib.contextmanager
+    def span(self, name, root=False, **attrs):
+        """
+        开一个 Span
+        root=True 表示一个任务的根，在这里决定整个任务是否采样；
+        不在任何任务里的普通 Span（例如单独调用技能）直接忽略
+
+        用法:
+            with tracer.span("skill", skill="terminal") as sp:
+                ...
+                sp.set(result_chars=len(result))
+        """
+        parent = _current.get()
+        if parent is _UNSAMPLED or (parent is None and not root):
+            yield NULL_SPAN
+            return
+
+        if parent is None:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                token = _current.set(_UNSAMPLED)
+                try:
+                    yield NULL_SPAN
+                finally:
+                    _current.reset(token)
+                return
+            trace_id, parent_id = f"{int(time.time())}-{self._next_id()}", None
+        else:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+
+        span = Span(name, trace_id, self._next_id(), parent_id, _lane(), attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.time()
+            _current.reset(token)
+            with self._lock:
+                self._traces.setdefault(trace_id, []).append(span)
+
+    def spans(self, trace_id):
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def pop(self, trace_id):
+        with self._lock:
+            return self._traces.pop(trace_id, [])
+
+    def export(self, trace_id, out_dir):
+        """
+        把一个任务的 Span 写成 <trace_id>.jsonl 和 <trace_id>.trace.json，并从内存中移除
+
+        Returns:
+            tuple: (jsonl 路径, chrome trace 路径)，没有数据时返回 None
+        """
+        spans = sorted(self.pop(trace_id), key=lambda s: s.start)
+        if not spans: return None
+        os.makedirs(out_dir, exist_ok=True)
+        jsonl_path = os.path.join(out_dir, f"{trace_id}.jsonl")
+        chrome_path = os.path.join(out_dir, f"{trace_id}.trace.json")
+        write_jsonl(spans, jsonl_path)
+        write_chrome_trace(spans, chrome_path)
+        return jsonl_path, chrome_path
+
+
+def write_jsonl(spans, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for span in spans:
+            f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+def to_chrome_events(spans):
+    """Span -> Chrome trace 事件（完整事件 ph=X，时间单位微秒）"""
+    pid = os.getpid()
+    lanes = {}
+    events = []
+    for span in spans:
+        tid = lanes.setdefault(span.lane, len(lanes) + 1)
+        events.append({
+            "name": span.name,
+            "cat": "tinbot",
+            "ph": "X",
+            "ts": int(span.start * 1e6),
+            "dur": max(1, int(span.duration * 1e6)),
+            "pid": pid,
+            "tid": tid,
+            "args": dict(span.attrs, span_id=span.span_id, parent_id=span.parent_id)
+        })
+    # 泳道命名
+    for lane, tid in lanes.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}})
+    return events
+
+
+def write_chrome_trace(spans, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": to_chrome_events(spans), "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+
+def _default_rate():
+    try:
+        from core.config import settings
+        return settings.TRACE_SAMPLE_RATE
+    except Exception:
+        return 0.0
+
+
+# 全局单例
+tracer = Tracer(sample_rate=_default_rate())
+
+
+def span(name, root=False, **attrs):
+    return tracer.span(name, root=root, **attrs)
+
+
+def sleep(seconds, reason=None):
+    """带 Span 的 time.sleep：技能里的固定等待一眼就能在时间线上看到"""
+    with tracer.span("sleep", seconds=seconds, reason=reason):
+        time.sleep(seconds)
+
+
+async def asleep(seconds, reason=None):
+    """asyncio.sleep 的带 Span 版本"""
+    with tracer.span("sleep", seconds=seconds, reason=reason):
+        await asyncio.sleep(seconds)
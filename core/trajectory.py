@@ -0,0 +1,273 @@
+"""
+Trajectory Memory
+成功完成的任务（任务描述 + 计划 + 动作序列）存进 SQLite FTS5 全文索引：
+- 规划前按 BM25 找出最相似的几条历史轨迹，压缩成少量示例交给规划器参考
+- 几乎相同的任务（任务文本相似度超过阈值，且数字、引号里的内容、文件名完全一致）直接复用当时的计划，跳过规划调用
+- 中文按相邻两字切词、英文数字按单词切词，不依赖分词库；SQLite 不带 FTS5 时自动关闭
+"""
+
+import re
+import json
+import sqlite3
+import threading
+from core.state import PRAGMAS
+from core.prompts import task_message
+from core.streaming import extract_json
+
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[a-z0-9_]+")
+# 任务里必须逐字相同才能复用计划的片段：引号里的内容、文件名/路径、数字
+_LITERAL = re.compile(
+    r'"([^"]*)"|\'([^\']*)\'|“([^”]*)”|‘([^’]*)’|「([^」]*)」|《([^》]*)》'
+    r'|([\w\-./\\:]+\.[A-Za-z0-9]+)'
+    r'|(\d+(?:\.\d+)?)'
+)
+
+# 示例里每条轨迹最多列出的动作数 / 每个参数值最多保留的字符数
+MAX_EXAMPLE_ACTIONS = 12
+MAX_ARG_CHARS = 40
+
+
+def tokenize(text):
+    """
+    切词：中文连续片段取相邻两字（单字片段保留单字），英文数字取小写单词
+
+    Returns:
+        list: 词列表（保持出现顺序，可能重复）
+    """
+    text = (text or "").lower()
+    tokens = []
+    for run in _CJK.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+def similarity(a, b):
+    """两段文本词集合的 Dice 系数 (0 ~ 1)"""
+    ta, tb = set(tokenize(a)), set(tokenize(b))
+    if not ta or not tb: return 0.0
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def literals(text):
+    """
+    取出任务里的字面量（引号里的内容、文件名/路径、数字），按出现顺序
+
+    Returns:
+        list: 字面量列表
+    """
+    return [next(g for g in m.groups() if g is not None) for m in _LITERAL.finditer(text or "")]
+
+
+def same_literals(a, b):
+    """两个任务的字面量是否完全一致（只差一个文件名或数字的任务，旧计划不能直接拿来用）"""
+    return literals(a) == literals(b)
+
+
+def actions_from_history(history, task, plan):
+    """
+    从对话历史里取出这个任务执行过的动作序列（当前任务/计划消息之后的 assistant 回复，不含 finish）
+
+    Returns:
+        list: [{"action": ..., "args": {...}}, ...]
+    """
+    anchor = task_message(task, plan)
+    start = next((i for i in range(len(history) - 1, -1, -1) if history[i] == anchor), None)
+    if start is None: return []
+
+    actions = []
+    for msg in history[start + 1:]:
+        if msg.get("role") != "assistant": continue
+        data = extract_json(msg.get("content") or "")
+        if not isinstance(data, dict): continue
+        items = data["actions"] if isinstance(data.get("actions"), list) else [data]
+        for item in items:
+            if not isinstance(item, dict) or not item.get("action"): continue
+            if item["action"] in ("finish", "任务完成"): continue
+            actions.append({"action": item["action"], "args": item.get("args") or {}})
+    return actions
+
+
+def compact_actions(actions, limit=MAX_EXAMPLE_ACTIONS):
+    """动作序列压成一行: hotkey(target=ctrl,l) -> terminal(command=ls) ..."""
+    parts = []
+    for item in actions[:limit]:
+        args = ", ".join(f"{k}={str(v)[:MAX_ARG_CHARS]}" for k, v in (item.get("args") or {}).items())
+        parts.append(f"{item['action']}({args})")
+    if len(actions) > limit:
+        parts.append(f"... (共 {len(actions)} 步)")
+    return " -> ".join(parts)
+
+
+class Trajectory:
+    def __init__(self, session_id, task, plan, actions, summary, score=0.0):
+        self.session_id = session_id
+        self.task = task
+        self.plan = plan
+        self.actions = actions
+        self.summary = summary
+        # 与查询任务的文本相似度 (0 ~ 1)
+        self.score = score
+
+    def __repr__(self):
+        return f"Trajectory({self.session_id!r}, score={self.score:.2f}, task={self.task[:30]!r})"
+
+
+class TrajectoryMemory:
+    """
+    成功轨迹的全文索引（与 StateManager 共用同一个数据库文件）
+
+    Args:
+        db_path: 数据库路径
+        top_k: 默认返回的相似轨迹条数
+        min_score: 相似度低于该值的轨迹不作为示例
+    """
+
+    def __init__(self, db_path=r"./memory/state.db", top_k=3, min_score=0.3):
+        self.db_path = db_path
+        self.top_k = top_k
+        self.min_score = min_score
+        self._local = threading.local()
+        self.enabled = True
+        try:
+            self._init_db()
+        except sqlite3.OperationalError as e:
+            # 编译时没带 FTS5 的 SQLite
+            print(f"❌ 轨迹记忆不可用: {e}")
+            self.enabled = False
+
+    @classmethod
+    def from_settings(cls, db_path, settings=None):
+        if settings is None:
+            from core.config import settings
+        return cls(db_path, top_k=settings.TRAJECTORY_TOP_K, min_score=settings.TRAJECTORY_MIN_SCORE)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trajectories (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT UNIQUE,
+                    task TEXT,
+                    plan TEXT,
+                    actions TEXT,                 -- 动作序列 JSON
+                    summary TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # 存的是切好的词（空格分隔），rowid = trajectories.id
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS trajectory_fts USING fts5(task, plan, actions)")
+
+    def record(self, session_id, task, plan, actions, summary=None):
+        """把一次成功的执行加入索引（同一会话重复记录时覆盖）"""
+        if not self.enabled or not task: return
+        plan = plan if isinstance(plan, str) else json.dumps(plan, ensure_ascii=False)
+        action_text = " ".join(
+            f"{item['action']} " + " ".join(str(v) for v in (item.get("args") or {}).values()) for item in actions
+        )
+        conn = self._conn()
+        with conn:
+            old = conn.execute("SELECT id FROM trajectories WHERE session_id=?", (session_id,)).fetchone()
+            if old:
+                conn.execute("DELETE FROM trajectory_fts WHERE rowid=?", old)
+                conn.execute("DELETE FROM trajectories WHERE id=?", old)
+            cursor = conn.execute(
+                "INSERT INTO trajectories (session_id, task, plan, actions, summary) VALUES (?, ?, ?, ?, ?)",
+                (session_id, task, plan, json.dumps(actions, ensure_ascii=False), summary)
+            )
+            conn.execute(
+                "INSERT INTO trajectory_fts (rowid, task, plan, actions) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, " ".join(tokenize(task)), " ".join(tokenize(plan)), " ".join(tokenize(action_text)))
+            )
+
+    def backfill(self, state):
+        """
+        把数据库里已完成、但还没进索引的会话补进来（升级后第一次启动时用）
+
+        Args:
+            state: core.state.StateManager 实例
+
+        Returns:
+            int: 补录的会话数
+        """
+        if not self.enabled: return 0
+        state.flush()
+        rows = self._conn().execute('''
+            SELECT session_id, task_content, plan, checkpoint FROM sessions
+            WHERE status='done' AND session_id NOT IN (SELECT session_id FROM trajectories)
+        ''').fetchall()
+        count = 0
+        for session_id, task, plan, checkpoint in rows:
+            try:
+                plan = json.loads(plan) if plan else None
+                # 断点里记下的是确实执行成功的动作（与 AgentEngine.remember 一致）；
+                # 没有断点的旧会话才退回到历史里模型给出的动作
+                executed = (json.loads(checkpoint) if checkpoint else {}).get("executed")
+                if executed is not None:
+                    actions = [{"action": step["action"], "args": step.get("args") or {}} for step in executed]
+                else:
+                    actions = actions_from_history(list(state.iter_history(session_id)), task, plan)
+            except Exception as e:
+                print(f"❌ 会话 {session_id} 补录失败: {e}")
+                continue
+            if not actions: continue
+            self.record(session_id, task, plan, actions)
+            count += 1
+        return count
+
+    def search(self, task, k=None):
+        """
+        找出与任务最相似的成功轨迹（BM25 召回，再按任务文本相似度排序）
+
+        Returns:
+            list: [Trajectory, ...]，相似度从高到低，低于 min_score 的不返回
+        """
+        if not self.enabled: return []
+        k = k or self.top_k
+        tokens = sorted(set(tokenize(task)))
+        if not tokens: return []
+        query = " OR ".join(f'"{t}"' for t in tokens)
+        # 任务列权重最高；多召回几条再按任务相似度重排
+        rows = self._conn().execute('''
+            SELECT t.session_id, t.task, t.plan, t.actions, t.summary
+            FROM trajectory_fts JOIN trajectories t ON t.id = trajectory_fts.rowid
+            WHERE trajectory_fts MATCH ?
+            ORDER BY bm25(trajectory_fts, 4.0, 1.0, 1.0)
+            LIMIT ?
+        ''', (query, k * 4)).fetchall()
+
+        results = []
+        for session_id, past_task, plan, actions, summary in rows:
+            score = similarity(task, past_task)
+            if score < self.min_score: continue
+            results.append(Trajectory(session_id, past_task, plan, json.loads(actions or "[]"), summary, score))
+        results.sort(key=lambda t: t.score, reverse=True)
+        return results[:k]
+
+    @staticmethod
+    def format_examples(trajectories):
+        """压缩成给规划器看的参考示例"""
+        blocks = []
+        for i, t in enumerate(trajectories, 1):
+            blocks.append(f"示例 {i} (相似度 {t.score:.2f})\n任务: {t.task}\n计划:\n{t.plan}\n动作: {compact_actions(t.actions)}")
+        return "\n\n".join(blocks)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
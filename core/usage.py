@@ -0,0 +1,75 @@
+"""
+Token Usage
+汇总模型返回的 usage 字段，重点关注服务端前缀缓存命中的 Token 数
+"""
+
+
+def _get(obj, name, default=None):
+    if obj is None: return default
+    if isinstance(obj, dict): return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def cached_tokens_of(usage):
+    """
+    从 usage 中取出缓存命中的 prompt token 数
+    兼容 OpenAI (prompt_tokens_details.cached_tokens) 和 DeepSeek (prompt_cache_hit_tokens)
+    """
+    details = _get(usage, "prompt_tokens_details")
+    cached = _get(details, "cached_tokens")
+    if cached is None:
+        cached = _get(usage, "prompt_cache_hit_tokens")
+    return cached or 0
+
+
+class UsageTracker:
+    """按调用类型 (plan / think / vision ...) 累计 Token 用量"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.by_kind = {}
+
+    def record(self, usage, kind="llm"):
+        """
+        记录一次调用的 usage（None 直接忽略，例如流式被提前截断时）
+
+        Returns:
+            dict: 本次调用的用量
+        """
+        if usage is None: return None
+        entry = {
+            "prompt_tokens": _get(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": _get(usage, "completion_tokens", 0) or 0,
+            "cached_tokens": cached_tokens_of(usage)
+        }
+        self.calls += 1
+        self.prompt_tokens += entry["prompt_tokens"]
+        self.completion_tokens += entry["completion_tokens"]
+        self.cached_tokens += entry["cached_tokens"]
+
+        bucket = self.by_kind.setdefault(kind, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+        bucket["calls"] += 1
+        for k, v in entry.items():
+            bucket[k] += v
+        return entry
+
+    @property
+    def cache_hit_rate(self):
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hit_rate": round(self.cache_hit_rate, 4),
+            "by_kind": {k: dict(v) for k, v in self.by_kind.items()}
+        }
+
+    def describe(self):
+        return (f"prompt {self.prompt_tokens} (缓存命中 {self.cached_tokens}, {self.cache_hit_rate:.0%}) / "
+                f"completion {self.completion_tokens} / {self.calls} 次调用")
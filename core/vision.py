@@ -3,82 +3,314 @@ Vision Engine (Qwen-VL / OpenAI / Gemini)
 视觉中枢 - 让 Agent 长出眼睛
 """
 
-import pyautogui
+import asyncio
 import base64
 import time
 import json
-from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageChops
+from core.tracing import tracer
+from core.geometry import Region
+from core.capture import get_capture
+from core.encoding import get_profile, supported_formats, estimate_image_tokens, describe
+from core.observation_cache import ObservationCache, dhash, hamming
+from core.vision_scheduler import run_encode
+from core.window import get_window_provider, active_window
+
+# 差异检测在 1/4 分辨率的灰度图上做
+DIFF_SCALE = 4
+# 灰度差超过该值的像素算"变了"（原始截图无压缩噪声，主要过滤字体抗锯齿抖动）
+DIFF_PIXEL_THRESHOLD = 8
+# 变化区域四周留白 (屏幕像素) 和最小边长
+CROP_MARGIN = 24
+CROP_MIN_SIDE = 96
+
+
+def _diff_thumb(frame):
+    size = (max(1, frame.size[0] // DIFF_SCALE), max(1, frame.size[1] // DIFF_SCALE))
+    return frame.resize(size, Image.BOX).convert("L")
+
+
+def changed_box(before, after):
+    """
+    两张差异缩略图的变化包围盒，换算回原截图像素 (left, top, right, bottom)；没有变化返回 None
+    """
+    if before.size != after.size: return None
+    mask = ImageChops.difference(before, after).point(lambda p: 255 if p > DIFF_PIXEL_THRESHOLD else 0)
+    box = mask.getbbox()
+    if not box: return None
+    return tuple(v * DIFF_SCALE for v in box)
+
 
 class VisionEngine:
-    def __init__(self, llm_client, model_name="qwen-vl-max"):
+    def __init__(self, llm_client, model_name="qwen-vl-max", cache=None, crop_changes=None, capture=None, windows=None):
+        """
+        Args:
+            cache: ObservationCache 实例（不传则按配置创建）
+            crop_changes: 验证操作时只发送变化区域（不传则读配置 VISION_DIFF_CROP）
+            capture: core.capture.CaptureService（不传则用进程共享的截图服务）
+            windows: core.window 的前台窗口信息提供者（不传则用进程共享的）
+        """
+        from core.config import settings
         self.llm = llm_client
         self.model_name = model_name
+        self.capture = capture or get_capture()
+        # 复用缓冲区里的帧时能接受的最大帧龄 (秒)
+        self.max_frame_age = settings.CAPTURE_MAX_AGE
+        # 视觉服务端支持的图片格式
+        self.image_formats = supported_formats()
+        # 截图范围: screen (整屏) / window (只截前台窗口)
+        self.windows = windows or get_window_provider()
+        self.scope = settings.CAPTURE_SCOPE
+        if cache is None:
+            cache = ObservationCache(
+                capacity=settings.VISION_CACHE_SIZE,
+                max_distance=settings.VISION_CACHE_MAX_DISTANCE,
+                hash_size=settings.VISION_CACHE_HASH_SIZE
+            )
+        self.cache = cache
+        self.crop_changes = settings.VISION_DIFF_CROP if crop_changes is None else crop_changes
+        # 变化区域超过整屏的这个比例就直接发整屏
+        self.crop_max_area = settings.VISION_CROP_MAX_AREA
+        # 差异裁剪的基准帧（动作执行前截的缩略图）
+        self._baseline = None
+        # 最近一次算过指纹的帧 (seq, 指纹)
+        self._hashed = (None, None)
         print(f"[Vision] 视觉引擎初始化: {model_name}")
 
-    def _capture_screen_b64(self):
-        """截图并转为 base64 (省钱版)"""
+    def invalidate_cache(self):
+        """有键鼠输入时调用：屏幕可能已经变了，之前的观察和缓冲的帧全部作废"""
+        self.cache.clear()
+        self.capture.invalidate()
+
+    def grab_frame(self):
+        """现场截一帧整屏 (PIL.Image)，画面稳定检测用（最后一帧会留在缓冲区，观察时直接复用）"""
+        return self.capture.grab().image
+
+    def screen_hash(self, fresh=False):
+        """
+        画面指纹 (dHash 十六进制)，断点保存用
+
+        Args:
+            fresh: True 时现场截图；否则用缓冲区里最近的一帧（不额外截图），没有帧返回 None
+        """
         try:
-            screenshot = pyautogui.screenshot()
-            screenshot = screenshot.convert('RGB')
-            
-            # 【优化】将分辨率限制在 768px (足够看清UI，但Token少很多)
-            # 如果觉得看不清字，可以改成 1024，但 768 是性价比之选
-            max_size = 768 
-            if max(screenshot.size) > max_size:
-                screenshot.thumbnail((max_size, max_size))
-            
-            buffered = BytesIO()
-            # 【优化】JPEG 质量降到 50 (人类看着有噪点，但 AI 识别文字足够了)
-            screenshot.save(buffered, format="JPEG", quality=50)
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            return img_str
+            if fresh:
+                frame = self._frame()
+            else:
+                frames = self.capture.frames()
+                frame = frames[-1] if frames else None
+            if frame is None: return None
+            if self._hashed[0] != frame.seq:
+                self._hashed = (frame.seq, format(dhash(frame.image), "x"))
+            return self._hashed[1]
+        except Exception as e:
+            print(f"❌ 计算画面指纹失败: {e}")
+            return None
+
+    @staticmethod
+    def screen_distance(a, b):
+        """两个画面指纹的汉明距离，任一为空时返回 None"""
+        if not a or not b: return None
+        return hamming(int(a, 16), int(b, 16))
+
+    def _frame(self):
+        """当前画面：缓冲区里足够新的帧，或者现场截"""
+        return self.capture.latest(max_age=self.max_frame_age)
+
+    def _active_window(self, frame):
+        """CAPTURE_SCOPE=window 时返回 (前台窗口, 截图像素框)，否则 (None, None)"""
+        if self.scope != "window": return None, None
+        screen_size = self.capture.screen_size()
+        window = active_window(self.windows, screen_size)
+        if window is None: return None, None
+        return window, window.region.pixel_box(frame.size, screen_size)
+
+    def capture_image(self, profile="verify"):
+        """
+        按编码档位截图 (见 core.encoding)，CAPTURE_SCOPE=window 时只截前台窗口
+
+        Returns:
+            dict: {"data", "mime", "size", "format", "profile"}，失败返回 None
+        """
+        try:
+            frame = self._frame()
+            _, box = self._active_window(frame)
+            return frame.encode_profile(get_profile(profile), self.image_formats, box=box)
         except Exception as e:
             print(f"❌ 截图失败: {e}")
             return None
 
-    def see_and_think(self, prompt="描述当前屏幕内容"):
+    def mark_baseline(self):
+        """动作执行前调用：记下当前画面，之后的观察只发送相对它变化的区域"""
+        if not self.crop_changes: return
+        try:
+            self._baseline = _diff_thumb(self._frame().image)
+        except Exception as e:
+            print(f"❌ 截图失败: {e}")
+            self._baseline = None
+
+    def capture_observation(self):
+        """
+        截一帧用于验证操作
+        - 开启差异裁剪且有基准帧、变化区域不大时: context 档整屏小缩略图 + detail 档变化区域原图
+        - 否则: verify 档整屏图（CAPTURE_SCOPE=window 时只截前台窗口）
+
+        Returns:
+            dict: {"image": 整屏编码结果, "crop": 变化区域编码结果或 None, "region": Region 或 None,
+                   "window": 只截前台窗口时的 WindowInfo 或 None}
+        """
+        try:
+            frame = self._frame()
+        except Exception as e:
+            print(f"❌ 截图失败: {e}")
+            return {"image": None, "crop": None, "region": None, "window": None}
+
+        region = None
+        if self.crop_changes and self._baseline is not None:
+            current = _diff_thumb(frame.image)
+            box = changed_box(self._baseline, current)
+            # 本次画面作为同一批动作中下一个检查点的基准
+            self._baseline = current
+            if box:
+                screen_size = self.capture.screen_size()
+                region = Region.from_pixels(box, frame.size, screen_size).padded(CROP_MARGIN, screen_size)
+                region = self._ensure_min_size(region, screen_size)
+                if region.area > self.crop_max_area * screen_size[0] * screen_size[1]:
+                    region = None
+
+        if region is None:
+            window, box = self._active_window(frame)
+            image = frame.encode_profile(get_profile("verify"), self.image_formats, box=box)
+            return {"image": image, "crop": None, "region": None, "window": window}
+
+        # 文字要看清: 原分辨率 + 稍高的质量；整屏只给一张很小的图做上下文
+        pixel_box = region.pixel_box(frame.size, self.capture.screen_size())
+        crop = frame.encode_profile(get_profile("detail"), self.image_formats, box=pixel_box)
+        image = frame.encode_profile(get_profile("context"), self.image_formats)
+        region = region.with_image_size(crop["size"])
+        return {"image": image, "crop": crop, "region": region, "window": None}
+
+    async def acapture_observation(self):
+        """capture_observation 的异步版本（在编码线程池里截图/编码）"""
+        return await run_encode(self.capture_observation)
+
+    async def amark_baseline(self):
+        await run_encode(self.mark_baseline)
+
+    @staticmethod
+    def _ensure_min_size(region, screen_size):
+        """太小的区域（例如只有光标闪了一下）向四周扩到最小边长，保留一点上下文"""
+        grow_w = max(0, CROP_MIN_SIDE - region.width) // 2 + 1
+        grow_h = max(0, CROP_MIN_SIDE - region.height) // 2 + 1
+        if region.width >= CROP_MIN_SIDE and region.height >= CROP_MIN_SIDE:
+            return region
+        left = max(0, region.left - grow_w)
+        top = max(0, region.top - grow_h)
+        right = min(screen_size[0], region.right + grow_w)
+        bottom = min(screen_size[1], region.bottom + grow_h)
+        return Region(left, top, right - left, bottom - top)
+
+    def see_and_think(self, prompt="描述当前屏幕内容", image=None, crop=None, profile="verify"):
         """
         看一眼屏幕，并回答问题
+
+        Args:
+            prompt: 问题
+            image: 预先截好的图 (capture_image 的结果，不传则按 profile 现场截图)
+            crop: 可选的第二张图（变化区域的原分辨率裁剪）
+            profile: 现场截图用的编码档位（默认最便宜的 verify）
         """
-        b64_img = self._capture_screen_b64()
-        if not b64_img: return "无法获取屏幕图像"
+        if image is None:
+            image = self.capture_image(profile)
+        if not image: return "无法获取屏幕图像"
+
+        # 屏幕没变、问题相同：直接用上次的回答
+        # (带变化区域的请求发生在键鼠操作之后，缓存刚被清空，不参与)
+        phash = None
+        cache_prompt = f"{image['profile']}|{prompt}"
+        if self.cache.enabled and crop is None:
+            try:
+                phash = self.cache.hash_image(image["data"])
+            except Exception as e:
+                print(f"❌ 截图哈希失败: {e}")
+        if phash is not None:
+            cached = self.cache.get(phash, cache_prompt)
+            if cached is not None:
+                tracer.current().set(cache_hit=True)
+                return cached
 
         try:
             # 构造多模态请求 (适配 OpenAI / Qwen 格式)
+            images = [image] + ([crop] if crop else [])
+            for enc in images:
+                print(describe(enc))
             messages = [
                 {
                     "role": "user",
                     "content": [
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{b64_img}"}
-                        },
-                        {"type": "text", "text": prompt}
-                    ]
+                            "image_url": {"url": f"data:{enc['mime']};base64,{base64.b64encode(enc['data']).decode()}"}
+                        }
+                        for enc in images
+                    ] + [{"type": "text", "text": prompt}]
                 }
             ]
 
-            response = self.llm.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=300 # 不需要太长
-            )
-            return response.choices[0].message.content
-            
+            with tracer.span("llm.vision", model=self.model_name, profile=image["profile"],
+                             image_bytes=sum(len(enc["data"]) for enc in images),
+                             image_tokens_est=sum(estimate_image_tokens(enc["size"]) for enc in images)) as sp:
+                response = self.llm.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    max_tokens=300 # 不需要太长
+                )
+                usage = response.usage
+                if sp and usage:
+                    sp.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                answer = response.choices[0].message.content
+
+            if phash is not None and answer:
+                self.cache.put(phash, cache_prompt, answer)
+            return answer
+
         except Exception as e:
             return f"视觉分析出错: {e}"
 
-    def verify_action(self, last_action, last_target):
+    def verify_action(self, last_action, last_target, image=None, crop=None, region=None, window=None):
         """
         【视觉闭环核心】验证刚才的操作是否生效
+
+        Args:
+            image: 预先截好的图 (不传则现场截图)
+            crop / region: 差异裁剪模式下变化区域的原图和它在屏幕上的位置
+            window: 截图只包含前台窗口时的窗口信息
         """
+        if crop and region:
+            screen = f"第一张是整屏缩略图，第二张是操作后画面发生变化的区域原图 (屏幕坐标 x={region.left}, y={region.top}, 宽={region.width}, 高={region.height})"
+        elif window:
+            screen = f"请看当前前台窗口「{window.title}」的截图"
+        else:
+            screen = "请看当前屏幕截图"
         prompt = f"""
         我刚才执行了操作：【{last_action} {last_target}】。
-        请看当前屏幕截图，简要回答：
+        {screen}，简要回答：
         1. 当前活动窗口是什么？
         2. 操作看起来成功了吗？(例如：如果我要打开浏览器，现在看到浏览器窗口了吗？)
         
         请用一句话概括状态。例如："当前是Chrome窗口，操作成功。" 或 "未看到计算器，可能启动失败。"
         """
-        return self.see_and_think(prompt)
\ No newline at end of file
+        return self.see_and_think(prompt, image=image, crop=crop, profile="verify")
+
+    async def averify_action(self, last_action, last_target, image=None, crop=None, region=None, window=None):
+        """
+        verify_action 的异步版本
+        截图/编码 放进编码线程池，模型调用 (由 VisionScheduler 排队限速) 放进默认线程池，不阻塞事件循环
+
+        Args:
+            image / crop / region / window: capture_observation 的结果（不传则现场截图）
+        """
+        if image is None:
+            image = await run_encode(self.capture_image, "verify")
+        if not image: return "无法获取屏幕图像"
+        return await asyncio.to_thread(self.verify_action, last_action, last_target, image, crop, region, window)
@@ -0,0 +1,254 @@
+"""
+Vision Scheduler
+视觉模型请求的统一调度（core.vision 和 skills.vision_engine 共用一个实例）：
+- 有界并发 + 有界排队：同时在飞的请求数有上限，排队的也有上限，满了立即报错而不是无限堆积
+- 令牌桶限速：按服务商的 RPM 配额平滑发请求
+- 429 / 5xx / 超时 / 连接错误按带抖动的指数退避重试（优先用服务端给的 Retry-After）
+- 每个请求一个总截止时间（排队 + 限速等待 + 重试都算在内），慢请求不会拖住整个循环
+- 截图缩放/编码放进独立的有界线程池，不占主循环也不挤占技能线程
+包装方式与 core.replay.RecordReplayClient 相同：只接管 chat.completions.create，其余属性原样转发
+"""
+
+import time
+import random
+import asyncio
+import threading
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from core.tracing import tracer
+
+# 可重试的 HTTP 状态码
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class VisionBusyError(RuntimeError):
+    """排队的视觉请求太多"""
+    pass
+
+
+class VisionDeadlineError(TimeoutError):
+    """视觉请求超过截止时间"""
+    pass
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    Args:
+        rate: 每秒补充的令牌数（0 表示不限速）
+        burst: 桶容量（允许的瞬时突发）
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """取一个令牌；不够时返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, deadline=None):
+        """
+        阻塞直到拿到令牌
+
+        Returns:
+            float: 等待的秒数
+        """
+        if self.rate <= 0: return 0.0
+        start = time.monotonic()
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return time.monotonic() - start
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise VisionDeadlineError("等待限速令牌超过截止时间")
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRY_STATUS
+
+
+def retry_after(error):
+    """服务端给的 Retry-After (秒)，没有返回 None"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _Completions:
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+
+    def create(self, **kwargs):
+        return self._scheduler.complete(**kwargs)
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class VisionScheduler:
+    """
+    同步 OpenAI 兼容客户端的调度包装
+
+    Args:
+        client: OpenAI 实例（建议 max_retries=0，重试由这里统一负责）
+        concurrency: 同时在飞的请求数
+        queue_size: 最多排队的请求数
+        rate: 每秒请求数上限（0 表示不限速）
+        burst: 令牌桶容量
+        max_retries: 最多重试次数
+        retry_base / retry_max: 退避的基准和上限 (秒)
+        deadline: 默认的单请求截止时间 (秒)；调用时传 timeout= 覆盖
+    """
+
+    def __init__(self, client, concurrency=2, queue_size=16, rate=0.0, burst=4,
+                 max_retries=3, retry_base=0.5, retry_max=8.0, deadline=60.0):
+        self._client = client
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.deadline = deadline
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {"requests": 0, "retries": 0, "rejected": 0, "deadline": 0, "queue_wait": 0.0}
+        self.chat = _Chat(_Completions(self))
+
+    @classmethod
+    def from_settings(cls, client, settings=None):
+        if settings is None:
+            from core.config import settings
+        return cls(
+            client,
+            concurrency=settings.VISION_CONCURRENCY,
+            queue_size=settings.VISION_QUEUE_SIZE,
+            rate=settings.VISION_RATE_LIMIT,
+            burst=settings.VISION_RATE_BURST,
+            max_retries=settings.VISION_MAX_RETRIES,
+            retry_base=settings.VISION_RETRY_BASE,
+            retry_max=settings.VISION_RETRY_MAX,
+            deadline=settings.VISION_DEADLINE
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _backoff(self, attempt, error):
+        """全抖动指数退避；服务端给了 Retry-After 就按它来"""
+        hinted = retry_after(error)
+        if hinted is not None:
+            return min(hinted, self.retry_max)
+        return random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempt)))
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.concurrency + self.queue_size:
+                self.stats["rejected"] += 1
+                raise VisionBusyError(f"视觉请求排队已满 ({self._pending} 个)")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def complete(self, timeout=None, **kwargs):
+        """
+        调度执行一次 chat.completions.create
+
+        Args:
+            timeout: 本次请求的总截止时间 (秒)，包括排队、限速和重试
+        """
+        budget = self.deadline if timeout is None else timeout
+        deadline = time.monotonic() + budget
+        self._admit()
+        try:
+            with tracer.span("vision.request") as sp:
+                start = time.monotonic()
+                if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    self.stats["deadline"] += 1
+                    raise VisionDeadlineError(f"视觉请求排队超过 {budget:.0f}s")
+                try:
+                    waited = time.monotonic() - start
+                    self.stats["queue_wait"] += waited
+                    sp.set(wait=round(waited, 4))
+                    return self._call_with_retry(kwargs, deadline, sp)
+                finally:
+                    self._slots.release()
+        finally:
+            self._release()
+
+    def _call_with_retry(self, kwargs, deadline, sp):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats["deadline"] += 1
+                raise VisionDeadlineError("视觉请求超过截止时间")
+            # 重试也要消耗令牌，避免 429 之后一起涌回去
+            throttled = self.bucket.acquire(deadline)
+            if throttled:
+                self.stats["queue_wait"] += throttled
+                sp.set(throttled=round(throttled, 4))
+            remaining = deadline - time.monotonic()
+            self.stats["requests"] += 1
+            try:
+                return self._client.chat.completions.create(timeout=remaining, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                sp.set(retries=attempt)
+                print(f"[Vision] 请求失败 ({type(e).__name__})，{delay:.1f}s 后重试 ({attempt}/{self.max_retries})")
+                time.sleep(delay)
+
+
+# ---------- 编码线程池 ----------
+
+_ENCODE_POOL = None
+_ENCODE_LOCK = threading.Lock()
+
+
+def encode_pool():
+    """截图缩放/编码用的共享线程池（大小读配置 VISION_ENCODE_WORKERS）"""
+    global _ENCODE_POOL
+    with _ENCODE_LOCK:
+        if _ENCODE_POOL is None:
+            from core.config import settings
+            _ENCODE_POOL = ThreadPoolExecutor(max_workers=max(1, settings.VISION_ENCODE_WORKERS),
+                                              thread_name_prefix="vision-encode")
+        return _ENCODE_POOL
+
+
+async def run_encode(fn, *args, **kwargs):
+    """在编码线程池里执行 fn（带上当前 contextvars，耗时追踪的父 Span 不丢）"""
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(encode_pool(), functools.partial(ctx.run, fn, *args, **kwargs))
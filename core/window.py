@@ -0,0 +1,143 @@
+"""
+Window Info
+前台窗口的标题和位置（屏幕坐标），用于只截前台窗口、以及作为元素位置缓存的窗口特征
+可插拔的提供者:
+- pygetwindow: Windows / macOS（pyautogui 自带的依赖）
+- xdotool:     Linux X11（需要系统装 xdotool）
+- fake:        测试和基准用
+- none:        取不到窗口信息，调用方退回整屏
+"""
+
+import shutil
+import threading
+import subprocess
+from core.geometry import Region
+
+
+class WindowInfo:
+    def __init__(self, title, region):
+        self.title = title or ""
+        self.region = region
+
+    def __repr__(self):
+        return f"WindowInfo(title={self.title!r}, region={self.region})"
+
+
+class WindowProvider:
+    """提供者基类：active() 返回前台窗口的 WindowInfo，取不到返回 None"""
+    name = "none"
+
+    def active(self):
+        return None
+
+
+class PyGetWindowProvider(WindowProvider):
+    name = "pygetwindow"
+
+    def __init__(self):
+        import pygetwindow
+        self._gw = pygetwindow
+
+    def active(self):
+        win = self._gw.getActiveWindow()
+        if win is None: return None
+        return WindowInfo(win.title, Region(win.left, win.top, win.width, win.height))
+
+
+class XdotoolProvider(WindowProvider):
+    name = "xdotool"
+
+    def __init__(self):
+        if shutil.which("xdotool") is None:
+            raise ImportError("未找到 xdotool")
+
+    @staticmethod
+    def _run(*args):
+        return subprocess.run(["xdotool", "getactivewindow", *args],
+                              capture_output=True, text=True, timeout=1).stdout
+
+    def active(self):
+        # --shell 输出形如 X=10\nY=20\nWIDTH=800\nHEIGHT=600
+        geometry = dict(
+            line.split("=", 1) for line in self._run("getwindowgeometry", "--shell").splitlines() if "=" in line
+        )
+        if not {"X", "Y", "WIDTH", "HEIGHT"} <= geometry.keys(): return None
+        title = self._run("getwindowname").strip()
+        return WindowInfo(title, Region(int(geometry["X"]), int(geometry["Y"]),
+                                        int(geometry["WIDTH"]), int(geometry["HEIGHT"])))
+
+
+class FakeWindowProvider(WindowProvider):
+    """
+    测试用提供者
+
+    Args:
+        window: WindowInfo，或者每次调用返回 WindowInfo 的函数
+    """
+    name = "fake"
+
+    def __init__(self, window=None):
+        self.window = window
+
+    def active(self):
+        return self.window() if callable(self.window) else self.window
+
+
+PROVIDERS = {"pygetwindow": PyGetWindowProvider, "xdotool": XdotoolProvider,
+             "fake": FakeWindowProvider, "none": WindowProvider}
+
+
+def make_window_provider(name="auto"):
+    """按名字创建提供者；auto 依次尝试 pygetwindow / xdotool，都不可用时返回 none"""
+    if name != "auto":
+        cls = PROVIDERS.get(name)
+        if cls is None:
+            raise ValueError(f"未知的窗口信息提供者: {name}")
+        return cls()
+    for cls in (PyGetWindowProvider, XdotoolProvider):
+        try:
+            return cls()
+        except Exception:
+            continue
+    return WindowProvider()
+
+
+def active_window(provider, screen_size=None, min_side=64):
+    """
+    前台窗口（位置裁到屏幕范围内）；取不到、最小化或太小时返回 None
+
+    Args:
+        screen_size: 屏幕坐标尺寸，用来裁掉窗口伸出屏幕的部分（最大化窗口常有负的边距）
+    """
+    try:
+        window = provider.active()
+    except Exception as e:
+        print(f"❌ 获取前台窗口失败: {e}")
+        return None
+    if window is None: return None
+    region = window.region.clipped(screen_size) if screen_size else window.region
+    if region is None or region.width < min_side or region.height < min_side:
+        return None
+    return WindowInfo(window.title, region)
+
+
+_PROVIDER = None
+_PROVIDER_LOCK = threading.Lock()
+
+
+def get_window_provider():
+    """进程内共享的窗口信息提供者（按配置 WINDOW_PROVIDER 创建）"""
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        if _PROVIDER is None:
+            from core.config import settings
+            _PROVIDER = make_window_provider(settings.WINDOW_PROVIDER)
+        return _PROVIDER
+
+
+def set_window_provider(provider):
+    """替换共享提供者（测试/基准用），返回旧的"""
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        old, _PROVIDER = _PROVIDER, provider
+    return old
@@ -1,5 +1,18 @@
+import asyncio
+import functools
+import contextvars
 from typing import Dict, Any
 
+# 当前会话的技能状态 {技能名: {键: 值}}，由 AgentEngine 在任务开始时绑定
+# 技能在线程池里执行时也带着调用方的 contextvars（见 Skill.aexecute），批量模式下各会话互不影响
+SKILL_SESSION = contextvars.ContextVar("skill_session", default=None)
+
+
+def bind_skill_session(states):
+    """把一个会话的技能状态字典绑定到当前上下文（当前 asyncio 任务及它派生的线程调用）"""
+    return SKILL_SESSION.set(states)
+
+
 class Skill:
     """所有技能必须继承的基类"""
     
@@ -24,9 +37,48 @@ class Skill:
         """
         pass
     
+    def session_get(self, key, default=None):
+        """读当前会话里本技能的状态；没有绑定会话时返回 default"""
+        states = SKILL_SESSION.get()
+        if states is None: return default
+        return states.get(self.name, {}).get(key, default)
+
+    def session_set(self, key, value):
+        """
+        写当前会话里本技能的状态
+
+        Returns:
+            bool: 没有绑定会话时返回 False（调用方自己决定退回到全局状态）
+        """
+        states = SKILL_SESSION.get()
+        if states is None: return False
+        states.setdefault(self.name, {})[key] = value
+        return True
+
+    def export_state(self):
+        """
+        [钩子] 断点保存时调用：返回需要跨进程恢复的状态 (可 JSON 序列化)，没有则返回 None
+        例如终端技能记住的工作目录
+        """
+        return None
+
+    def restore_state(self, state):
+        """[钩子] 恢复会话时调用，state 为 export_state 当时的返回值"""
+        pass
+
     def execute(self, **kwargs) -> str:
         """执行逻辑"""
         raise NotImplementedError("Subclass must implement execute()")
+
+    async def aexecute(self, **kwargs) -> str:
+        """
+        [异步入口] 默认把同步 execute 丢进线程池执行，不阻塞事件循环。
+        原生异步的技能可以直接重写这个方法。
+        """
+        loop = asyncio.get_running_loop()
+        # 带上当前 contextvars（耗时追踪的父 Span 等），和 asyncio.to_thread 行为一致
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(None, functools.partial(ctx.run, self.execute, **kwargs))
     
     def to_tool_definition(self) -> Dict[str, Any]:
         """生成 Tool JSON"""
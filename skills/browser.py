@@ -3,8 +3,8 @@ Browser Skill
 专门用于网页浏览的技能，引导 Agent 进行“浏览-观察”循环
 """
 from skills.base import Skill
+from core import tracing
 import pyautogui
-import time
 import platform
 
 class BrowserSkill(Skill):
@@ -47,7 +47,7 @@ class BrowserSkill(Skill):
             
             # 2. 智能等待加载 (Manus 体验)
             print("[Browser] 正在等待页面加载...")
-            time.sleep(4.0) # 网页加载通常比较慢，多等一会
+            tracing.sleep(4.0) # 网页加载通常比较慢，多等一会
             
             # 3. 提示 Agent 下一步该干嘛
             return f"{res}\n✅ 页面已加载。\n👉 提示：请立刻观察屏幕(Vision)。如果内容不完整，请使用 browser scroll_down。"
@@ -55,7 +55,7 @@ class BrowserSkill(Skill):
         elif action == "scroll_down":
             print("[Browser] 向下滚动...")
             pyautogui.scroll(-800) # 向下滚一屏
-            time.sleep(1.0)
+            tracing.sleep(1.0)
             return "✅ 已向下滚动，请观察新出现的内容。"
 
         return "❌ 未知浏览器动作"
\ No newline at end of file
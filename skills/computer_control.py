@@ -5,9 +5,9 @@ Computer Control Skill (Ultimate Input)
 
 import pyautogui
 import pyperclip
-import time
 import platform
 from skills.base import Skill
+from core import tracing
 
 class ComputerControlSkill(Skill):
     def __init__(self):
@@ -46,12 +46,12 @@ class ComputerControlSkill(Skill):
     def _paste_text(self, text):
         """核心：通过剪贴板粘贴文本（避开输入法）"""
         pyperclip.copy(text)
-        time.sleep(0.1)
+        tracing.sleep(0.1)
         if self._is_mac():
             pyautogui.hotkey('command', 'v')
         else:
             pyautogui.hotkey('ctrl', 'v')
-        time.sleep(0.3)
+        tracing.sleep(0.3)
 
     def execute(self, action: str, target: str = None, **kwargs) -> str:
         action = kwargs.get('operation', action)
@@ -68,11 +68,11 @@ class ComputerControlSkill(Skill):
                 else:
                     pyautogui.press('win')
                 
-                time.sleep(0.5)
+                tracing.sleep(0.5)
                 self._paste_text(target) # 粘贴应用名
-                time.sleep(1.0) 
+                tracing.sleep(1.0) 
                 pyautogui.press('enter')
-                time.sleep(3.0) # 给够时间启动
+                tracing.sleep(3.0) # 给够时间启动
                 return f"✅ 已启动: {target}"
 
             elif action == "browser_nav":
@@ -84,7 +84,7 @@ class ComputerControlSkill(Skill):
                     pyautogui.hotkey('command', 'l')
                 else:
                     pyautogui.hotkey('ctrl', 'l')
-                time.sleep(0.5)
+                tracing.sleep(0.5)
                 
                 # 2. 粘贴内容
                 self._paste_text(target)
@@ -3,10 +3,10 @@ Email Visual Skill
 视觉邮件处理技能 - 基于多模态视觉理解
 """
 
-import time
 import pyautogui
 import pyperclip
 from skills.base import Skill
+from core import tracing
 
 
 class EmailVisualSkill(Skill):
@@ -87,12 +87,20 @@ class EmailVisualSkill(Skill):
             text: 要输入的文本
         """
         pyperclip.copy(text)
-        time.sleep(0.2)
+        tracing.sleep(0.2)
         pyautogui.hotkey('ctrl', 'v')
-        time.sleep(0.5)
+        tracing.sleep(0.5)
     
     def _check_vision_ready(self):
-        """检查视觉引擎是否就绪"""
+        """
+        检查视觉引擎是否就绪
+        未注入时借用全局视觉引擎 (context['vision']) 的客户端创建一个，
+        实例常驻，元素位置缓存在多次调用之间保留
+        """
+        if not self.vision and self.context.get('vision'):
+            from skills.vision_engine import VisionEngine
+            shared = self.context['vision']
+            self.vision = VisionEngine(shared.llm, shared.model_name, capture=shared.capture)
         if not self.vision:
             raise RuntimeError(
                 "❌ VisionEngine 未初始化！\n"
@@ -143,7 +151,8 @@ class EmailVisualSkill(Skill):
         result = self.vision.analyze_ui(
             "请识别邮件列表中最新的 3-5 封邮件，"
             "返回每封邮件的：发件人、主题、时间。"
-            "如果看到未读标记，请注明。"
+            "如果看到未读标记，请注明。",
+            profile="read_text"
         )
         
         text_content = result.get("text_content", "")
@@ -168,62 +177,55 @@ class EmailVisualSkill(Skill):
                 "新建邮件", "New Message", "Write"
             ]
             
-            compose_result = None
-            for keyword in compose_keywords:
-                result = self.vision.click_element(keyword, retry=1)
-                if "✅" in result:
-                    compose_result = result
-                    break
-            
-            if not compose_result:
+            # 所有候选一次截图一次调用定位，取置信度最高的
+            compose_result = self.vision.click_best(compose_keywords)
+            if "✅" not in compose_result:
                 return "❌ 未找到写信按钮，请确认邮件界面已打开"
             
             steps_log.append(compose_result)
-            time.sleep(2)  # 等待弹窗
+            tracing.sleep(2)  # 等待弹窗
+            
+            # 写信窗口里的输入框一次定位完（同时记入位置缓存，后面逐个点击时先本地比对）
+            body_keywords = ["正文", "邮件正文", "编辑区域", "Message body", "邮件内容"]
+            fields = ["收件人输入框"] + (["主题输入框"] if subject else []) + [body_keywords]
+            located = self.vision.locate_many(fields)
             
             # 步骤 2: 填写收件人
             print("步骤 2/4: 填写收件人...")
-            recipient_result = self.vision.click_element("收件人输入框")
+            recipient_result = self.vision.click_best(["收件人输入框"], located=located)
             steps_log.append(recipient_result)
-            time.sleep(0.5)
+            tracing.sleep(0.5)
             
             self._type_text_robust(recipient)
-            time.sleep(0.5)
+            tracing.sleep(0.5)
             
             # 步骤 3: 填写主题（可选）
             if subject:
                 print("步骤 3/4: 填写主题...")
-                subject_result = self.vision.click_element("主题输入框")
+                subject_result = self.vision.click_best(["主题输入框"], located=located)
                 steps_log.append(subject_result)
-                time.sleep(0.5)
+                tracing.sleep(0.5)
                 
                 self._type_text_robust(subject)
-                time.sleep(0.5)
+                tracing.sleep(0.5)
             else:
                 steps_log.append("⏭跳过主题（未提供）")
             
             # 步骤 4: 填写正文
             print("步骤 4/4: 填写正文...")
-            body_keywords = ["正文", "邮件正文", "编辑区域", "Message body", "邮件内容"]
-            
-            body_result = None
-            for keyword in body_keywords:
-                result = self.vision.click_element(keyword, retry=1)
-                if "✅" in result:
-                    body_result = result
-                    break
+            body_result = self.vision.click_best(body_keywords, located=located)
             
-            if not body_result:
+            if "✅" not in body_result:
                 # 尝试按 Tab 键跳转到正文
                 pyautogui.press('tab')
-                time.sleep(0.3)
+                tracing.sleep(0.3)
                 body_result = "未找到正文框，已尝试 Tab 键跳转"
             
             steps_log.append(body_result)
-            time.sleep(0.5)
+            tracing.sleep(0.5)
             
             self._type_text_robust(content)
-            time.sleep(1)
+            tracing.sleep(1)
             
             # 生成总结
             summary = "\n".join([f"  {i+1}. {log}" for i, log in enumerate(steps_log)])
@@ -249,10 +251,9 @@ class EmailVisualSkill(Skill):
             "发送", "Send", "发送邮件", "发 送", "Send Email"
         ]
         
-        for keyword in send_keywords:
-            result = self.vision.click_element(keyword, retry=2)
-            if "✅" in result:
-                return f"✅ 邮件已发送\n{result}"
+        result = self.vision.click_best(send_keywords)
+        if "✅" in result:
+            return f"✅ 邮件已发送\n{result}"
         
         return (
             "未找到发送按钮，请手动点击发送\n"
@@ -268,7 +269,8 @@ class EmailVisualSkill(Skill):
             "按格式返回：\n"
             "发件人: xxx\n"
             "主题: xxx\n"
-            "正文: xxx"
+            "正文: xxx",
+            profile="read_text"
         )
         
         text_content = result.get("text_content", "")
@@ -8,7 +8,7 @@ import os
 import platform
 from skills.base import Skill
 
-# 全局变量：记忆当前路径
+# 全局变量：记忆当前路径（没有绑定会话时使用；Agent 引擎里每个会话各记各的，见 Skill.session_get）
 CURRENT_WORKING_DIR = os.getcwd()
 
 class TerminalSkill(Skill):
@@ -38,15 +38,31 @@ class TerminalSkill(Skill):
             "required": ["command"]
         }
 
-    def execute(self, command, **kwargs) -> str:
+    @property
+    def cwd(self):
+        return self.session_get("cwd", CURRENT_WORKING_DIR)
+
+    def _set_cwd(self, path):
         global CURRENT_WORKING_DIR
-        
+        if not self.session_set("cwd", path):
+            CURRENT_WORKING_DIR = path
+
+    def export_state(self):
+        return {"cwd": self.cwd}
+
+    def restore_state(self, state):
+        cwd = (state or {}).get("cwd")
+        if cwd and os.path.isdir(cwd):
+            self._set_cwd(cwd)
+
+    def execute(self, command, **kwargs) -> str:
+        cwd = self.cwd
         cmd = command or kwargs.get('cmd')
         if not cmd: return "❌ 错误: 空命令"
         
         # 移除首尾空白
         cmd = cmd.strip()
-        print(f"💻 [Terminal] (在 {CURRENT_WORKING_DIR}) 执行: {cmd}")
+        print(f"💻 [Terminal] (在 {cwd}) 执行: {cmd}")
 
         try:
             # === 智能路由逻辑 ===
@@ -70,12 +86,12 @@ class TerminalSkill(Skill):
                 target_raw = target_raw.strip('"').strip("'")
                 
                 # 计算绝对路径
-                new_path = os.path.join(CURRENT_WORKING_DIR, target_raw)
+                new_path = os.path.join(cwd, target_raw)
                 new_path = os.path.abspath(new_path)
                 
                 if os.path.exists(new_path) and os.path.isdir(new_path):
-                    CURRENT_WORKING_DIR = new_path
-                    return f"✅ 工作目录已切换至: {CURRENT_WORKING_DIR}"
+                    self._set_cwd(new_path)
+                    return f"✅ 工作目录已切换至: {new_path}"
                 else:
                     return f"❌ 路径不存在: {new_path}"
 
@@ -89,7 +105,7 @@ class TerminalSkill(Skill):
                 result = subprocess.run(
                     cmd, 
                     shell=True, 
-                    cwd=CURRENT_WORKING_DIR, 
+                    cwd=cwd, 
                     capture_output=True, 
                     text=True,
                     encoding=encoding,
@@ -108,7 +124,7 @@ class TerminalSkill(Skill):
                     else:
                         output = "(执行失败，无返回内容)"
 
-                return f"[Path: {CURRENT_WORKING_DIR}]\n$ {cmd}\n\n{output}"
+                return f"[Path: {cwd}]\n$ {cmd}\n\n{output}"
 
         except Exception as e:
             return f"❌ 终端执行系统错误: {e}"
\ No newline at end of file
@@ -5,11 +5,17 @@ Vision Engine - 支持多种多模态 API
 
 import pyautogui
 import base64
-import time
 import json
 import re
-from io import BytesIO
-from PIL import Image
+from core import tracing
+from core.geometry import Region
+from core.capture import get_capture
+from core.encoding import get_profile, supported_formats, describe
+from core.element_cache import ElementCache
+from core.window import get_window_provider, active_window
+
+# 精定位没找到时，第二次局部图的边长倍数
+REFINE_WIDEN = 2
 
 
 class VisionEngine:
@@ -19,7 +25,7 @@ class VisionEngine:
     支持多种多模态 API
     """
     
-    def __init__(self, llm_client, model_name="qwen-vl-max", api_type="qwen"):
+    def __init__(self, llm_client, model_name="qwen-vl-max", api_type="qwen", capture=None, locations=None, windows=None):
         """
         初始化视觉引擎
         
@@ -27,60 +33,135 @@ class VisionEngine:
             llm_client: API 客户端实例 (OpenAI 兼容格式)
             model_name: 模型名称
             api_type: API 类型 ("openai", "qwen", "gemini", "anthropic")
+            capture: core.capture.CaptureService（不传则用进程共享的截图服务）
+            locations: core.element_cache.ElementCache（不传则按配置创建）
+            windows: core.window 的前台窗口信息提供者（不传则用进程共享的）
         """
+        from core.config import settings
         self.llm = llm_client
         self.model_name = model_name
         self.api_type = api_type.lower()
-        self.screen_width, self.screen_height = pyautogui.size()
+        self.capture = capture or get_capture()
+        self.screen_width, self.screen_height = self.capture.screen_size()
+        # 视觉服务端支持的图片格式
+        self.image_formats = supported_formats()
+        # 截图范围: screen (整屏) / window (只截前台窗口，坐标换算回整屏)
+        self.windows = windows or get_window_provider()
+        self.scope = settings.CAPTURE_SCOPE
         
-        # 视觉缓存
-        self.last_screenshot = None
-        self.last_screenshot_time = 0
+        # 视觉缓存：复用截图服务里不超过 2 秒、且之后没有键鼠输入的帧
         self.cache_duration = 2  # 缓存2秒
+        # 比对位置缓存时要的是当前画面
+        self.max_frame_age = settings.CAPTURE_MAX_AGE
+        # 最近一次发给模型的截图帧（定位成功后从这一帧取图块）及其缩小倍数
+        self._last_frame = None
+        self._last_scale = 1.0
+        
+        # 两级定位：粗定位置信度低于 refine_confidence、或缩略图缩小超过 refine_scale 倍时，
+        # 截粗定位点周围 refine_size 见方 (屏幕坐标) 的原图再定位一次；
+        # 粗定位置信度低于 refine_min_confidence 视为没找到，不放大
+        self.refine_confidence = settings.LOCATE_REFINE_CONFIDENCE
+        self.refine_scale = settings.LOCATE_REFINE_SCALE
+        self.refine_size = settings.LOCATE_REFINE_SIZE
+        self.refine_min_confidence = 0.2
+        
+        # 元素位置缓存：命中时本地比对图块，不调用视觉模型
+        if locations is None:
+            locations = ElementCache(
+                capacity=settings.ELEMENT_CACHE_SIZE,
+                patch_size=settings.ELEMENT_CACHE_PATCH,
+                threshold=settings.ELEMENT_CACHE_THRESHOLD,
+                search_margin=settings.ELEMENT_CACHE_SEARCH
+            )
+        self.locations = locations
         
         print(f"[VisionEngine] 初始化完成")
         print(f"  模型: {model_name}")
         print(f"  API类型: {api_type}")
     
-    def capture_screen(self, use_cache=True):
+    def capture_screen(self, use_cache=True, region=None, profile="locate"):
         """
-        截取当前屏幕并转 Base64
+        截取当前屏幕并按编码档位压缩
         
         Args:
             use_cache: 是否使用缓存
+            region: 只截取该屏幕区域 (core.geometry.Region)，不传则整屏
+            profile: 编码档位 (core.encoding.PROFILES)，定位用 locate，读文字用 read_text
             
         Returns:
-            tuple: (base64字符串, 图片尺寸)
+            dict: {"data", "mime", "size", "format", "profile"}
         """
-        # 检查缓存
-        if use_cache and self.last_screenshot:
-            if time.time() - self.last_screenshot_time < self.cache_duration:
-                return self.last_screenshot
-        
-        # 截图
-        screenshot = pyautogui.screenshot()
+        # 截图（同一帧的编码结果由截图服务缓存）
+        frame = self.capture.latest(max_age=self.cache_duration) if use_cache else self.capture.grab()
+        self._last_frame = frame
+        box = region.pixel_box(frame.size, (self.screen_width, self.screen_height)) if region is not None else None
         
         # 压缩图片（降低 token 消耗）
-        screenshot.thumbnail((1280, 720), Image.Resampling.LANCZOS)
-        
-        # 转 Base64
-        buffered = BytesIO()
-        screenshot.save(buffered, format="JPEG", quality=85)
-        b64_img = base64.b64encode(buffered.getvalue()).decode()
-        
-        # 更新缓存
-        self.last_screenshot = (b64_img, screenshot.size)
-        self.last_screenshot_time = time.time()
-        
-        return b64_img, screenshot.size
+        image = frame.encode_profile(get_profile(profile), self.image_formats, box=box)
+        # 原图像素 / 发送图片像素：越大说明模型看到的越模糊
+        width = (box[2] - box[0]) if box else frame.size[0]
+        self._last_scale = width / image["size"][0]
+        return image
+
+    def _region(self, region=None):
+        """归一化坐标所对应的屏幕区域，默认整屏"""
+        return region or Region.full((self.screen_width, self.screen_height))
+
+    def _scope(self, region=None):
+        """
+        实际截图的区域：调用方指定的区域 > 前台窗口 (CAPTURE_SCOPE=window) > 整屏 (None)
+        """
+        if region is not None or self.scope != "window":
+            return region
+        window = active_window(self.windows, (self.screen_width, self.screen_height))
+        return window.region if window else None
+
+    def _window_signature(self):
+        """当前前台窗口的特征（标题），作为元素位置缓存 key 的一部分；取不到时为空"""
+        try:
+            window = self.windows.active()
+        except Exception:
+            return ""
+        return window.title if window else ""
+
+    def _cached_position(self, key):
+        """元素位置缓存命中（图块还在原处附近）时返回屏幕坐标 (x, y, 得分)，否则 None"""
+        if not self.locations.enabled: return None
+        try:
+            frame = self.capture.latest(max_age=self.max_frame_age)
+            hit = self.locations.lookup(key, frame.image)
+        except Exception as e:
+            print(f"❌ 位置缓存比对失败: {e}")
+            return None
+        if hit is None: return None
+        px, py, score = hit
+        sx = self.screen_width / frame.size[0]
+        sy = self.screen_height / frame.size[1]
+        return int(px * sx), int(py * sy), score
+
+    def _remember_position(self, key, real_x, real_y):
+        """视觉模型定位成功后，记下坐标和所在帧的图块"""
+        frame = self._last_frame
+        if not self.locations.enabled or frame is None: return
+        px = real_x * frame.size[0] / self.screen_width
+        py = real_y * frame.size[1] / self.screen_height
+        try:
+            self.locations.store(key, frame.image, px, py)
+        except Exception as e:
+            print(f"❌ 位置缓存写入失败: {e}")
     
-    def _call_qwen_vision(self, b64_img, prompt):
+    def _call_qwen_vision(self, b64_img, prompt, mime="image/jpeg", grid=False, system_prompt=None):
         """
         调用 Qwen-VL-MAX (通义千问多模态)
         
         Qwen-VL 使用 OpenAI 兼容的 API 格式
+
+        Args:
+            mime: 图片的 MIME 类型
+            grid: 图上叠加了归一化坐标网格
+            system_prompt: 自定义系统提示（不传则为单元素定位格式）
         """
-        system_prompt = """你是一个专业的 UI 视觉分析助手。
+        system_prompt = system_prompt or """你是一个专业的 UI 视觉分析助手。
 你的任务是分析屏幕截图并定位 UI 元素。
 
 **返回格式（严格 JSON）:**
@@ -98,6 +179,8 @@ class VisionEngine:
 - [0.5, 0.5] 代表屏幕正中心
 - 请务必返回纯 JSON，不要包含任何额外的文字说明
 """
+        if grid:
+            system_prompt += "- 图上的洋红色网格线和数字是归一化坐标刻度 (0.1 ~ 0.9)，可以对照网格估计坐标，网格本身不是界面元素\n"
         
         # Qwen-VL-MAX 的消息格式
         messages = [
@@ -111,7 +194,7 @@ class VisionEngine:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{b64_img}"
+                            "url": f"data:{mime};base64,{b64_img}"
                         }
                     },
                     {
@@ -136,24 +219,31 @@ class VisionEngine:
             print(f"Qwen-VL API 调用失败: {e}")
             raise
     
-    def analyze_ui(self, prompt_instruction, use_cache=True):
+    def analyze_ui(self, prompt_instruction, use_cache=True, region=None, profile="locate"):
         """
         分析 UI 界面
         
         Args:
             prompt_instruction: 指令
             use_cache: 是否使用缓存
+            region: 只分析该屏幕区域，返回的归一化坐标相对于该区域（不传则按截图范围配置）
+            profile: 编码档位，找元素用 locate，读文字用 read_text
             
         Returns:
-            dict: 分析结果
+            dict: 分析结果，area 为归一化坐标所对应的屏幕区域
         """
-        b64_img, img_size = self.capture_screen(use_cache)
+        region = self._scope(region)
+        area = self._region(region)
+        image = self.capture_screen(use_cache, region=region, profile=profile)
         
         print(f"[VisionEngine] 正在分析: {prompt_instruction}...")
+        print(describe(image))
         
         try:
             # 调用 Qwen-VL
-            content = self._call_qwen_vision(b64_img, prompt_instruction)
+            b64_img = base64.b64encode(image["data"]).decode()
+            grid = bool(get_profile(profile).grid)
+            content = self._call_qwen_vision(b64_img, prompt_instruction, mime=image["mime"], grid=grid)
             
             # 解析 JSON
             result = self._parse_vision_response(content)
@@ -161,6 +251,7 @@ class VisionEngine:
             if result["confidence"] < 0.5:
                 print(f"[VisionEngine] 低置信度: {result['confidence']}")
             
+            result["area"] = area
             return result
         
         except Exception as e:
@@ -169,43 +260,47 @@ class VisionEngine:
                 "action": "error",
                 "coordinates": [0.5, 0.5],
                 "text_content": f"分析失败: {str(e)}",
-                "confidence": 0
+                "confidence": 0,
+                "area": area
             }
     
+    @staticmethod
+    def _extract_json(content):
+        """从模型输出里取出第一个完整的 JSON 对象"""
+        # 清洗 JSON（移除 Markdown 包裹）
+        content = re.sub(r'```json\s*|\s*```', '', content).strip()
+        
+        start = content.find('{')
+        if start != -1:
+            stack = 0
+            for i in range(start, len(content)):
+                if content[i] == '{':
+                    stack += 1
+                elif content[i] == '}':
+                    stack -= 1
+                    if stack == 0:
+                        return json.loads(content[start:i+1])
+        
+        raise ValueError("未找到有效的 JSON")
+    
     def _parse_vision_response(self, content):
         """解析 LLM 的视觉响应"""
         try:
-            # 清洗 JSON（移除 Markdown 包裹）
-            content = re.sub(r'```json\s*|\s*```', '', content).strip()
+            parsed = self._extract_json(content)
+            
+            # 验证必需字段
+            if "coordinates" not in parsed:
+                raise ValueError("缺少 coordinates 字段")
             
-            # 提取第一个完整的 JSON 对象
-            start = content.find('{')
-            if start != -1:
-                stack = 0
-                for i in range(start, len(content)):
-                    if content[i] == '{':
-                        stack += 1
-                    elif content[i] == '}':
-                        stack -= 1
-                        if stack == 0:
-                            json_str = content[start:i+1]
-                            parsed = json.loads(json_str)
-                            
-                            # 验证必需字段
-                            if "coordinates" not in parsed:
-                                raise ValueError("缺少 coordinates 字段")
-                            
-                            # 设置默认值
-                            if "confidence" not in parsed:
-                                parsed["confidence"] = 0.8
-                            if "text_content" not in parsed:
-                                parsed["text_content"] = ""
-                            if "action" not in parsed:
-                                parsed["action"] = "click"
-                            
-                            return parsed
+            # 设置默认值
+            if "confidence" not in parsed:
+                parsed["confidence"] = 0.8
+            if "text_content" not in parsed:
+                parsed["text_content"] = ""
+            if "action" not in parsed:
+                parsed["action"] = "click"
             
-            raise ValueError("未找到有效的 JSON")
+            return parsed
         
         except Exception as e:
             print(f"❌ JSON 解析失败: {e}")
@@ -217,75 +312,247 @@ class VisionEngine:
                 "confidence": 0
             }
     
-    def click_element(self, element_description, double_click=False, retry=3):
+    def click_element(self, element_description, double_click=False, region=None):
         """
         点击 UI 元素
+        没找到不再整屏重试：粗定位 + 精定位（含一次放大的精定位）都没找到就直接返回失败，交给模型换个说法
         
         Args:
             element_description: 元素描述
             double_click: 是否双击
-            retry: 重试次数
+            region: 只在该屏幕区域里找 (例如 core.vision.VisionEngine.capture_observation 给出的变化区域)
         """
-        for attempt in range(retry):
+        key = self.locations.make_key(self._window_signature(), element_description, region)
+        
+        # 快速路径：同一窗口里找过这个元素，且图块还在，直接点
+        cached = self._cached_position(key)
+        if cached:
+            real_x, real_y, score = cached
+            print(f"[VisionEngine] 位置缓存命中: '{element_description}' (NCC {score:.2f})")
+            tracing.tracer.current().set(element_cache_hit=True)
             try:
-                result = self.analyze_ui(
-                    f"请找到屏幕上的 '{element_description}' 并返回其中心点位置。",
-                    use_cache=(attempt == 0)
-                )
-                
-                if result["confidence"] < 0.5:
-                    if attempt < retry - 1:
-                        print(f"置信度过低，重试 ({attempt + 1}/{retry})...")
-                        time.sleep(1)
-                        continue
-                    else:
-                        return f"❌ 未找到元素: {element_description}"
-                
-                # 转换坐标
-                norm_x, norm_y = result["coordinates"]
-                real_x = int(norm_x * self.screen_width)
-                real_y = int(norm_y * self.screen_height)
-                
-                # 边界检查
-                real_x = max(0, min(real_x, self.screen_width - 1))
-                real_y = max(0, min(real_y, self.screen_height - 1))
-                
-                # 移动并点击
-                pyautogui.moveTo(real_x, real_y, duration=0.5)
-                time.sleep(0.2)
-                
-                if double_click:
-                    pyautogui.doubleClick()
-                else:
-                    pyautogui.click()
-                
-                return f"✅ 已点击 '{element_description}' (坐标: {real_x}, {real_y}, 置信度: {result['confidence']:.2f})"
-            
+                self._click_at(real_x, real_y, double_click)
             except Exception as e:
-                if attempt < retry - 1:
-                    print(f"❌ 点击失败，重试 ({attempt + 1}/{retry}): {e}")
-                    time.sleep(1)
-                else:
-                    return f"❌ 点击失败: {str(e)}"
+                return f"❌ 点击失败: {str(e)}"
+            return f"✅ 已点击 '{element_description}' (坐标: {real_x}, {real_y}, 位置缓存命中)"
+        
+        try:
+            # 粗定位 + (需要时) 原分辨率局部精定位
+            real_x, real_y, confidence = self._locate_point(element_description, region)
+            if confidence < 0.5 or real_x is None:
+                return f"❌ 未找到元素: {element_description}"
+            
+            # 点击前记下位置和图块，下次同一窗口直接本地比对
+            self._remember_position(key, real_x, real_y)
+            self._click_at(real_x, real_y, double_click)
+        except Exception as e:
+            return f"❌ 点击失败: {str(e)}"
+        
+        return f"✅ 已点击 '{element_description}' (坐标: {real_x}, {real_y}, 置信度: {confidence:.2f})"
+    
+    def _locate_point(self, element_description, region=None, use_cache=True):
+        """
+        两级定位
+        1. 在整屏 (或 region) 缩略图上粗定位
+        2. 缩略图缩小得厉害、或粗定位置信度不够高时，截粗定位点周围的原分辨率局部图再定位一次
+           （局部图里没找到就放大 REFINE_WIDEN 倍再看一次，最多 3 次视觉调用）
+        
+        Returns:
+            tuple: (屏幕 x, 屏幕 y, 置信度)，没找到时坐标为 None（精定位说局部图里没有该元素也算没找到）
+        """
+        result = self.analyze_ui(
+            f"请找到屏幕上的 '{element_description}' 并返回其中心点位置。",
+            use_cache=use_cache,
+            region=region
+        )
+        # 区域 / 前台窗口内的归一化坐标都按实际截图的区域换算回整屏
+        area = result["area"]
+        confidence = result["confidence"]
+        # 完全没找到（或分析失败）时没有可以放大的位置
+        if confidence < self.refine_min_confidence:
+            return None, None, confidence
+        
+        # 转换坐标（区域内归一化坐标 -> 屏幕坐标，含边界检查）
+        norm_x, norm_y = result["coordinates"]
+        real_x, real_y = area.normalized_to_screen(norm_x, norm_y)
+        
+        if confidence >= self.refine_confidence and self._last_scale < self.refine_scale:
+            return real_x, real_y, confidence
+        
+        # 精定位：粗定位点周围的原分辨率局部图，坐标换算交给 Region
+        # 局部图里没找到时放大一倍再看一次（粗定位点可能偏了），还没有就算没找到
+        screen_size = (self.screen_width, self.screen_height)
+        zone = None
+        for size in (self.refine_size, self.refine_size * REFINE_WIDEN):
+            wider = Region.around(real_x, real_y, size, screen_size, within=area)
+            if wider == zone: break  # 区域已经到边界放不大了
+            zone = wider
+            print(f"[VisionEngine] 局部精定位: {zone} (粗定位置信度 {confidence:.2f}, 缩放 {self._last_scale:.1f}x)")
+            refined = self.analyze_ui(
+                f"这是屏幕的一块局部原图。请找到 '{element_description}' 并返回它在这张图里的中心点位置；"
+                f"如果图中没有该元素，confidence 返回 0。",
+                use_cache=True,
+                region=zone,
+                profile="refine"
+            )
+            if refined["confidence"] >= 0.5:
+                refined_x, refined_y = zone.normalized_to_screen(*refined["coordinates"])
+                return refined_x, refined_y, refined["confidence"]
+        # 原图里看不到这个元素，说明粗定位点不可信，不能退回去点它
+        print(f"[VisionEngine] 局部精定位未找到 '{element_description}' (置信度 {refined['confidence']:.2f})")
+        return None, None, refined["confidence"]
+    
+    def _click_at(self, real_x, real_y, double_click=False):
+        """移动并点击屏幕坐标"""
+        pyautogui.moveTo(real_x, real_y, duration=0.5)
+        tracing.sleep(0.2)
         
-        return f"❌ 超过最大重试次数"
+        if double_click:
+            pyautogui.doubleClick()
+        else:
+            pyautogui.click()
+        # 点击之后画面会变，缓冲的帧作废
+        self.capture.invalidate()
     
     def read_screen_text(self, area_description="整个屏幕"):
         """读取屏幕文字"""
         result = self.analyze_ui(
-            f"请识别 {area_description} 上的所有文字内容，按从上到下、从左到右的顺序列出。"
+            f"请识别 {area_description} 上的所有文字内容，按从上到下、从左到右的顺序列出。",
+            profile="read_text"
         )
         
         return result.get("text_content", "")
     
-    def find_element_position(self, element_description):
+    def find_element_position(self, element_description, region=None):
         """查找元素位置"""
-        result = self.analyze_ui(f"请找到 '{element_description}' 的位置")
+        key = self.locations.make_key(self._window_signature(), element_description, region)
+        cached = self._cached_position(key)
+        if cached:
+            return cached
+        
+        real_x, real_y, confidence = self._locate_point(element_description, region)
+        
+        if confidence > 0.5:
+            self._remember_position(key, real_x, real_y)
+            return (real_x, real_y, confidence)
+        
+        return None
+    
+    def locate_many(self, descriptions, region=None, use_cache=True, first_only=False):
+        """
+        一次截图、一次视觉调用定位多个元素
         
-        if result["confidence"] > 0.5:
-            norm_x, norm_y = result["coordinates"]
-            real_x = int(norm_x * self.screen_width)
-            real_y = int(norm_y * self.screen_height)
-            return (real_x, real_y, result["confidence"])
+        Args:
+            descriptions: 元素描述列表（例如同一窗口里的多个输入框）；
+                          其中的 list/tuple 是同一元素的多种叫法，位置缓存命中其中任意一个即可
+            region: 只在该屏幕区域里找
+            use_cache: 是否复用截图缓存
+            first_only: 整个列表都是同一元素的多种叫法
+            
+        Returns:
+            dict: 描述 -> {"x", "y", "confidence", "source"}，x/y 为屏幕坐标，
+                  没找到的 x/y 为 None、confidence 为 0；source 为 "cache" 或 "vision"
+        """
+        groups = [[d] if isinstance(d, str) else list(d) for d in descriptions]
+        if first_only:
+            groups = [[d for group in groups for d in group]]
+        descriptions = list(dict.fromkeys(d for group in groups for d in group))
+        window = self._window_signature()
+        keys = {d: self.locations.make_key(window, d, region) for d in descriptions}
+        located = {d: {"x": None, "y": None, "confidence": 0, "source": None} for d in descriptions}
+        
+        # 先查位置缓存，同组里有一个命中就不再问视觉模型
+        pending = []
+        for group in groups:
+            for d in group:
+                cached = self._cached_position(keys[d])
+                if cached:
+                    located[d] = {"x": cached[0], "y": cached[1], "confidence": cached[2], "source": "cache"}
+                    break
+            else:
+                pending.extend(d for d in group if d not in pending)
+        if not pending: return located
+        
+        system_prompt = """你是一个专业的 UI 视觉分析助手。
+你的任务是在屏幕截图中同时定位多个 UI 元素。
+
+**返回格式（严格 JSON）:**
+{
+    "elements": {
+        "元素描述1": {"coordinates": [x, y], "confidence": 0.95},
+        "元素描述2": {"coordinates": null, "confidence": 0}
+    }
+}
+
+**重要说明:**
+- elements 的键必须与给出的元素描述逐字一致，每个描述都要返回
+- coordinates 是元素中心点的归一化坐标，范围 0-1，[0, 0] 代表左上角，[1, 1] 代表右下角
+- 屏幕上找不到的元素 coordinates 为 null，confidence 为 0
+- 请务必返回纯 JSON，不要包含任何额外的文字说明
+"""
+        profile = "locate"
+        prompt = "请在屏幕上找到以下元素，分别返回中心点位置：\n" + "\n".join(f"- {d}" for d in pending)
+        
+        scoped = self._scope(region)
+        area = self._region(scoped)
+        image = self.capture_screen(use_cache, region=scoped, profile=profile)
+        print(f"[VisionEngine] 批量定位 {len(pending)} 个元素: {', '.join(pending)}")
+        print(describe(image))
+        
+        try:
+            b64_img = base64.b64encode(image["data"]).decode()
+            grid = bool(get_profile(profile).grid)
+            content = self._call_qwen_vision(b64_img, prompt, mime=image["mime"], grid=grid, system_prompt=system_prompt)
+            elements = self._extract_json(content).get("elements") or {}
+        except Exception as e:
+            print(f"[VisionEngine] 批量定位失败: {e}")
+            return located
+        
+        for d in pending:
+            item = elements.get(d)
+            if not isinstance(item, dict) or not item.get("coordinates"):
+                continue
+            try:
+                norm_x, norm_y = item["coordinates"]
+                confidence = float(item.get("confidence", 0.8))
+            except (TypeError, ValueError):
+                continue
+            real_x, real_y = area.normalized_to_screen(norm_x, norm_y)
+            located[d] = {"x": real_x, "y": real_y, "confidence": confidence, "source": "vision"}
+            if confidence >= 0.5:
+                self._remember_position(keys[d], real_x, real_y)
+        return located
+    
+    def click_best(self, descriptions, located=None, double_click=False, region=None, min_confidence=0.5):
+        """
+        点击候选元素中置信度最高的一个（一次视觉调用代替逐个 click_element）
+        
+        Args:
+            descriptions: 候选描述（同一个元素的多种叫法）
+            located: 已有的 locate_many 结果（不传则现场定位）
+            min_confidence: 低于该置信度视为没找到
+        """
+        if located is None:
+            located = self.locate_many(descriptions, region=region, first_only=True)
+        else:
+            # 已有结果可能来自之前的画面：图块还在的换成位置缓存比对出的当前坐标
+            located = dict(located)
+            window = self._window_signature()
+            for d in descriptions:
+                cached = self._cached_position(self.locations.make_key(window, d, region))
+                if cached:
+                    located[d] = {"x": cached[0], "y": cached[1], "confidence": cached[2], "source": "cache"}
+        
+        candidates = [(located[d], d) for d in descriptions
+                      if d in located and located[d]["x"] is not None and located[d]["confidence"] >= min_confidence]
+        if not candidates:
+            return f"❌ 未找到元素: {' / '.join(descriptions)}"
+        
+        best, desc = max(candidates, key=lambda c: c[0]["confidence"])
+        try:
+            self._click_at(best["x"], best["y"], double_click)
+        except Exception as e:
+            return f"❌ 点击失败: {str(e)}"
         
-        return None
\ No newline at end of file
+        source = "位置缓存命中" if best["source"] == "cache" else f"置信度: {best['confidence']:.2f}"
+        return f"✅ 已点击 '{desc}' (坐标: {best['x']}, {best['y']}, {source})"
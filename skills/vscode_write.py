@@ -10,6 +10,7 @@ import platform
 import pyautogui
 import pyperclip
 from skills.base import Skill
+from core import tracing
 
 class VSCodeWriteSkill(Skill):
     def __init__(self):
@@ -41,7 +42,7 @@ class VSCodeWriteSkill(Skill):
         while time.time() - start < timeout:
             if os.path.exists(filename) and os.path.getsize(filename) > 0:
                 return True
-            time.sleep(0.5)
+            tracing.sleep(0.5)
         return False
 
     def execute(self, filename, code, **kwargs) -> str:
@@ -68,12 +69,12 @@ class VSCodeWriteSkill(Skill):
             
             # 【关键】给 VS Code 启动和渲染留足时间
             # Manus 之所以稳，是因为它看屏幕。我们这里盲打，必须给足 Buffer。
-            time.sleep(3) 
+            tracing.sleep(3) 
 
             # 3. 【拟人动作】写入代码
             # 使用剪贴板 + 粘贴 (模拟人类的高效操作，比 typewrite 一个个敲字稳)
             pyperclip.copy(code)
-            time.sleep(0.5) # 等待剪贴板写入
+            tracing.sleep(0.5) # 等待剪贴板写入
 
             # 激活编辑区 (防止焦点在侧边栏)
             pyautogui.click(pyautogui.size().width // 2, pyautogui.size().height // 2)
@@ -83,16 +84,16 @@ class VSCodeWriteSkill(Skill):
             
             # 全选 (Ctrl+A)
             pyautogui.hotkey('ctrl', 'a')
-            time.sleep(0.5)
+            tracing.sleep(0.5)
             
             # 粘贴 (Ctrl+V)
             pyautogui.hotkey('ctrl', 'v')
-            time.sleep(1.0) # 等待大段文本粘贴完成
+            tracing.sleep(1.0) # 等待大段文本粘贴完成
             
             # 保存 (Ctrl+S)
             print("💾 [GUI] 保存文件...")
             pyautogui.hotkey('ctrl', 's')
-            time.sleep(1.0) # 等待磁盘写入
+            tracing.sleep(1.0) # 等待磁盘写入
 
             # 4. 【闭环验证】检查到底写进去没
             # 这是 Moltbot/Manus 的核心逻辑：操作完必须看一眼结果
@@ -0,0 +1,89 @@
+"""
+截图服务 (core.capture)：环形缓冲区取最新帧、每帧编码结果缓存
+用 FakeBackend，不需要显示器
+"""
+
+from PIL import Image
+
+from core.capture import CaptureService, FakeBackend
+from core.encoding import EncodingProfile
+
+
+def _service(ring_size=4):
+    grabs = []
+
+    def source():
+        grabs.append(1)
+        # 每次截图画面都不一样，方便区分帧
+        return Image.new("RGB", (320, 180), (len(grabs) * 20 % 256, 0, 0))
+
+    return CaptureService(FakeBackend(source), ring_size=ring_size), grabs
+
+
+def test_latest_reuses_fresh_frame():
+    service, grabs = _service()
+    first = service.grab()
+    assert service.latest() is first
+    assert service.latest(max_age=5) is first
+    assert len(grabs) == 1
+
+
+def test_latest_grabs_when_frame_too_old():
+    service, grabs = _service()
+    first = service.grab()
+    first.timestamp -= 10
+    frame = service.latest(max_age=1)
+    assert frame is not first and frame.seq == first.seq + 1
+    assert len(grabs) == 2
+    # 不限帧龄时只要没被输入作废就继续用
+    assert service.latest() is frame
+
+
+def test_latest_grabs_after_invalidate():
+    service, grabs = _service()
+    first = service.grab()
+    service.invalidate()
+    assert service.latest() is not first
+    assert len(grabs) == 2
+
+
+def test_ring_keeps_most_recent_frames():
+    service, _ = _service(ring_size=2)
+    frames = [service.grab() for _ in range(3)]
+    assert service.frames() == frames[1:]
+
+
+class CountingProfile(EncodingProfile):
+    def __init__(self):
+        super().__init__("counting", 160, 60)
+        self.renders = 0
+
+    def render(self, image, supported=("jpeg",)):
+        self.renders += 1
+        return super().render(image, supported)
+
+
+def test_encode_profile_once_per_frame():
+    service, _ = _service()
+    profile = CountingProfile()
+    frame = service.grab()
+    first = frame.encode_profile(profile)
+    assert frame.encode_profile(profile) is first
+    assert profile.renders == 1
+
+    # 裁剪框不同是另一份编码
+    frame.encode_profile(profile, box=(0, 0, 100, 100))
+    assert profile.renders == 2
+
+    # 新的一帧重新编码
+    service.grab().encode_profile(profile)
+    assert profile.renders == 3
+
+
+def test_encode_cached_per_parameters():
+    service, _ = _service()
+    frame = service.grab()
+    data, size = frame.encode(160, quality=50)
+    assert frame.encode(160, quality=50)[0] is data
+    assert max(size) == 160
+    assert frame.encode(160, quality=80)[0] is not data
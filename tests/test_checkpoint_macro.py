@@ -0,0 +1,113 @@
+"""
+断点恢复 + 宏：中断在批量动作中间，恢复后存成宏，宏里只能有真正执行过的动作
+用 bench 的假 GUI 后端和本地桩服务，不需要显示器和网络
+"""
+
+import os
+import io
+import asyncio
+import contextlib
+
+from bench import fakes
+
+fakes.install()
+os.environ.setdefault("API_URL", "http://127.0.0.1:9/v1")
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("MODEL_NAME", "stub")
+os.environ["LLM_REPLAY_MODE"] = "off"
+os.environ["SETTLE_MODE"] = "fixed"
+os.environ["TRAJECTORY_MEMORY"] = "0"
+
+from openai import AsyncOpenAI, OpenAI
+from bench.stub_server import StubServer, ScriptedResponder
+from core.engine import AgentEngine
+from core.vision import VisionEngine
+from core.state import StateManager
+from core.macro import MacroStore
+from core.skill_manager import SkillManager
+from core.logger import console
+
+console.quiet = True
+
+
+class Crash(Exception):
+    pass
+
+
+SCRIPT = [
+    {"thought": "1", "action": "computer_control", "args": {"action": "hotkey", "target": "ctrl,l"}},
+    {"thought": "2", "actions": [
+        {"action": "type_text", "args": {"target": "first"}},
+        {"action": "type_text", "args": {"target": "CRASH"}},
+        {"action": "type_text", "args": {"target": "never"}},
+    ]},
+]
+
+
+async def _run(db_path, script, fn, crash=False):
+    server = StubServer(ScriptedResponder(script)).start()
+    try:
+        client = AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+        vision = VisionEngine(OpenAI(api_key="test", base_url=server.base_url, max_retries=0), "stub-vl")
+        brain = SkillManager(context={"vision": vision})
+        state = StateManager(db_path)
+        engine = AgentEngine(client, brain, vision, model_name="stub", interactive=False,
+                             state=state, macros=MacroStore(db_path))
+        engine.settle_delay = 0
+        if crash:
+            execute = brain.aexecute
+
+            async def crashing(skill_name, **kwargs):
+                if "CRASH" in str(kwargs): raise Crash()
+                return await execute(skill_name, **kwargs)
+            brain.aexecute = crashing
+        try:
+            return await fn(engine), engine
+        finally:
+            state.close()
+    finally:
+        server.stop()
+
+
+def test_macro_after_mid_batch_resume_only_has_executed_steps(tmp_path):
+    db_path = str(tmp_path / "state.db")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            asyncio.run(_run(db_path, SCRIPT, lambda e: e.run_task("测试任务"), crash=True))
+        except Crash:
+            pass
+        else:
+            raise AssertionError("模拟的崩溃没有发生")
+
+        sessions = StateManager(db_path).list_running_sessions()
+        assert len(sessions) == 1
+        # 恢复后模型直接 finish
+        summary, engine = asyncio.run(_run(db_path, [], lambda e: e.resume(sessions[0][0])))
+
+    assert summary is not None
+    executed = [(step["action"], step["args"]) for step in engine.executed]
+    assert executed == [("computer_control", {"action": "hotkey", "target": "ctrl,l"}), ("type_text", {"target": "first"})]
+
+    macro = engine.save_macro("demo")
+    assert [(step["action"], step["args"]) for step in macro.steps] == executed
+    # 恢复前做过视觉检查的 hotkey 的指纹要跟着断点保留下来（批量动作没标 verify_after，不做检查）
+    assert macro.checkpoints == 1
+    assert MacroStore(db_path).load("demo").steps == macro.steps
+
+
+def test_replay_keeps_step_whose_screen_diverged(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    # 录制时的指纹和当前画面对不上：第 1 步执行成功但画面分歧，第 2 步不再执行
+    MacroStore(db_path).save("demo", "测试任务", "计划", [
+        {"action": "hotkey", "args": {"target": "ctrl,l"}, "fingerprint": "0" * 16},
+        {"action": "type_text", "args": {"target": "never"}, "fingerprint": None},
+    ])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary, engine = asyncio.run(_run(db_path, [], lambda e: e.replay("demo")))
+
+    assert summary is not None
+    assert [(step["action"], step["args"]) for step in engine.executed] == [("hotkey", {"target": "ctrl,l"})]
+    # 记下的是执行后的真实画面指纹
+    assert engine.executed[0]["fingerprint"] == engine.vision.screen_hash()
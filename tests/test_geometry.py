@@ -0,0 +1,53 @@
+"""
+截图/局部图坐标 -> 屏幕坐标的换算 (core.geometry.Region)
+"""
+
+from core.geometry import Region
+
+SCREEN = (3840, 2160)
+
+
+def test_around_shifts_inside_screen_at_edges():
+    # 靠近左上角：整体平移到原点，不缩小
+    zone = Region.around(10, 10, 400, SCREEN)
+    assert (zone.left, zone.top, zone.width, zone.height) == (0, 0, 400, 400)
+
+    # 靠近右下角
+    zone = Region.around(3835, 2155, 400, SCREEN)
+    assert (zone.right, zone.bottom, zone.width, zone.height) == (3840, 2160, 400, 400)
+
+
+def test_around_clamps_to_window():
+    window = Region(100, 100, 500, 300)
+    zone = Region.around(110, 390, 400, SCREEN, within=window)
+    # 比窗口高的边收缩到窗口大小，位置限制在窗口里
+    assert (zone.left, zone.top, zone.width, zone.height) == (100, 100, 400, 300)
+    assert zone.right <= window.right and zone.bottom <= window.bottom
+
+
+def test_normalized_corners_map_to_first_and_last_pixel():
+    region = Region(0, 0, 1920, 1080)
+    assert region.normalized_to_screen(0.0, 0.0) == (0, 0)
+    assert region.normalized_to_screen(1.0, 1.0) == (1919, 1079)
+    # 模型偶尔返回越界的坐标，限制在区域内
+    assert region.normalized_to_screen(1.5, -0.2) == (1919, 0)
+
+
+def test_normalized_in_offset_region():
+    zone = Region(760, 340, 400, 400)
+    assert zone.normalized_to_screen(0.5, 0.5) == (960, 540)
+    assert zone.normalized_to_screen(1.0, 1.0) == (1159, 739)
+
+
+def test_from_pixels_scales_hidpi_frames():
+    # 截图是屏幕坐标的 2 倍 (Retina)
+    region = Region.from_pixels((200, 100, 600, 300), frame_size=(3840, 2160), screen_size=(1920, 1080))
+    assert (region.left, region.top, region.width, region.height) == (100, 50, 200, 100)
+    # 反过来换回截图像素框
+    assert region.pixel_box((3840, 2160), (1920, 1080)) == (200, 100, 600, 300)
+
+
+def test_image_to_screen_uses_sent_image_size():
+    # 区域被缩成 200x100 的图片发给模型
+    region = Region(100, 50, 400, 200, image_size=(200, 100))
+    assert region.image_to_screen(100, 50) == (300, 150)
@@ -0,0 +1,84 @@
+"""
+只截前台窗口 (CAPTURE_SCOPE=window)：窗口内的归一化坐标要换回整屏坐标
+用 FakeBackend + FakeWindowProvider，不需要显示器和视觉模型
+"""
+
+import os
+import io
+import base64
+
+from bench import fakes
+
+fakes.install()
+os.environ.setdefault("API_URL", "http://127.0.0.1:9/v1")
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("MODEL_NAME", "stub")
+
+from PIL import Image
+
+from core.capture import CaptureService, FakeBackend
+from core.geometry import Region
+from core.window import FakeWindowProvider, WindowInfo, active_window
+from skills.vision_engine import VisionEngine
+
+SCREEN = (1920, 1080)
+
+
+def test_active_window_clipped_to_screen():
+    # 最大化窗口常有负的边距
+    provider = FakeWindowProvider(WindowInfo("编辑器", Region(-8, -8, 1936, 1096)))
+    window = active_window(provider, SCREEN)
+    assert window.region == Region(0, 0, 1920, 1080)
+    assert window.title == "编辑器"
+
+
+def test_active_window_too_small_or_missing():
+    assert active_window(FakeWindowProvider(WindowInfo("托盘", Region(10, 10, 32, 32))), SCREEN) is None
+    assert active_window(FakeWindowProvider(None), SCREEN) is None
+    # 完全在屏幕外（最小化）
+    assert active_window(FakeWindowProvider(WindowInfo("隐藏", Region(-32000, -32000, 800, 600))), SCREEN) is None
+
+
+def _engine(window, image_size=SCREEN):
+    capture = CaptureService(FakeBackend(Image.new("RGB", image_size, (40, 40, 40)), screen_size=SCREEN))
+    engine = VisionEngine(None, "stub-vl", capture=capture, windows=FakeWindowProvider(window))
+    engine.scope = "window"
+    sent = []
+
+    def fake_call(b64_img, prompt, mime=None, grid=False):
+        sent.append(Image.open(io.BytesIO(base64.b64decode(b64_img))).size)
+        return '{"coordinates": [0.5, 0.5], "confidence": 0.9}'
+
+    engine._call_qwen_vision = fake_call
+    return engine, sent
+
+
+def test_window_scope_maps_coordinates_back_to_screen():
+    window = Region(100, 200, 800, 600)
+    engine, sent = _engine(WindowInfo("记事本", window))
+    result = engine.analyze_ui("找按钮")
+    # 只发了窗口那块 (800x600，4:3)
+    assert sent[0][0] * 3 == sent[0][1] * 4
+    assert result["area"] == window
+    # 窗口中心 -> 屏幕坐标
+    assert result["area"].normalized_to_screen(*result["coordinates"]) == (500, 500)
+    assert result["area"].normalized_to_screen(1.0, 1.0) == (899, 799)
+
+
+def test_window_scope_on_hidpi_frame():
+    # 截图是屏幕坐标的 2 倍：发给模型的是窗口对应的那块像素，坐标仍按屏幕坐标换算
+    window = Region(100, 200, 800, 600)
+    engine, sent = _engine(WindowInfo("记事本", window), image_size=(3840, 2160))
+    result = engine.analyze_ui("找按钮")
+    # 裁的是 (200, 400, 1800, 1600) 这块 1600x1200 的截图像素
+    assert engine._last_scale == 1600 / sent[0][0]
+    assert sent[0][0] * 3 == sent[0][1] * 4
+    assert result["area"].normalized_to_screen(0.25, 0.5) == (300, 500)
+
+
+def test_falls_back_to_full_screen_without_window():
+    engine, sent = _engine(None)
+    result = engine.analyze_ui("找按钮")
+    assert sent[0][0] * 9 == sent[0][1] * 16
+    assert result["area"] == Region.full(SCREEN)
+    assert result["area"].normalized_to_screen(0.5, 0.5) == (960, 540)